@@ -1,3 +1,4 @@
+import os
 from flask import Flask
 from flask_bootstrap import Bootstrap
 from flask_sqlalchemy import SQLAlchemy
@@ -15,13 +16,17 @@ def nl2br(value):
     result = escaped_value.replace('\n', Markup('<br>\n'))
     return result
 
-app.config.from_object('app.configuration.DevelopmentConfig')
+# Ex.: MEDEASY_CONFIG=app.configuration.ProductionConfig
+app.config.from_object(os.environ.get('MEDEASY_CONFIG', 'app.configuration.DevelopmentConfig'))
+
+from app.replicas import SessaoRoteada
 
 bs = Bootstrap(app)
-db = SQLAlchemy(app)
+db = SQLAlchemy(app, session_options={'class_': SessaoRoteada})
 migrate = Migrate(app, db)
 lm = LoginManager()
 lm.init_app(app)
 lm.login_view = 'login' 
 
-from app import models, views
\ No newline at end of file
+from app import metricas  # registra os ganchos antes das views (before_request roda primeiro)
+from app import models, views, importacao, exportacao, fragmentos, notificacoes, orcamento, contadores, relatorios
\ No newline at end of file
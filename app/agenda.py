@@ -0,0 +1,208 @@
+import datetime
+import functools
+import sqlite3
+from sqlalchemy import BigInteger, bindparam, case, cast, distinct, extract, func, literal
+from app import db
+from app.models import Consulta, STATUS_ATIVOS
+
+
+# Janelas de atendimento (mesmas regras do validate_data_hora dos formulários de consulta).
+# Os limites finais são inclusivos: 11:00 e 17:30 ainda são horários válidos.
+JANELAS_ATENDIMENTO = (
+    (datetime.time(8, 0), datetime.time(11, 0)),
+    (datetime.time(13, 0), datetime.time(17, 30)),
+)
+
+# Duração de cada slot oferecido no seletor de horários
+DURACAO_SLOT = datetime.timedelta(minutes=30)
+
+# Quantidade máxima de médicos por consulta ao banco (limita o tamanho do IN)
+TAMANHO_LOTE = 500
+
+
+def dentro_das_janelas(hora):
+    """Indica se o horário está dentro de alguma janela de atendimento."""
+    return any(inicio <= hora <= fim for inicio, fim in JANELAS_ATENDIMENTO)
+
+
+def horario_permitido(hora):
+    """
+    Indica se uma consulta pode ser marcada no horário: só no início de um slot
+    (08:00, 08:30...), os mesmos horários do seletor. Um horário quebrado
+    (ex.: 08:10) ocuparia o slot das 08:00 na disponibilidade sem colidir com uma
+    consulta às 08:00 no índice único de horário.
+    """
+    return hora in _INICIOS_DE_SLOT
+
+
+def _minutos(hora):
+    return hora.hour * 60 + hora.minute
+
+
+def _gerar_slots():
+    """Lista os horários de início de cada slot do dia, em ordem."""
+    passo = int(DURACAO_SLOT.total_seconds() // 60)
+    slots = []
+    for inicio, fim in JANELAS_ATENDIMENTO:
+        for minutos in range(_minutos(inicio), _minutos(fim) + 1, passo):
+            slots.append(datetime.time(minutos // 60, minutos % 60))
+    return tuple(slots)
+
+
+# Slots do dia; o bit i de uma máscara representa SLOTS[i]
+SLOTS = _gerar_slots()
+TODOS_OS_SLOTS = (1 << len(SLOTS)) - 1
+_INICIOS_DE_SLOT = frozenset(SLOTS)
+
+
+def _tabela_de_slots():
+    """
+    Pré-calcula, para cada minuto do dia, o índice do slot que o contém (ou None
+    fora das janelas). Horários quebrados (ex.: 08:10), que só existem em consultas
+    gravadas antes do horario_permitido exigir o início do slot (ou importadas),
+    ocupam o slot em que começam (08:00). Assim cada consulta é classificada com
+    um acesso a lista.
+    """
+    passo = int(DURACAO_SLOT.total_seconds() // 60)
+    indice_por_inicio = {_minutos(hora): indice for indice, hora in enumerate(SLOTS)}
+    tabela = [None] * (24 * 60)
+    for inicio, fim in JANELAS_ATENDIMENTO:
+        base = _minutos(inicio)
+        for minutos in range(base, _minutos(fim) + 1):
+            tabela[minutos] = indice_por_inicio.get(base + (minutos - base) // passo * passo)
+    return tabela
+
+
+_SLOT_POR_MINUTO = _tabela_de_slots()
+
+
+def indice_slot(hora):
+    """Retorna o índice do slot que contém o horário, ou None se estiver fora das janelas."""
+    if hora.second or hora.microsecond:
+        # Segundos só importam no limite final de cada janela (ex.: 11:00:30 já é inválido)
+        if not dentro_das_janelas(hora):
+            return None
+    return _SLOT_POR_MINUTO[hora.hour * 60 + hora.minute]
+
+
+def slots_da_mascara(mascara):
+    """Converte uma máscara de bits na lista de horários correspondentes."""
+    return [hora for indice, hora in enumerate(SLOTS) if mascara >> indice & 1]
+
+
+_ROTULOS = tuple(hora.strftime('%H:%M') for hora in SLOTS)
+
+
+@functools.lru_cache(maxsize=4096)
+def rotulos_da_mascara(mascara):
+    """
+    Horários da máscara como texto ('HH:MM'), para a API. As mesmas máscaras se
+    repetem muito (dia todo livre, mesmos horários fixos), por isso o cache.
+    """
+    return tuple(rotulo for indice, rotulo in enumerate(_ROTULOS) if mascara >> indice & 1)
+
+
+def _segundos(hora):
+    return hora.hour * 3600 + hora.minute * 60
+
+
+def _slot_no_banco(segundos_do_dia):
+    """
+    Índice do slot calculado no próprio SELECT, com a mesma regra do indice_slot
+    (horário quebrado ocupa o slot em que começa); NULL fora das janelas.
+    """
+    passo = int(DURACAO_SLOT.total_seconds())
+    return case(*[
+        (segundos_do_dia.between(_segundos(inicio), _segundos(fim)),
+         SLOTS.index(inicio) + (segundos_do_dia - _segundos(inicio)) // passo)
+        for inicio, fim in JANELAS_ATENDIMENTO
+    ])
+
+
+_EPOCA = datetime.date(1970, 1, 1)
+
+
+def segundos_desde_1970(coluna):
+    """
+    Data e hora como inteiro (segundos desde 1970-01-01), calculado no banco. No
+    SQLite o extract('epoch') vira strftime('%s'), que custa o dobro do unixepoch (3.38+).
+    """
+    if db.engine.dialect.name == 'sqlite' and sqlite3.sqlite_version_info >= (3, 38):
+        return func.unixepoch(coluna, type_=BigInteger)
+    return cast(extract('epoch', coluna), BigInteger)
+
+
+def mascaras_ocupadas(medico_ids, inicio, fim):
+    """
+    Carrega as consultas ativas dos médicos entre as datas inicio e fim
+    (inclusive) e devolve {(medico_id, dia): máscara de slots ocupados}.
+    Faz uma única consulta por intervalo para cada lote de médicos.
+    """
+    limite_inferior = datetime.datetime.combine(inicio, datetime.time.min)
+    limite_superior = datetime.datetime.combine(fim + datetime.timedelta(days=1), datetime.time.min)
+    medico_ids = list(medico_ids)
+
+    # As máscaras saem prontas do banco: uma linha por médico e dia em vez de uma por
+    # consulta. Dia e horário vêm do epoch em segundos (inteiro nos dois bancos, sem
+    # converter datas em Python) e a máscara é a soma dos bits distintos, que é o
+    # mesmo que o OU bit a bit (dois horários no mesmo slot contam uma vez só).
+    tabela = Consulta.__table__
+    ocupadas = {}
+    for posicao in range(0, len(medico_ids), TAMANHO_LOTE):
+        lote = medico_ids[posicao:posicao + TAMANHO_LOTE]
+        # MATERIALIZED: o epoch é calculado uma vez por consulta, não a cada uso abaixo
+        ativas = db.select(
+            tabela.c.medico_id,
+            segundos_desde_1970(tabela.c.data_hora).label('epoch')
+        ).where(
+            tabela.c.medico_id.in_(lote),
+            tabela.c.data_hora >= limite_inferior,
+            tabela.c.data_hora < limite_superior,
+            # Status como literais no SQL: com parâmetros o SQLite não sabe que a
+            # condição é a do índice parcial uq_consultas_medico_horario_ativo
+            # (medico_id, data_hora), que cobre a consulta sem ler a tabela
+            tabela.c.status.in_(bindparam('status_ativos', STATUS_ATIVOS, expanding=True,
+                                          literal_execute=True))
+        ).cte('ativas').prefix_with('MATERIALIZED')
+        dia = ativas.c.epoch // 86400
+        mascara = func.sum(distinct(literal(1).op('<<')(_slot_no_banco(ativas.c.epoch % 86400))))
+        linhas = db.session.connection().execute(
+            db.select(ativas.c.medico_id, dia, mascara).group_by(ativas.c.medico_id, dia)
+        ).all()
+        for medico_id, numero_do_dia, bits in linhas:
+            if bits:
+                ocupadas[(medico_id, _EPOCA + datetime.timedelta(days=numero_do_dia))] = int(bits)
+    return ocupadas
+
+
+def disponibilidade(medico_ids, inicio, fim, agora=None):
+    """
+    Calcula os slots livres de cada médico entre inicio e fim (datas, inclusive).
+    Retorna {medico_id: {dia: máscara de slots livres}}, omitindo dias sem vagas.
+    Slots que já passaram (em relação a 'agora') não são oferecidos.
+    """
+    agora = agora or datetime.datetime.now()
+    medico_ids = list(dict.fromkeys(medico_ids))
+    ocupadas = mascaras_ocupadas(medico_ids, inicio, fim)
+
+    # Máscara base de cada dia: todos os slots, exceto os que já passaram hoje
+    dias = []
+    dia = max(inicio, agora.date())
+    while dia <= fim:
+        if dia == agora.date():
+            livres = sum(1 << indice for indice, hora in enumerate(SLOTS) if hora > agora.time())
+        else:
+            livres = TODOS_OS_SLOTS
+        if livres:
+            dias.append((dia, livres))
+        dia += datetime.timedelta(days=1)
+
+    resultado = {}
+    for medico_id in medico_ids:
+        agenda = {}
+        for dia, livres in dias:
+            mascara = livres & ~ocupadas.get((medico_id, dia), 0)
+            if mascara:
+                agenda[dia] = mascara
+        resultado[medico_id] = agenda
+    return resultado
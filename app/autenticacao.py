@@ -0,0 +1,114 @@
+from flask import g
+from sqlalchemy import event
+from sqlalchemy.orm import object_session
+from app import app, db
+from app.cache import CacheLRU
+from app.models import User, Medico, Paciente
+
+
+# Classe concreta de cada tipo de usuário, para carregar users + tabela filha de uma vez
+_MODELOS = {'medico': Medico, 'paciente': Paciente}
+
+
+class Principal(object):
+    """
+    Representação leve e imutável do usuário logado (id, nome e tipo), usada pelo
+    Flask-Login como current_user. A maioria das rotas só precisa disso para
+    autorizar o acesso; quando a view ou o template lê outro atributo (ex.: crm,
+    especialidade), o objeto ORM completo é carregado sob demanda.
+    """
+    __slots__ = ('id', 'name', 'user_type')
+
+    def __init__(self, id, name, user_type):
+        object.__setattr__(self, 'id', id)
+        object.__setattr__(self, 'name', name)
+        object.__setattr__(self, 'user_type', user_type)
+
+    def __setattr__(self, nome, valor):
+        raise AttributeError('Principal é imutável; altere o usuário pelo modelo User.')
+
+    @property
+    def usuario(self):
+        """
+        Objeto Medico/Paciente completo, carregado com um único SELECT e mantido
+        em g até o fim da requisição (o Principal é compartilhado entre threads).
+        """
+        usuario = g.get('_usuario_completo')
+        if usuario is None or usuario.id != self.id:
+            modelo = _MODELOS.get(self.user_type, User)
+            usuario = db.session.get(modelo, self.id)
+            g._usuario_completo = usuario
+        return usuario
+
+    def __getattr__(self, nome):
+        # Só é chamado para atributos que o Principal não possui
+        if nome.startswith('_'):
+            raise AttributeError(nome)
+        return getattr(self.usuario, nome)
+
+    @property
+    def is_authenticated(self):
+        return True
+
+    @property
+    def is_active(self):
+        return True
+
+    @property
+    def is_anonymous(self):
+        return False
+
+    def get_id(self):
+        return str(self.id)
+
+    def __repr__(self):
+        return f'<Principal {self.id} {self.user_type}>'
+
+
+_principais = CacheLRU(
+    capacidade=app.config.get('USUARIOS_CACHE_TAMANHO', 1024),
+    ttl=app.config.get('USUARIOS_CACHE_TTL', 60)
+)
+
+
+def carregar_principal(user_id):
+    """
+    Retorna o Principal do usuário, consultando apenas a tabela users
+    (sem os JOINs de medicos/pacientes) quando ele não está no cache.
+    """
+    principal = _principais.get(user_id)
+    if principal is not None:
+        return principal
+
+    linha = db.session.execute(
+        db.select(User.id, User.name, User.user_type).where(User.id == user_id)
+    ).first()
+    if linha is None:
+        return None
+
+    principal = Principal(*linha)
+    _principais.set(user_id, principal)
+    return principal
+
+
+def invalidar_principal(user_id):
+    _principais.delete(user_id)
+
+
+# Invalidação: guarda na sessão os ids de usuários alterados ou removidos e os
+# retira do cache após o commit. Em vários workers, o TTL limita o atraso.
+@event.listens_for(User, 'after_update', propagate=True)
+@event.listens_for(User, 'after_delete', propagate=True)
+def _marcar_usuario_alterado(mapper, connection, target):
+    object_session(target).info.setdefault('usuarios_alterados', set()).add(target.id)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _invalidar_usuarios_apos_commit(session):
+    for user_id in session.info.pop('usuarios_alterados', ()):
+        invalidar_principal(user_id)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _descartar_usuarios_alterados(session):
+    session.info.pop('usuarios_alterados', None)
@@ -0,0 +1,210 @@
+import re
+from collections import namedtuple
+from markupsafe import Markup, escape
+from sqlalchemy import Integer, column, func, literal_column, table, union_all
+from app import db
+from app.models import User, Consulta, Evolucao, Receita
+from app.paginacao import TAMANHO_PAGINA
+
+
+# Busca textual nas evoluções e receitas, restrita às consultas do médico.
+#
+# PostgreSQL: coluna gerada "busca" (tsvector, configuração 'portuguese') em
+# evolucoes e receitas, com índice GIN. O próprio banco a recalcula a cada INSERT
+# ou UPDATE, então ela nunca fica defasada.
+#
+# SQLite: tabela FTS5 "busca_clinica" espelhando os textos, mantida por triggers.
+# O rowid segue a mesma chave da linha do tempo do prontuário: evolução = 2*id,
+# receita = 2*id + 1. A coluna "medico" guarda o médico da consulta, para que o
+# filtro por médico entre na própria expressão MATCH: o FTS5 só ranqueia as
+# anotações daquele médico (o bm25 é calculado para todo resultado do MATCH).
+#
+# As estruturas (coluna, índices, tabela FTS5 e triggers) existem só nas migrações
+# a4461d0f712d e 5d2e8c41b7f3: crie o banco com "flask db upgrade", não com
+# db.create_all(). Este módulo apenas consulta.
+
+# Mesma configuração do to_tsvector da coluna gerada (migração a4461d0f712d)
+CONFIGURACAO_TEXTO = 'portuguese'
+
+# Marcadores do trecho destacado; são trocados por <mark> só depois do escape do texto
+_INICIO_DESTAQUE = '\x02'
+_FIM_DESTAQUE = '\x03'
+
+ResultadoBusca = namedtuple(
+    'ResultadoBusca',
+    ['tipo', 'id', 'consulta_id', 'data', 'paciente', 'trecho', 'relevancia']
+)
+
+
+def _destacar(trecho):
+    """[SEGURANÇA] Escapa o texto digitado pelo médico e só então insere as tags <mark>."""
+    html = str(escape(trecho))
+    return Markup(html.replace(_INICIO_DESTAQUE, '<mark>').replace(_FIM_DESTAQUE, '</mark>'))
+
+
+def _expressao_fts5(termos):
+    """
+    Converte o texto digitado numa consulta FTS5 segura: cada palavra vira um termo
+    entre aspas (todas obrigatórias), sem expor a sintaxe de operadores do FTS5.
+    """
+    palavras = re.findall(r'\w+', termos)
+    return ' '.join(f'"{palavra}"' for palavra in palavras)
+
+
+def _buscar_postgresql(medico_id, termos, deslocamento, limite):
+    consulta_ts = func.websearch_to_tsquery(CONFIGURACAO_TEXTO, termos)
+    busca_evolucoes = literal_column('evolucoes.busca')
+    busca_receitas = literal_column('receitas.busca')
+
+    # Cada lado já sai ordenado e cortado em deslocamento + limite linhas (top-N no
+    # próprio plano), de modo que o UNION junta no máximo duas páginas, e não todos
+    # os resultados do médico.
+    def melhores(select, relevancia, chave):
+        return select.order_by(relevancia.desc(), chave.desc()).limit(deslocamento + limite)
+
+    relevancia_evolucoes = func.ts_rank_cd(busca_evolucoes, consulta_ts)
+    evolucoes = melhores(
+        db.select(
+            (Evolucao.id * 2).label('chave'),
+            Evolucao.consulta_id.label('consulta_id'),
+            Evolucao.data_criacao.label('data'),
+            Evolucao.conteudo.label('texto'),
+            relevancia_evolucoes.label('relevancia'),
+        )
+        .join(Consulta, Consulta.id == Evolucao.consulta_id)
+        .where(Consulta.medico_id == medico_id, busca_evolucoes.op('@@')(consulta_ts)),
+        relevancia_evolucoes, Evolucao.id
+    )
+    relevancia_receitas = func.ts_rank_cd(busca_receitas, consulta_ts)
+    receitas = melhores(
+        db.select(
+            (Receita.id * 2 + 1).label('chave'),
+            Receita.consulta_id.label('consulta_id'),
+            Receita.timestamp.label('data'),
+            Receita.descricao.label('texto'),
+            relevancia_receitas.label('relevancia'),
+        )
+        .join(Consulta, Consulta.id == Receita.consulta_id)
+        .where(Consulta.medico_id == medico_id, busca_receitas.op('@@')(consulta_ts)),
+        relevancia_receitas, Receita.id
+    )
+    resultados = union_all(evolucoes.subquery().select(), receitas.subquery().select()).subquery('resultados')
+    pagina = (
+        db.select(resultados)
+        .order_by(resultados.c.relevancia.desc(), resultados.c.chave.desc())
+        .offset(deslocamento)
+        .limit(limite)
+        .subquery('pagina')
+    )
+
+    # O trecho (ts_headline) é caro: é calculado apenas para as linhas da página
+    opcoes = f'StartSel={_INICIO_DESTAQUE}, StopSel={_FIM_DESTAQUE}, MaxWords=30, MinWords=10'
+    pacientes = User.__table__
+    linhas = db.session.execute(
+        db.select(
+            pagina.c.chave, pagina.c.consulta_id, pagina.c.data, pagina.c.relevancia,
+            pacientes.c.name.label('paciente'),
+            func.ts_headline(CONFIGURACAO_TEXTO, pagina.c.texto, consulta_ts, opcoes).label('trecho'),
+        )
+        .join(Consulta, Consulta.id == pagina.c.consulta_id)
+        .join(pacientes, pacientes.c.id == Consulta.paciente_id)
+        .order_by(pagina.c.relevancia.desc(), pagina.c.chave.desc())
+    ).all()
+    return [(linha, linha.trecho) for linha in linhas]
+
+
+def _buscar_sqlite(medico_id, termos, deslocamento, limite):
+    expressao = _expressao_fts5(termos)
+    if not expressao:
+        return []
+    # Só as anotações das consultas do médico entram no MATCH (e no cálculo do bm25)
+    expressao = f'medico : "{int(medico_id)}" AND texto : ({expressao})'
+
+    busca = table('busca_clinica', column('rowid', Integer), column('rank'))
+    tabela_busca = literal_column('busca_clinica')
+    pacientes = User.__table__
+
+    # ORDER BY rank + LIMIT dentro da tabela virtual: o FTS5 devolve só a página, e
+    # as junções abaixo são feitas para essas linhas, não para todos os resultados.
+    pagina = (
+        db.select(busca.c.rowid.label('chave'), (-busca.c.rank).label('relevancia'))
+        .where(tabela_busca.op('MATCH')(expressao))
+        .order_by(busca.c.rank, busca.c.rowid.desc())
+        .offset(deslocamento)
+        .limit(limite)
+        .subquery('pagina')
+    )
+    eh_evolucao = pagina.c.chave % 2 == 0
+
+    # id = rowid / 2 (divisão inteira) permite usar a chave primária das tabelas
+    linhas = db.session.execute(
+        db.select(
+            pagina.c.chave,
+            func.coalesce(Evolucao.consulta_id, Receita.consulta_id).label('consulta_id'),
+            func.coalesce(Evolucao.data_criacao, Receita.timestamp).label('data'),
+            pagina.c.relevancia,
+            pacientes.c.name.label('paciente'),
+        )
+        .select_from(pagina)
+        .outerjoin(Evolucao, (Evolucao.id == pagina.c.chave // 2) & eh_evolucao)
+        .outerjoin(Receita, (Receita.id == pagina.c.chave // 2) & ~eh_evolucao)
+        .join(Consulta, Consulta.id == func.coalesce(Evolucao.consulta_id, Receita.consulta_id))
+        .join(pacientes, pacientes.c.id == Consulta.paciente_id)
+        # [SEGURANÇA] A coluna medico do índice só reduz o trabalho do FTS5; quem
+        # decide o acesso continua sendo a consulta da anotação.
+        .where(Consulta.medico_id == medico_id)
+        .order_by(pagina.c.relevancia.desc(), pagina.c.chave.desc())
+    ).all()
+    if not linhas:
+        return []
+
+    # snippet() só existe dentro da consulta com MATCH; é pedido apenas para a página
+    trechos = dict(db.session.execute(
+        db.select(
+            busca.c.rowid,
+            func.snippet(tabela_busca, 0, _INICIO_DESTAQUE, _FIM_DESTAQUE, '…', 24),
+        )
+        .where(tabela_busca.op('MATCH')(expressao),
+               busca.c.rowid.in_([linha.chave for linha in linhas]))
+    ).all())
+    return [(linha, trechos.get(linha.chave, '')) for linha in linhas]
+
+
+def buscar_registros(medico_id, termos, pagina=1, tamanho=TAMANHO_PAGINA):
+    """
+    Busca os termos nas evoluções e receitas das consultas do médico, da mais para
+    a menos relevante. Retorna (resultados, proxima_pagina); proxima_pagina é None
+    na última página.
+
+    No PostgreSQL os termos aceitam a sintaxe de busca web ("frase exata", -termo,
+    or); no SQLite todas as palavras são obrigatórias.
+    """
+    termos = (termos or '').strip()
+    if not termos:
+        return [], None
+
+    pagina = max(pagina, 1)
+    deslocamento = (pagina - 1) * tamanho
+    if db.engine.dialect.name == 'postgresql':
+        linhas = _buscar_postgresql(medico_id, termos, deslocamento, tamanho + 1)
+    else:
+        linhas = _buscar_sqlite(medico_id, termos, deslocamento, tamanho + 1)
+
+    proxima_pagina = None
+    if len(linhas) > tamanho:
+        linhas = linhas[:tamanho]
+        proxima_pagina = pagina + 1
+
+    resultados = [
+        ResultadoBusca(
+            'evolucao' if linha.chave % 2 == 0 else 'receita',
+            linha.chave // 2,
+            linha.consulta_id,
+            linha.data,
+            linha.paciente,
+            _destacar(trecho or ''),
+            linha.relevancia,
+        )
+        for linha, trecho in linhas
+    ]
+    return resultados, proxima_pagina
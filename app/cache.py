@@ -0,0 +1,152 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+
+class CacheLRU(object):
+    """
+    Cache em memória com tamanho máximo (descarta o item usado há mais tempo)
+    e tempo de vida por item. Seguro para uso entre threads do mesmo processo.
+    """
+
+    def __init__(self, capacidade=1024, ttl=60):
+        self.capacidade = capacidade
+        self.ttl = ttl
+        self.acertos = 0
+        self.falhas = 0
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, chave, padrao=None):
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                self.falhas += 1
+                return padrao
+            valor, expira_em = item
+            if expira_em < time.monotonic():
+                del self._itens[chave]
+                self.falhas += 1
+                return padrao
+            self._itens.move_to_end(chave)
+            self.acertos += 1
+            return valor
+
+    def set(self, chave, valor):
+        with self._lock:
+            self._itens[chave] = (valor, time.monotonic() + self.ttl)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.capacidade:
+                self._itens.popitem(last=False)
+
+    def delete(self, chave):
+        with self._lock:
+            self._itens.pop(chave, None)
+
+    def clear(self):
+        with self._lock:
+            self._itens.clear()
+
+    def __len__(self):
+        return len(self._itens)
+
+
+class CacheSQLite(object):
+    """
+    Cache compartilhado entre os workers do mesmo servidor, num arquivo SQLite em
+    modo WAL (mesma abordagem de app/limites.py). Os valores são serializados com
+    pickle; os contadores de acertos e falhas são por processo.
+
+    [SEGURANÇA] pickle executa código ao desserializar: o arquivo deve ficar num
+    diretório que só o usuário da aplicação consegue escrever.
+    """
+
+    # A cada quantas gravações os itens expirados (e os excedentes) são apagados
+    INTERVALO_LIMPEZA = 500
+
+    def __init__(self, caminho, capacidade=1024, ttl=60, prefixo=''):
+        self.caminho = caminho
+        self.capacidade = capacidade
+        self.ttl = ttl
+        self.prefixo = prefixo
+        self.acertos = 0
+        self.falhas = 0
+        self._gravacoes = 0
+        self._local = threading.local()
+        self._conexao().execute('''
+            CREATE TABLE IF NOT EXISTS cache (
+                chave TEXT PRIMARY KEY,
+                valor BLOB NOT NULL,
+                expira_em REAL NOT NULL
+            ) WITHOUT ROWID
+        ''')
+
+    def _conexao(self):
+        # Uma conexão por thread e por processo (o gunicorn faz fork depois do import)
+        conexao = getattr(self._local, 'conexao', None)
+        if conexao is None or self._local.pid != os.getpid():
+            conexao = sqlite3.connect(self.caminho, timeout=5, isolation_level=None)
+            conexao.execute('PRAGMA journal_mode=WAL')
+            conexao.execute('PRAGMA synchronous=NORMAL')
+            self._local.conexao = conexao
+            self._local.pid = os.getpid()
+        return conexao
+
+    def _chave(self, chave):
+        return f'{self.prefixo}{chave}'
+
+    def get(self, chave, padrao=None):
+        linha = self._conexao().execute(
+            'SELECT valor FROM cache WHERE chave = ? AND expira_em > ?',
+            (self._chave(chave), time.time())
+        ).fetchone()
+        if linha is None:
+            self.falhas += 1
+            return padrao
+        self.acertos += 1
+        return pickle.loads(linha[0])
+
+    def set(self, chave, valor):
+        agora = time.time()
+        conexao = self._conexao()
+        conexao.execute(
+            'INSERT OR REPLACE INTO cache (chave, valor, expira_em) VALUES (?, ?, ?)',
+            (self._chave(chave), pickle.dumps(valor, pickle.HIGHEST_PROTOCOL), agora + self.ttl)
+        )
+        self._gravacoes += 1
+        if self._gravacoes % self.INTERVALO_LIMPEZA == 0:
+            conexao.execute('DELETE FROM cache WHERE expira_em <= ?', (agora,))
+            # Acima da capacidade, descarta os que expiram primeiro (os mais antigos)
+            conexao.execute('''
+                DELETE FROM cache WHERE chave IN (
+                    SELECT chave FROM cache ORDER BY expira_em DESC LIMIT -1 OFFSET ?
+                )
+            ''', (self.capacidade,))
+
+    def delete(self, chave):
+        self._conexao().execute('DELETE FROM cache WHERE chave = ?', (self._chave(chave),))
+
+    def clear(self):
+        self._conexao().execute(
+            "DELETE FROM cache WHERE substr(chave, 1, ?) = ?", (len(self.prefixo), self.prefixo)
+        )
+
+    def __len__(self):
+        return self._conexao().execute(
+            "SELECT count(*) FROM cache WHERE substr(chave, 1, ?) = ? AND expira_em > ?",
+            (len(self.prefixo), self.prefixo, time.time())
+        ).fetchone()[0]
+
+
+def criar_cache(uri, capacidade=1024, ttl=60, prefixo=''):
+    """
+    Cria o cache indicado pela URI: 'memory://' (CacheLRU, um por processo) ou
+    'sqlite:////caminho/arquivo.db' (CacheSQLite, compartilhado entre os workers).
+    """
+    if uri.startswith('sqlite://'):
+        return CacheSQLite(urlparse(uri).path, capacidade=capacidade, ttl=ttl, prefixo=prefixo)
+    return CacheLRU(capacidade=capacidade, ttl=ttl)
@@ -0,0 +1,84 @@
+import threading
+import time
+from collections import namedtuple
+from sqlalchemy import event
+from sqlalchemy.orm import object_session
+from app import app, db
+from app.models import Medico
+
+
+# Catálogo de médicos em memória (por processo) usado nos formulários de consulta.
+# Guarda apenas tuplas leves (id, nome, especialidade) em vez de objetos ORM e é
+# invalidado quando um médico é gravado. Como cada worker tem sua própria cópia,
+# o TTL garante que alterações feitas em outro processo apareçam em pouco tempo.
+
+MedicoResumo = namedtuple('MedicoResumo', ['id', 'name', 'especialidade'])
+
+_lock = threading.Lock()
+_estado = {'medicos': None, 'por_id': {}, 'carregado_em': 0.0}
+
+
+def invalidar_catalogo():
+    """Descarta o catálogo; a próxima leitura recarrega do banco."""
+    with _lock:
+        _estado['medicos'] = None
+        _estado['por_id'] = {}
+
+
+def _expirado():
+    ttl = app.config.get('CATALOGO_MEDICOS_TTL', 300)
+    return _estado['medicos'] is None or time.monotonic() - _estado['carregado_em'] > ttl
+
+
+def _carregar():
+    linhas = db.session.execute(
+        db.select(Medico.id, Medico.name, Medico.especialidade).order_by(Medico.name, Medico.id)
+    ).all()
+    medicos = tuple(MedicoResumo(*linha) for linha in linhas)
+    with _lock:
+        _estado['medicos'] = medicos
+        _estado['por_id'] = {medico.id: medico for medico in medicos}
+        _estado['carregado_em'] = time.monotonic()
+    return medicos
+
+
+def listar_medicos():
+    """Lista de médicos (MedicoResumo) ordenada por nome."""
+    medicos = _estado['medicos']
+    if medicos is None or _expirado():
+        medicos = _carregar()
+    return medicos
+
+
+def buscar_medico(medico_id):
+    """
+    Retorna o MedicoResumo do id informado, ou None se não existir.
+    Se o id não estiver no catálogo (ex.: médico cadastrado por outro worker),
+    recarrega uma vez antes de desistir.
+    """
+    listar_medicos()
+    medico = _estado['por_id'].get(medico_id)
+    if medico is None:
+        _carregar()
+        medico = _estado['por_id'].get(medico_id)
+    return medico
+
+
+# Invalidação por eventos: marca a sessão quando um Medico é inserido, alterado
+# ou removido, e só descarta o catálogo depois do commit (um rollback não muda nada).
+@event.listens_for(Medico, 'after_insert')
+@event.listens_for(Medico, 'after_update')
+@event.listens_for(Medico, 'after_delete')
+def _marcar_alteracao(mapper, connection, target):
+    object_session(target).info['catalogo_medicos_alterado'] = True
+
+
+@event.listens_for(db.session, 'after_commit')
+def _invalidar_apos_commit(session):
+    if session.info.pop('catalogo_medicos_alterado', False):
+        invalidar_catalogo()
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _descartar_marcacao(session):
+    session.info.pop('catalogo_medicos_alterado', None)
@@ -0,0 +1,109 @@
+import hashlib
+import time
+from flask import g, request, session, make_response
+from sqlalchemy import func
+from sqlalchemy.orm import aliased
+from werkzeug.http import is_resource_modified
+from app import app, db
+from app.models import Consulta, Evolucao, Receita, User
+
+
+# GET condicional (ETag / Last-Modified) para as páginas clínicas. A view calcula
+# um validador barato (uma consulta agregada, só em índices) e, se o navegador já
+# tem essa versão, responde 304 sem renderizar o template. O validador cobre tudo o
+# que a página exibe, inclusive nomes de usuários, que mudam sem alterar a consulta.
+#
+# [SEGURANÇA] As páginas são de usuários autenticados: o cabeçalho é sempre
+# "Cache-Control: private, no-cache" (nenhum proxy compartilhado guarda a página
+# e o navegador revalida a cada visita) com "Vary: Cookie".
+
+
+def versao_consulta(consulta_id):
+    """
+    Validador de uma consulta: dono, status, última alteração, nomes exibidos de
+    médico e paciente (renomear não altera a consulta) e quantidade/data mais
+    recente de evoluções e receitas. None se a consulta não existir.
+    """
+    medico, paciente = aliased(User), aliased(User)
+    evolucoes = (
+        db.select(func.count().label('n_evolucoes'),
+                  func.max(Evolucao.data_criacao).label('ultima_evolucao'))
+        .where(Evolucao.consulta_id == consulta_id)
+    )
+    receitas = (
+        db.select(func.count().label('n_receitas'),
+                  func.max(Receita.timestamp).label('ultima_receita'))
+        .where(Receita.consulta_id == consulta_id)
+    )
+    evolucoes, receitas = evolucoes.subquery(), receitas.subquery()
+    return db.session.execute(
+        db.select(
+            Consulta.paciente_id, Consulta.medico_id, Consulta.status, Consulta.atualizada_em,
+            medico.name.label('nome_medico'), paciente.name.label('nome_paciente'),
+            *evolucoes.c, *receitas.c
+        )
+        .select_from(Consulta)
+        .join(medico, medico.id == Consulta.medico_id)
+        .join(paciente, paciente.id == Consulta.paciente_id)
+        .join(evolucoes, db.true())
+        .join(receitas, db.true())
+        .where(Consulta.id == consulta_id)
+    ).first()
+
+
+def ultima_alteracao_consulta(versao):
+    """Data mais recente entre a consulta e suas evoluções/receitas (Last-Modified)."""
+    datas = (versao.atualizada_em, versao.ultima_evolucao, versao.ultima_receita)
+    return max((data for data in datas if data is not None), default=None)
+
+
+def versao_agenda(coluna, usuario_id):
+    """Última alteração entre as consultas do médico ou paciente (coluna = medico_id/paciente_id)."""
+    return db.session.scalar(
+        db.select(func.max(Consulta.atualizada_em)).where(coluna == usuario_id)
+    )
+
+
+def _etag(partes):
+    # A página muda conforme o usuário (e o token CSRF embutido nos formulários,
+    # que expira após WTF_CSRF_TIME_LIMIT): ambos entram no validador. A janela de
+    # tempo também limita por quanto tempo uma página fica válida após um deploy.
+    limite_csrf = app.config.get('WTF_CSRF_TIME_LIMIT', 3600) or 3600
+    janela = int(time.time() // (limite_csrf / 2))
+    texto = repr((partes, g.user.get_id(), g.user.user_type, janela))
+    return hashlib.sha1(texto.encode('utf-8')).hexdigest()
+
+
+def responder_se_nao_modificado(*partes, ultima_modificacao=None):
+    """
+    Registra os validadores da página e retorna a resposta 304 se o navegador já
+    tem esta versão; caso contrário retorna None e a view segue normalmente.
+    """
+    # Mensagens flash pendentes são exibidas uma única vez: a página precisa ser renderizada
+    if request.method != 'GET' or session.get('_flashes'):
+        return None
+
+    g._validadores = (_etag(partes), ultima_modificacao)
+    if is_resource_modified(request.environ, etag=g._validadores[0], last_modified=ultima_modificacao):
+        return None
+
+    resposta = make_response('', 304)
+    _aplicar_validadores(resposta)
+    return resposta
+
+
+def _aplicar_validadores(resposta):
+    etag, ultima_modificacao = g._validadores
+    resposta.set_etag(etag, weak=True)
+    if ultima_modificacao is not None:
+        resposta.last_modified = ultima_modificacao
+    resposta.cache_control.private = True
+    resposta.cache_control.no_cache = True
+    resposta.vary.add('Cookie')
+
+
+@app.after_request
+def _validadores_na_resposta(resposta):
+    if resposta.status_code == 200 and g.get('_validadores'):
+        _aplicar_validadores(resposta)
+    return resposta
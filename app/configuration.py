@@ -16,10 +16,75 @@ class Config(object):
     SECRET_KEY = os.environ.get('SECRET_KEY', secrets.token_hex(32))
     CSRF_ENABLED = True
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Réplica de leitura (opcional): rotas marcadas com @somente_leitura leem dela
+    # (ver app/replicas.py). Depois de gravar, o usuário lê do primário por
+    # REPLICA_ATRASO_MAXIMO segundos, tempo máximo esperado de atraso da replicação.
+    SQLALCHEMY_BINDS = (
+        {'replica': os.environ['DATABASE_REPLICA_URL']} if os.environ.get('DATABASE_REPLICA_URL') else {}
+    )
+    REPLICA_ATRASO_MAXIMO = int(os.environ.get('REPLICA_ATRASO_MAXIMO', 5))
+    # Tempo (segundos) que cada worker mantém o catálogo de médicos em memória
+    CATALOGO_MEDICOS_TTL = int(os.environ.get('CATALOGO_MEDICOS_TTL', 300))
+    # Cache do usuário logado (user_loader): quantidade máxima e validade em segundos
+    USUARIOS_CACHE_TAMANHO = int(os.environ.get('USUARIOS_CACHE_TAMANHO', 1024))
+    USUARIOS_CACHE_TTL = int(os.environ.get('USUARIOS_CACHE_TTL', 60))
+    # Cache da linha do tempo das consultas (evoluções e receitas). "memory://" mantém
+    # um cache por processo; "sqlite:////caminho/arquivo.db" compartilha entre os workers.
+    TIMELINE_CACHE_URI = os.environ.get('TIMELINE_CACHE_URI', 'memory://')
+    TIMELINE_CACHE_TAMANHO = int(os.environ.get('TIMELINE_CACHE_TAMANHO', 2048))
+    TIMELINE_CACHE_TTL = int(os.environ.get('TIMELINE_CACHE_TTL', 300))
+    # Cache do HTML renderizado das linhas da agenda e das entradas do prontuário
+    FRAGMENTOS_CACHE_TAMANHO = int(os.environ.get('FRAGMENTOS_CACHE_TAMANHO', 10000))
+    FRAGMENTOS_CACHE_TTL = int(os.environ.get('FRAGMENTOS_CACHE_TTL', 3600))
+    # E-mail (Flask-Mail) e fila de notificações enviada pelo worker (flask worker)
+    MAIL_SERVER = os.environ.get('MAIL_SERVER', 'localhost')
+    MAIL_PORT = int(os.environ.get('MAIL_PORT', 25))
+    MAIL_USE_TLS = os.environ.get('MAIL_USE_TLS', '0') == '1'
+    MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
+    MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
+    MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER', 'MedEasy <nao-responda@medeasy.local>')
+    NOTIFICACOES_LOTE = int(os.environ.get('NOTIFICACOES_LOTE', 100))
+    NOTIFICACOES_MAX_TENTATIVAS = int(os.environ.get('NOTIFICACOES_MAX_TENTATIVAS', 5))
+    # Instrumentação por requisição (Server-Timing e /metrics). [SEGURANÇA] /metrics
+    # exige "Authorization: Bearer <METRICAS_TOKEN>"; sem token configurado, responde 404.
+    METRICAS_ATIVAS = os.environ.get('METRICAS_ATIVAS', '0') == '1'
+    METRICAS_TOKEN = os.environ.get('METRICAS_TOKEN')
+    # Orçamento de consultas SQL por rota (endpoint: máximo), verificado em cada
+    # requisição; estourar levanta OrcamentoExcedido. Vazio = desligado (ver app/orcamento.py).
+    ORCAMENTO_CONSULTAS = {}
+    # [SEGURANÇA] Hashing de senhas: método/custo do werkzeug (ex.: 'scrypt:65536:8:1')
+    # e pool que executa o cálculo fora da thread da requisição.
+    # SENHAS_EXECUTOR: 'processo' (padrão), 'thread' ou 'inline' (sem pool).
+    SENHAS_METODO = os.environ.get('SENHAS_METODO', 'scrypt')
+    SENHAS_EXECUTOR = os.environ.get('SENHAS_EXECUTOR', 'processo')
+    SENHAS_WORKERS = int(os.environ.get('SENHAS_WORKERS', 0)) or None
+    SENHAS_FILA_MAXIMA = int(os.environ.get('SENHAS_FILA_MAXIMA', 32))
+    SENHAS_TIMEOUT = int(os.environ.get('SENHAS_TIMEOUT', 10))
+    SENHAS_RETRY_AFTER = int(os.environ.get('SENHAS_RETRY_AFTER', 2))
+    # [SEGURANÇA] Contadores do limitador de requisições compartilhados entre os workers
+    # (arquivo SQLite local, ver app/limites.py). Sem valor, o arquivo fica na pasta
+    # instance/ da aplicação. Use "memory://" para um contador por processo.
+    RATELIMIT_STORAGE_URI = os.environ.get('RATELIMIT_STORAGE_URI')
 
 
 class ProductionConfig(Config):
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Pool de conexões de cada engine (primário e réplica), por processo: com N
+    # workers, o banco precisa aceitar N * (DB_POOL_SIZE + DB_MAX_OVERFLOW) conexões.
+    # pre_ping descarta conexões derrubadas (failover, reinício do banco) antes do
+    # uso e recycle as renova antes de timeouts de firewall/PgBouncer.
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 10)),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': True,
+    }
+    # SQLALCHEMY_ENGINE_OPTIONS vale só para o primário: a réplica repete as opções
+    SQLALCHEMY_BINDS = (
+        {'replica': dict(SQLALCHEMY_ENGINE_OPTIONS, url=os.environ['DATABASE_REPLICA_URL'])}
+        if os.environ.get('DATABASE_REPLICA_URL') else {}
+    )
     SESSION_COOKIE_SECURE = True
     SESSION_COOKIE_HTTPONLY = True
     SESSION_COOKIE_SAMESITE = 'Lax'
@@ -31,8 +96,27 @@ class DevelopmentConfig(Config):
 
 class TestingConfig(Config):
     TESTING = True
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    # Os testes (tests/conftest.py) usam um arquivo SQLite temporário; TEST_DATABASE_URL
+    # permite rodá-los contra um PostgreSQL descartável
+    SQLALCHEMY_DATABASE_URI = os.environ.get('TEST_DATABASE_URL', 'sqlite:///:memory:')
     # Chave fixa apenas para testes — nunca usar em produção
     SECRET_KEY = 'chave-apenas-para-testes'
     # Desativa CSRF nos testes para não precisar gerar tokens em cada requisição simulada
-    WTF_CSRF_ENABLED = False
\ No newline at end of file
+    WTF_CSRF_ENABLED = False
+    # Calcula os hashes na própria thread, sem pool de processos, e com custo baixo
+    SENHAS_EXECUTOR = 'inline'
+    SENHAS_METODO = 'pbkdf2:sha256:1000'
+    RATELIMIT_STORAGE_URI = 'memory://'
+    # Os testes fazem vários logins seguidos; o limitador é testado à parte
+    RATELIMIT_ENABLED = False
+    # Falha o teste se uma rota passar a fazer mais SQL (N+1 novo), independente da
+    # quantidade de linhas. Inclui a carga do usuário logado quando ele não está em cache.
+    ORCAMENTO_CONSULTAS = {
+        # Médico: resumo da agenda e CRM/especialidade (Medico completo)
+        'dashboard': 3,
+        'minhas_consultas': 4,
+        'gerenciar_evolucoes': 4,
+        'historico_consulta': 4,
+        'prontuario_paciente': 6,
+        'buscar': 3,
+    }
\ No newline at end of file
@@ -0,0 +1,170 @@
+import datetime
+from collections import Counter, defaultdict
+import click
+from sqlalchemy import event, func, inspect
+from sqlalchemy.dialects.postgresql import insert as insert_postgresql
+from sqlalchemy.dialects.sqlite import insert as insert_sqlite
+from app import app, db
+from app.models import Consulta, ContadorAgenda
+
+
+# Contadores da agenda por (médico, dia, status), usados no painel do médico.
+# Cada INSERT/UPDATE/DELETE de Consulta pelo ORM (agendar, editar, confirmar,
+# cancelar, finalizar) soma -1 na chave antiga e +1 na nova, com um upsert na
+# mesma conexão e transação do flush: se o commit falhar, o contador volta junto.
+# UPDATEs em lote pelo Core não disparam os eventos e devem chamar ajustar_contadores().
+# "flask contadores-agenda" confere os contadores com a tabela de consultas e os reconstrói.
+
+_INSERT_POR_DIALETO = {
+    'postgresql': insert_postgresql,
+    'sqlite': insert_sqlite,
+}
+
+
+def _dia(data_hora):
+    return data_hora.date() if isinstance(data_hora, datetime.datetime) else data_hora
+
+
+def ajustar_contadores(conexao, variacoes):
+    """
+    Aplica {(medico_id, dia, status): variação} com upsert (total = total + variação).
+    Deve rodar na conexão da transação que alterou as consultas.
+    """
+    linhas = [
+        {'medico_id': medico_id, 'dia': _dia(dia), 'status': status, 'total': variacao}
+        for (medico_id, dia, status), variacao in variacoes.items() if variacao
+    ]
+    if not linhas:
+        return
+    tabela = ContadorAgenda.__table__
+    comando = _INSERT_POR_DIALETO[conexao.dialect.name](tabela)
+    comando = comando.on_conflict_do_update(
+        index_elements=[tabela.c.medico_id, tabela.c.dia, tabela.c.status],
+        set_={'total': tabela.c.total + comando.excluded.total}
+    )
+    conexao.execute(comando, linhas)
+
+
+def _chave(consulta):
+    return consulta.medico_id, _dia(consulta.data_hora), consulta.status
+
+
+def _chave_anterior(consulta):
+    estado = inspect(consulta)
+    valores = []
+    for nome in ('medico_id', 'data_hora', 'status'):
+        historico = estado.attrs[nome].history
+        valores.append(historico.deleted[0] if historico.deleted else getattr(consulta, nome))
+    medico_id, data_hora, status = valores
+    return medico_id, _dia(data_hora), status
+
+
+@event.listens_for(Consulta, 'after_insert')
+def _contar_consulta_nova(mapper, connection, target):
+    ajustar_contadores(connection, {_chave(target): 1})
+
+
+@event.listens_for(Consulta, 'after_update')
+def _contar_consulta_alterada(mapper, connection, target):
+    anterior, atual = _chave_anterior(target), _chave(target)
+    if anterior != atual:
+        ajustar_contadores(connection, Counter({anterior: -1, atual: 1}))
+
+
+@event.listens_for(Consulta, 'after_delete')
+def _descontar_consulta_removida(mapper, connection, target):
+    ajustar_contadores(connection, {_chave_anterior(target): -1})
+
+
+def resumo_agenda(medico_id, hoje=None):
+    """
+    Totais por status de hoje e da semana (segunda a domingo) do médico:
+    {'hoje': {status: n}, 'semana': {status: n}}. Lê no máximo 7 dias x status linhas.
+    """
+    hoje = hoje or datetime.date.today()
+    segunda = hoje - datetime.timedelta(days=hoje.weekday())
+    domingo = segunda + datetime.timedelta(days=6)
+
+    resumo = {'hoje': defaultdict(int), 'semana': defaultdict(int)}
+    linhas = db.session.execute(
+        db.select(ContadorAgenda.dia, ContadorAgenda.status, ContadorAgenda.total)
+        .where(
+            ContadorAgenda.medico_id == medico_id,
+            ContadorAgenda.dia.between(segunda, domingo),
+            ContadorAgenda.total > 0
+        )
+    )
+    for dia, status, total in linhas:
+        resumo['semana'][status] += total
+        if dia == hoje:
+            resumo['hoje'][status] += total
+    return resumo
+
+
+def _contagem_real(medico_id=None):
+    dia = func.date(Consulta.data_hora)
+    consulta = (
+        db.select(Consulta.medico_id, dia.label('dia'), Consulta.status, func.count().label('total'))
+        .group_by(Consulta.medico_id, dia, Consulta.status)
+    )
+    if medico_id is not None:
+        consulta = consulta.where(Consulta.medico_id == medico_id)
+    return consulta
+
+
+def _como_data(dia):
+    # func.date() devolve texto no SQLite e date no PostgreSQL
+    return datetime.date.fromisoformat(dia) if isinstance(dia, str) else dia
+
+
+def divergencias(medico_id=None):
+    """Lista (medico_id, dia, status, contador, real) onde os contadores diferem das consultas."""
+    reais = {
+        (linha.medico_id, _como_data(linha.dia), linha.status): linha.total
+        for linha in db.session.execute(_contagem_real(medico_id))
+    }
+    consulta = db.select(ContadorAgenda.medico_id, ContadorAgenda.dia, ContadorAgenda.status,
+                         ContadorAgenda.total)
+    if medico_id is not None:
+        consulta = consulta.where(ContadorAgenda.medico_id == medico_id)
+    contadores = {(m, d, s): total for m, d, s, total in db.session.execute(consulta)}
+
+    return sorted(
+        (*chave, contadores.get(chave, 0), reais.get(chave, 0))
+        for chave in contadores.keys() | reais.keys()
+        if contadores.get(chave, 0) != reais.get(chave, 0)
+    )
+
+
+def reconstruir_contadores(medico_id=None):
+    """Recalcula os contadores a partir das consultas (DELETE + INSERT ... SELECT)."""
+    remocao = db.delete(ContadorAgenda)
+    if medico_id is not None:
+        remocao = remocao.where(ContadorAgenda.medico_id == medico_id)
+    db.session.execute(remocao)
+    db.session.execute(
+        ContadorAgenda.__table__.insert().from_select(
+            ['medico_id', 'dia', 'status', 'total'], _contagem_real(medico_id)
+        )
+    )
+    db.session.commit()
+
+
+@app.cli.command('contadores-agenda')
+@click.option('--medico', 'medico_id', type=int, help='Apenas os contadores deste médico (id).')
+@click.option('--reconstruir', is_flag=True, help='Recalcula os contadores a partir das consultas.')
+def contadores_agenda(medico_id, reconstruir):
+    """Confere (ou reconstrói) os contadores da agenda usados no painel do médico."""
+    if reconstruir:
+        reconstruir_contadores(medico_id)
+        click.echo('Contadores reconstruídos.')
+        return
+
+    diferencas = divergencias(medico_id)
+    for medico, dia, status, contador, real in diferencas[:50]:
+        click.echo(f'médico {medico} {dia.isoformat()} {status}: contador {contador}, consultas {real}')
+    if diferencas:
+        raise click.ClickException(
+            f'{len(diferencas)} contador(es) divergente(s); use --reconstruir para corrigir.'
+        )
+    click.echo('Contadores conferidos: nenhuma divergência.')
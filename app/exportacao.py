@@ -0,0 +1,162 @@
+import csv
+import datetime
+import io
+import json
+import zlib
+import click
+from sqlalchemy import case, func, literal
+from app import app, db
+from app.models import User, Medico, Consulta
+from app.replicas import ler_da_replica
+
+
+# Exportação de consultas (agenda do médico, faturamento do período) em CSV ou
+# NDJSON. As linhas são lidas do banco em lotes (yield_per: cursor no servidor no
+# PostgreSQL) e cada lote é formatado e enviado antes do próximo ser lido, então
+# a memória usada é a mesma para mil ou dez milhões de consultas.
+
+TAMANHO_LOTE_EXPORTACAO = 1000
+
+CAMPOS = ('id', 'data_hora', 'status', 'medico_id', 'medico', 'especialidade',
+          'paciente_id', 'paciente')
+
+TIPOS_CONTEUDO = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+# [SEGURANÇA] Caracteres com que uma planilha (Excel, LibreOffice) começa uma fórmula.
+# Um nome cadastrado como "=HYPERLINK(...)" viraria fórmula ao abrir o CSV (CSV injection).
+_INICIO_DE_FORMULA = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _sem_formula(coluna):
+    """
+    [SEGURANÇA] Prefixa com ' o texto que a planilha interpretaria como fórmula.
+    Feito no próprio SELECT, para não percorrer cada célula em Python.
+    """
+    return case((func.substr(coluna, 1, 1).in_(_INICIO_DE_FORMULA), literal("'") + coluna), else_=coluna)
+
+
+def consulta_exportacao(medico_id=None, paciente_id=None, status=None, inicio=None, fim=None,
+                        para_planilha=False):
+    """
+    SELECT das consultas a exportar, em ordem cronológica. inicio e fim são
+    datetimes (fim exclusivo); todos os filtros são opcionais. Com para_planilha
+    (CSV), os textos livres (nomes e especialidade) saem sem fórmulas.
+    """
+    users = User.__table__
+    medicos = users.alias('nomes_medicos')
+    pacientes = users.alias('nomes_pacientes')
+    textos = [medicos.c.name, Medico.__table__.c.especialidade, pacientes.c.name]
+    if para_planilha:
+        textos = [_sem_formula(coluna) for coluna in textos]
+    medico, especialidade, paciente = textos
+
+    consulta = (
+        db.select(
+            Consulta.id, Consulta.data_hora, Consulta.status,
+            Consulta.medico_id, medico, especialidade,
+            Consulta.paciente_id, paciente,
+        )
+        .join(Medico.__table__, Medico.__table__.c.id == Consulta.medico_id)
+        .join(medicos, medicos.c.id == Consulta.medico_id)
+        .join(pacientes, pacientes.c.id == Consulta.paciente_id)
+        .order_by(Consulta.data_hora, Consulta.id)
+    )
+    if medico_id is not None:
+        consulta = consulta.where(Consulta.medico_id == medico_id)
+    if paciente_id is not None:
+        consulta = consulta.where(Consulta.paciente_id == paciente_id)
+    if status:
+        consulta = consulta.where(Consulta.status == status)
+    if inicio is not None:
+        consulta = consulta.where(Consulta.data_hora >= inicio)
+    if fim is not None:
+        consulta = consulta.where(Consulta.data_hora < fim)
+    return consulta
+
+
+def percorrer_lotes(consulta, tamanho=TAMANHO_LOTE_EXPORTACAO):
+    """Gera listas de linhas (tuplas) com até 'tamanho' consultas cada."""
+    resultado = db.session.execute(consulta.execution_options(yield_per=tamanho))
+    try:
+        for lote in resultado.partitions():
+            yield [_valores(linha) for linha in lote]
+    finally:
+        # Libera o cursor no servidor se o cliente desistir do download no meio
+        resultado.close()
+
+
+def _valores(linha):
+    return tuple(valor.isoformat() if isinstance(valor, datetime.datetime) else valor
+                 for valor in linha)
+
+
+def gerar_csv(lotes):
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow(CAMPOS)
+    for lote in lotes:
+        escritor.writerows(lote)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+    # Cabeçalho de uma exportação vazia
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def gerar_ndjson(lotes):
+    for lote in lotes:
+        yield ''.join(
+            json.dumps(dict(zip(CAMPOS, valores)), ensure_ascii=False) + '\n'
+            for valores in lote
+        )
+
+
+def comprimir_gzip(pedacos):
+    """Compacta o fluxo de bytes em gzip à medida que ele é gerado."""
+    compressor = zlib.compressobj(wbits=31)
+    for pedaco in pedacos:
+        dados = compressor.compress(pedaco)
+        if dados:
+            yield dados
+    yield compressor.flush()
+
+
+def gerar_exportacao(formato, gzip=False, **filtros):
+    """Gera os bytes da exportação no formato pedido ('csv' ou 'ndjson')."""
+    lotes = percorrer_lotes(consulta_exportacao(para_planilha=formato == 'csv', **filtros))
+    gerador = gerar_csv if formato == 'csv' else gerar_ndjson
+    pedacos = (texto.encode('utf-8') for texto in gerador(lotes))
+    return comprimir_gzip(pedacos) if gzip else pedacos
+
+
+def nome_arquivo(formato, gzip=False):
+    nome = f'consultas-{datetime.date.today().isoformat()}.{formato}'
+    return nome + '.gz' if gzip else nome
+
+
+@app.cli.command('export')
+@click.option('--formato', type=click.Choice(list(TIPOS_CONTEUDO)), default='csv', show_default=True)
+@click.option('--medico', 'medico_id', type=int, help='Apenas a agenda deste médico (id).')
+@click.option('--paciente', 'paciente_id', type=int, help='Apenas as consultas deste paciente (id).')
+@click.option('--status', help='Apenas consultas com este status.')
+@click.option('--inicio', type=click.DateTime(['%Y-%m-%d']), help='Data inicial (AAAA-MM-DD).')
+@click.option('--fim', type=click.DateTime(['%Y-%m-%d']), help='Data final, inclusive (AAAA-MM-DD).')
+@click.option('--gzip', is_flag=True, help='Compacta a saída em gzip.')
+@click.option('--saida', default='-', show_default=True, type=click.Path(dir_okay=False, allow_dash=True),
+              help='Arquivo de destino ("-" para a saída padrão).')
+def exportar(formato, medico_id, paciente_id, status, inicio, fim, gzip, saida):
+    """Exporta consultas em CSV ou NDJSON."""
+    if fim is not None:
+        fim += datetime.timedelta(days=1)
+    pedacos = gerar_exportacao(
+        formato, gzip=gzip, medico_id=medico_id, paciente_id=paciente_id,
+        status=status, inicio=inicio, fim=fim
+    )
+    with click.open_file(saida, 'wb') as destino, ler_da_replica():
+        for pedaco in pedacos:
+            destino.write(pedaco)
@@ -1,10 +1,16 @@
+import functools
+from types import SimpleNamespace
 from flask_wtf import FlaskForm # [SEGURANÇA] Todo formulário que herda FlaskForm ganha automaticamente um campo oculto com token CSRF
-from wtforms import StringField, PasswordField, SubmitField, SelectField, DateField, TextAreaField
-from wtforms.validators import DataRequired, Email, EqualTo, Length, ValidationError
-from wtforms.fields import DateTimeLocalField
+from wtforms import (
+    StringField, PasswordField, SubmitField, SelectField, SelectMultipleField, DateField, TextAreaField,
+    IntegerField, BooleanField
+)
+from wtforms.validators import DataRequired, Email, EqualTo, Length, NumberRange, Optional, ValidationError
+from wtforms.fields import DateTimeLocalField, TimeField
 from wtforms_sqlalchemy.fields import QuerySelectField
-from .models import Medico
-import datetime
+from .catalogo import listar_medicos
+from .agenda import horario_permitido
+from .series import FREQUENCIAS, MAXIMO_OCORRENCIAS
 
 
 class LoginForm(FlaskForm):
@@ -40,6 +46,21 @@ def validar_senha(senha: str) -> tuple[bool, str]:
     return True, ''
 
 
+# Mesmo validador Email() dos formulários de cadastro, reaproveitado fora deles
+# (ex.: importação em massa) para que as duas portas de entrada aceitem os mesmos e-mails.
+_VALIDADOR_EMAIL = Email()
+
+
+def validar_email(email: str) -> bool:
+    """Indica se o e-mail passa no validador Email() usado pelos formulários."""
+    campo = SimpleNamespace(data=email, gettext=lambda mensagem: mensagem)
+    try:
+        _VALIDADOR_EMAIL(None, campo)
+    except ValidationError:
+        return False
+    return True
+
+
 # [SEGURANÇA] Função auxiliar que valida o CPF pelo algoritmo oficial
 # dos dígitos verificadores da Receita Federal.
 def validar_cpf(cpf: str) -> bool:
@@ -64,6 +85,116 @@ def validar_cpf(cpf: str) -> bool:
     return True
 
 
+# Dígito verificador ((soma * 10 % 11) % 10) de cada soma ponderada possível
+# (até 9 * (11 + 10 + ... + 2) = 585), para o validar_cpfs trocar o módulo por uma
+# consulta à tabela. Montada no primeiro uso: o NumPy só é importado por quem
+# valida em lote, não por todo worker web.
+@functools.cache
+def _digito_por_soma():
+    import numpy as np
+    return (np.arange(586) * 10 % 11 % 10).astype(np.uint8)
+
+
+def _verificar_matriz_cpf(matriz):
+    """Aplica as regras do validar_cpf a uma matriz (k, 11) de dígitos."""
+    import numpy as np
+    digitos = matriz.astype(np.uint8)
+    # Uma linha por posição do CPF: cada operação abaixo percorre memória contínua
+    colunas = np.ascontiguousarray(digitos.T)
+    soma1 = np.zeros(len(digitos), dtype=np.uint16)
+    soma2 = np.zeros(len(digitos), dtype=np.uint16)
+    todos_iguais = np.ones(len(digitos), dtype=bool)
+    for posicao in range(10):
+        if posicao < 9:
+            soma1 += colunas[posicao] * np.uint16(10 - posicao)
+        soma2 += colunas[posicao] * np.uint16(11 - posicao)
+        todos_iguais &= colunas[posicao + 1] == colunas[0]
+    digito_por_soma = _digito_por_soma()
+    validos = ((digito_por_soma[soma1] == colunas[9])
+               & (digito_por_soma[soma2] == colunas[10])
+               & ~todos_iguais)
+    return validos, digitos
+
+
+def _digitos_ascii(cpfs):
+    """
+    Caminho rápido para uma lista de textos com exatamente 11 dígitos ASCII (ex.:
+    coluna pacientes.cpf): junta tudo num único bytes e o enxerga como matriz
+    (n, 12), sem criar um array de strings. None se algum CPF foge desse formato.
+    """
+    import numpy as np
+    try:
+        bruto = ('\n'.join(cpfs) + '\n').encode('ascii')
+    except (TypeError, UnicodeEncodeError):
+        return None
+    if len(bruto) != 12 * len(cpfs):
+        return None
+    digitos = np.frombuffer(bruto, dtype=np.uint8).reshape(-1, 12)[:, :11] - np.uint8(ord('0'))
+    # Com o tamanho total certo, um CPF fora do formato põe um não dígito na matriz
+    # (em uint8 os não dígitos "dão a volta" para valores >= 10)
+    return digitos if (digitos < 10).all() else None
+
+
+def validar_cpfs(cpfs):
+    """
+    Versão em lote do validar_cpf, para revalidar tabelas inteiras ou arquivos de
+    importação. Recebe um iterável (ou array NumPy) de CPFs, com ou sem pontuação,
+    e calcula os dois dígitos verificadores de todos de uma vez.
+
+    Retorna (validos, digitos):
+    - validos: array booleano, True onde validar_cpf(cpf) seria True;
+    - digitos: matriz (n, 11) uint8 com os dígitos normalizados de cada CPF
+      (linha zerada quando o CPF não tem exatamente 11 dígitos).
+    """
+    import numpy as np
+    if not isinstance(cpfs, np.ndarray):
+        cpfs = list(cpfs)
+        digitos = _digitos_ascii(cpfs)
+        if digitos is not None:
+            return _verificar_matriz_cpf(digitos)
+    textos = np.asarray(cpfs)
+    if textos.dtype.kind == 'S':
+        textos = textos.astype('U')
+    elif textos.dtype.kind != 'U':
+        textos = textos.astype(str)
+    textos = np.ascontiguousarray(textos.ravel())
+    n = len(textos)
+    validos = np.zeros(n, dtype=bool)
+    digitos = np.zeros((n, 11), dtype=np.uint8)
+    if n == 0 or textos.dtype.itemsize == 0:
+        return validos, digitos
+
+    # Matriz de códigos Unicode (uma linha por CPF, uma coluna por caractere).
+    # Subtrair '0' em uint32 faz os não dígitos "darem a volta" para valores enormes.
+    largura = textos.dtype.itemsize // 4
+    codigos = textos.view(np.uint32).reshape(n, largura)
+    valores = codigos - np.uint32(ord('0'))
+    eh_digito = valores < 10
+
+    nao_ascii = ()
+    if largura == 11 and eh_digito.all():
+        # Caso comum (ex.: coluna pacientes.cpf): todos já têm só os 11 dígitos
+        validos[:], digitos[:] = _verificar_matriz_cpf(valores)
+    else:
+        com_11 = eh_digito.sum(axis=1) == 11
+        # Dígitos não ASCII (ex.: '١') também passam no str.isdigit do validar_cpf;
+        # essas linhas raras são conferidas pela função escalar.
+        nao_ascii = np.flatnonzero((codigos > 127).any(axis=1))
+        com_11[nao_ascii] = False
+        linhas = np.flatnonzero(com_11)
+        if len(linhas):
+            matriz = valores[linhas][eh_digito[linhas]].reshape(-1, 11)
+            validos[linhas], digitos[linhas] = _verificar_matriz_cpf(matriz)
+
+    for linha in nao_ascii:
+        cpf = ''.join(filter(str.isdigit, textos[linha]))
+        validos[linha] = validar_cpf(cpf)
+        if len(cpf) == 11:
+            digitos[linha] = [int(digito) for digito in cpf]
+
+    return validos, digitos
+
+
 class CadastroPacienteForm(FlaskForm):
     name = StringField('Nome Completo', validators=[DataRequired()])
     email = StringField('E-mail', validators=[DataRequired(), Email()])
@@ -115,15 +246,17 @@ class CadastroMedicoForm(FlaskForm):
             raise ValidationError(mensagem)
 
 
-# Helper para os formulários de consulta
+# Helper para os formulários de consulta: usa o catálogo em memória em vez de
+# carregar todos os médicos do banco a cada formulário montado
 def get_medicos():
-    return Medico.query.all()
+    return listar_medicos()
 
 
 class AgendamentoForm(FlaskForm):
     medico = QuerySelectField(
         'Médico',
         query_factory=get_medicos,
+        get_pk=lambda medico: medico.id,
         get_label='name',
         allow_blank=False,
         validators=[DataRequired()]
@@ -133,31 +266,42 @@ class AgendamentoForm(FlaskForm):
         format='%Y-%m-%dT%H:%M',
         validators=[DataRequired()]
     )
+    # Repetição opcional: com uma frequência, vira uma série de consultas recorrentes
+    recorrencia = SelectField(
+        'Repetir',
+        choices=[('', 'Não repetir')] + [(frequencia, frequencia.capitalize()) for frequencia in FREQUENCIAS],
+        default=''
+    )
+    ocorrencias = IntegerField(
+        'Quantidade de consultas',
+        validators=[Optional(), NumberRange(min=2, max=MAXIMO_OCORRENCIAS)]
+    )
+    repetir_ate = DateField('Repetir até', format='%Y-%m-%d', validators=[Optional()])
+    pular_conflitos = BooleanField('Agendar os horários livres mesmo se algum estiver ocupado')
     submit = SubmitField('Agendar Consulta')
 
     def validate_data_hora(self, field):
-        """Validador de Horário (8:00-11:00 e 13:00-17:30)."""
-        data_hora = field.data
-        hora = data_hora.time()
-
-        inicio_manha = datetime.time(8, 0)
-        fim_manha = datetime.time(11, 0)
-        inicio_tarde = datetime.time(13, 0)
-        fim_tarde = datetime.time(17, 30)
-
-        manha_valida = inicio_manha <= hora <= fim_manha
-        tarde_valida = inicio_tarde <= hora <= fim_tarde
-
-        if not manha_valida and not tarde_valida:
+        """Validador de Horário (8:00-11:00 e 13:00-17:30, de 30 em 30 minutos)."""
+        if not horario_permitido(field.data.time()):
             raise ValidationError(
-                'A consulta deve ser agendada entre 08:00 e 11:00 ou entre 13:00 e 17:30.'
+                'A consulta deve ser agendada entre 08:00 e 11:00 ou entre 13:00 e 17:30, '
+                'em horários de 30 em 30 minutos (ex.: 08:00, 08:30).'
             )
 
+    def validate_recorrencia(self, field):
+        if field.data and not (self.ocorrencias.data or self.repetir_ate.data):
+            raise ValidationError('Informe a quantidade de consultas ou até quando repetir.')
+
+    def validate_repetir_ate(self, field):
+        if field.data and self.data_hora.data and field.data <= self.data_hora.data.date():
+            raise ValidationError('A data final deve ser posterior à primeira consulta.')
+
 
 class EditarConsultaForm(FlaskForm):
     medico = QuerySelectField(
         'Médico',
         query_factory=get_medicos,
+        get_pk=lambda medico: medico.id,
         get_label='name',
         allow_blank=False,
         validators=[DataRequired()]
@@ -180,28 +324,82 @@ class EditarConsultaForm(FlaskForm):
     submit = SubmitField('Salvar Alterações')
 
     def validate_data_hora(self, field):
-        """Validador de Horário (8:00-11:00 e 13:00-17:30)."""
-        data_hora = field.data
-        hora = data_hora.time()
+        """Validador de Horário (8:00-11:00 e 13:00-17:30, de 30 em 30 minutos)."""
+        if not horario_permitido(field.data.time()):
+            raise ValidationError(
+                'A consulta deve ser agendada entre 08:00 e 11:00 ou entre 13:00 e 17:30, '
+                'em horários de 30 em 30 minutos (ex.: 08:00, 08:30).'
+            )
 
-        inicio_manha = datetime.time(8, 0)
-        fim_manha = datetime.time(11, 0)
-        inicio_tarde = datetime.time(13, 0)
-        fim_tarde = datetime.time(17, 30)
 
-        manha_valida = inicio_manha <= hora <= fim_manha
-        tarde_valida = inicio_tarde <= hora <= fim_tarde
+class FiltroConsultasForm(FlaskForm):
+    """
+    Filtros opcionais da listagem de consultas. É enviado por GET (query string),
+    por isso não usa token CSRF.
+    """
+    class Meta:
+        csrf = False
 
-        if not manha_valida and not tarde_valida:
-            raise ValidationError(
-                'A consulta deve ser agendada entre 08:00 e 11:00 ou entre 13:00 e 17:30.'
-            )
+    status = SelectField(
+        'Status',
+        choices=[
+            ('', 'Todos'),
+            ('Agendada', 'Agendada'),
+            ('Confirmada', 'Confirmada'),
+            ('Finalizada', 'Finalizada'),
+            ('Cancelada', 'Cancelada')
+        ],
+        validators=[Optional()]
+    )
+    data_inicio = DateField('De', format='%Y-%m-%d', validators=[Optional()])
+    data_fim = DateField('Até', format='%Y-%m-%d', validators=[Optional()])
+    submit = SubmitField('Filtrar')
+
+
+class BuscaForm(FlaskForm):
+    """Busca textual nas evoluções e receitas. Enviada por GET, sem token CSRF."""
+    class Meta:
+        csrf = False
+
+    q = StringField('Buscar', validators=[DataRequired(), Length(max=200)])
+    submit = SubmitField('Buscar')
 
 
 class EmptyForm(FlaskForm):
     submit = SubmitField('Submit')
 
 
+class AcaoEmLoteForm(FlaskForm):
+    """Ação do médico sobre várias consultas marcadas na agenda."""
+    acao = SelectField(
+        'Com as selecionadas',
+        choices=[
+            ('confirmar', 'Confirmar'),
+            ('finalizar', 'Finalizar'),
+            ('cancelar', 'Cancelar')
+        ],
+        validators=[DataRequired()]
+    )
+    # Os ids vêm das caixas de seleção da tabela; dono e status são conferidos na view
+    consulta_ids = SelectMultipleField('Consultas', coerce=int, validate_choice=False,
+                                       validators=[DataRequired(message='Selecione ao menos uma consulta.')])
+    submit = SubmitField('Aplicar')
+
+
+class AlterarHorarioSerieForm(FlaskForm):
+    """Novo horário para as próximas consultas de uma série recorrente."""
+    hora = TimeField('Novo horário', format='%H:%M', validators=[DataRequired()])
+    submit = SubmitField('Alterar Horário')
+
+    def validate_hora(self, field):
+        """Validador de Horário (8:00-11:00 e 13:00-17:30, de 30 em 30 minutos)."""
+        if not horario_permitido(field.data):
+            raise ValidationError(
+                'A consulta deve ser agendada entre 08:00 e 11:00 ou entre 13:00 e 17:30, '
+                'em horários de 30 em 30 minutos (ex.: 08:00, 08:30).'
+            )
+
+
 class EvolucaoForm(FlaskForm):
     conteudo = TextAreaField('Conteúdo da Evolução', validators=[DataRequired()])
     submit_evolucao = SubmitField('Salvar Evolução')
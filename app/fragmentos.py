@@ -0,0 +1,48 @@
+from markupsafe import Markup
+from flask import g, render_template
+from app import app
+from app.cache import CacheLRU
+
+
+# Cache de fragmentos de template: o HTML de cada linha da agenda e de cada entrada
+# do prontuário é renderizado uma vez e reaproveitado enquanto a chave não mudar
+# (id + versão da entidade + papel de quem vê + textos exibidos).
+#
+# [SEGURANÇA] O token CSRF nunca é guardado no cache: o fragmento é renderizado
+# com um marcador no lugar de form.hidden_tag() e o token da requisição atual é
+# inserido depois da consulta ao cache.
+
+MARCADOR_CSRF = '<!--csrf-->'
+
+_fragmentos = CacheLRU(
+    capacidade=app.config.get('FRAGMENTOS_CACHE_TAMANHO', 10000),
+    ttl=app.config.get('FRAGMENTOS_CACHE_TTL', 3600)
+)
+
+
+def _campos_csrf(formulario):
+    # Renderizado uma vez por requisição, não uma vez por linha
+    campos = g.get('_campos_csrf')
+    if campos is None:
+        campos = g._campos_csrf = str(formulario.hidden_tag())
+    return campos
+
+
+@app.template_global()
+def fragmento(template, chave, formulario=None, **contexto):
+    """
+    Retorna o HTML do template parcial, do cache quando possível. No template
+    parcial, use {{ csrf }} onde iria {{ form.hidden_tag() }}.
+    """
+    html = _fragmentos.get(chave)
+    if html is None:
+        html = render_template(template, csrf=Markup(MARCADOR_CSRF), **contexto)
+        _fragmentos.set(chave, html)
+    if formulario is not None and MARCADOR_CSRF in html:
+        html = html.replace(MARCADOR_CSRF, _campos_csrf(formulario))
+    return Markup(html)
+
+
+def estatisticas_cache_fragmentos():
+    """Acertos e falhas do cache de fragmentos neste processo."""
+    return {'acertos': _fragmentos.acertos, 'falhas': _fragmentos.falhas}
@@ -0,0 +1,281 @@
+import csv
+import datetime
+import json
+import os
+import click
+from sqlalchemy import insert
+from app import app, db
+from app.catalogo import invalidar_catalogo
+from app.forms import validar_cpfs, validar_email, validar_senha
+from app.models import User, Medico, Paciente
+from app.senhas import gerar_hashes
+
+
+# Importação em massa de pacientes e médicos (cadastro inicial de uma clínica).
+# O arquivo é lido em streaming e processado em lotes: validação local, checagem de
+# duplicidade com poucas consultas por lote (IN), hashing das senhas em paralelo e
+# INSERT em lote. Ao fim de cada lote o progresso é gravado num checkpoint, de modo
+# que uma importação interrompida pode ser retomada do ponto em que parou.
+
+TIPOS = ('paciente', 'medico')
+
+
+def ler_registros(arquivo, formato):
+    """
+    Gera (registro, erro) para cada registro do arquivo CSV ou NDJSON, um por vez.
+    Uma linha NDJSON que não é um objeto JSON vem como ({}, mensagem), para ser
+    rejeitada sem interromper a importação das demais.
+    """
+    if formato == 'csv':
+        for dados in csv.DictReader(arquivo):
+            yield dados, None
+    else:
+        for linha in arquivo:
+            linha = linha.strip()
+            if not linha:
+                continue
+            try:
+                dados = json.loads(linha)
+            except ValueError:
+                yield {}, 'Linha não é um JSON válido.'
+                continue
+            if isinstance(dados, dict):
+                yield dados, None
+            else:
+                yield {}, 'Linha não é um objeto JSON.'
+
+
+def validar_registro(dados, tipo_padrao):
+    """
+    Aplica as mesmas regras dos formulários de cadastro a um registro.
+    Retorna (registro normalizado, None) ou (None, mensagem de erro). Os dígitos
+    verificadores do CPF são conferidos depois, para o lote inteiro (filtrar_cpfs).
+    """
+    dados = {chave: (valor.strip() if isinstance(valor, str) else valor)
+             for chave, valor in dados.items()}
+    tipo = dados.get('tipo') or tipo_padrao
+    if tipo not in TIPOS:
+        return None, 'Tipo deve ser "paciente" ou "medico".'
+
+    for campo in ('name', 'email', 'password'):
+        if not dados.get(campo):
+            return None, f'Campo obrigatório ausente: {campo}.'
+        if not isinstance(dados[campo], str):
+            return None, f'Campo {campo} deve ser texto.'
+    if not validar_email(dados['email']):
+        return None, 'E-mail inválido.'
+
+    valida, mensagem = validar_senha(dados['password'])
+    if not valida:
+        return None, mensagem
+
+    registro = {
+        'tipo': tipo,
+        'name': dados['name'],
+        'email': dados['email'],
+        'password': dados['password'],
+    }
+
+    if tipo == 'paciente':
+        cpf = ''.join(filter(str.isdigit, str(dados.get('cpf') or '')))
+        try:
+            registro['data_nascimento'] = datetime.datetime.strptime(
+                dados.get('data_nascimento') or '', '%Y-%m-%d')
+        except (TypeError, ValueError):
+            return None, 'Data de nascimento inválida (use AAAA-MM-DD).'
+        registro['cpf'] = cpf
+    else:
+        if not dados.get('crm'):
+            return None, 'Campo obrigatório ausente: crm.'
+        if not dados.get('especialidade'):
+            return None, 'Campo obrigatório ausente: especialidade.'
+        registro['crm'] = str(dados['crm'])
+        registro['especialidade'] = dados['especialidade']
+
+    return registro, None
+
+
+def filtrar_cpfs(lote):
+    """
+    Confere de uma vez os CPFs dos pacientes do lote (validar_cpfs, mesma regra do
+    validar_cpf dos formulários). Retorna (lote sem os inválidos, [(numero, registro, erro)]).
+    """
+    pacientes = [(numero, registro) for numero, registro in lote if 'cpf' in registro]
+    if not pacientes:
+        return lote, []
+    validos, _ = validar_cpfs([registro['cpf'] for _, registro in pacientes])
+    invalidos = {numero for (numero, _), valido in zip(pacientes, validos) if not valido}
+    return (
+        [(numero, registro) for numero, registro in lote if numero not in invalidos],
+        [(numero, registro, 'CPF inválido. Verifique os dígitos informados.')
+         for numero, registro in pacientes if numero in invalidos],
+    )
+
+
+def _ja_cadastrados(coluna, valores):
+    """Quais dos valores já existem na coluna (uma consulta por lote)."""
+    if not valores:
+        return set()
+    return set(db.session.scalars(db.select(coluna).where(coluna.in_(valores))))
+
+
+def filtrar_duplicados(lote):
+    """
+    Separa os registros do lote que colidem com o banco ou entre si
+    (e-mail, CPF ou CRM). Retorna (registros aceitos, [(numero, registro, erro)]).
+    """
+    emails = _ja_cadastrados(User.__table__.c.email, [registro['email'] for _, registro in lote])
+    cpfs = _ja_cadastrados(Paciente.__table__.c.cpf,
+                           [registro['cpf'] for _, registro in lote if 'cpf' in registro])
+    crms = _ja_cadastrados(Medico.__table__.c.crm,
+                           [registro['crm'] for _, registro in lote if 'crm' in registro])
+
+    aceitos, erros = [], []
+    for numero, registro in lote:
+        if registro['email'] in emails:
+            erros.append((numero, registro, 'Este e-mail já está cadastrado.'))
+        elif 'cpf' in registro and registro['cpf'] in cpfs:
+            erros.append((numero, registro, 'Este CPF já está cadastrado.'))
+        elif 'crm' in registro and registro['crm'] in crms:
+            erros.append((numero, registro, 'Este CRM já está cadastrado.'))
+        else:
+            # Registra no conjunto para barrar repetições dentro do próprio lote
+            emails.add(registro['email'])
+            if 'cpf' in registro:
+                cpfs.add(registro['cpf'])
+            if 'crm' in registro:
+                crms.add(registro['crm'])
+            aceitos.append(registro)
+    return aceitos, erros
+
+
+def inserir_lote(registros):
+    """Grava os usuários do lote com um INSERT em lote por tabela."""
+    hashes = gerar_hashes([registro['password'] for registro in registros])
+
+    users = User.__table__
+    ids = db.session.scalars(
+        insert(users).returning(users.c.id, sort_by_parameter_order=True),
+        [
+            {
+                'email': registro['email'],
+                'name': registro['name'],
+                'password_hash': password_hash,
+                'user_type': registro['tipo'],
+            }
+            for registro, password_hash in zip(registros, hashes)
+        ]
+    ).all()
+
+    pacientes, medicos = [], []
+    for user_id, registro in zip(ids, registros):
+        if registro['tipo'] == 'paciente':
+            pacientes.append({'id': user_id, 'cpf': registro['cpf'],
+                              'data_nascimento': registro['data_nascimento']})
+        else:
+            medicos.append({'id': user_id, 'crm': registro['crm'],
+                            'especialidade': registro['especialidade']})
+    if pacientes:
+        db.session.execute(insert(Paciente.__table__), pacientes)
+    if medicos:
+        db.session.execute(insert(Medico.__table__), medicos)
+    db.session.commit()
+
+    # INSERT em lote não dispara os eventos do ORM; o catálogo é descartado manualmente
+    if medicos:
+        invalidar_catalogo()
+
+
+def _ler_checkpoint(caminho, arquivo):
+    if not caminho or not os.path.exists(caminho):
+        return 0
+    with open(caminho) as f:
+        checkpoint = json.load(f)
+    if checkpoint.get('arquivo') != os.path.abspath(arquivo):
+        raise click.ClickException(f'O checkpoint {caminho} pertence a outro arquivo.')
+    return checkpoint['registros']
+
+
+def _gravar_checkpoint(caminho, arquivo, registros):
+    if not caminho:
+        return
+    temporario = caminho + '.tmp'
+    with open(temporario, 'w') as f:
+        json.dump({'arquivo': os.path.abspath(arquivo), 'registros': registros}, f)
+    os.replace(temporario, caminho)
+
+
+@app.cli.command('import-users')
+@click.argument('arquivo', type=click.Path(exists=True, dir_okay=False))
+@click.option('--formato', type=click.Choice(['csv', 'ndjson']),
+              help='Formato do arquivo (padrão: pela extensão).')
+@click.option('--tipo', type=click.Choice(TIPOS),
+              help='Tipo dos registros sem a coluna "tipo".')
+@click.option('--lote', default=1000, show_default=True, help='Registros por lote.')
+@click.option('--checkpoint', type=click.Path(dir_okay=False),
+              help='Arquivo de progresso para retomar uma importação interrompida.')
+@click.option('--erros', type=click.Path(dir_okay=False),
+              help='Relatório CSV com os registros rejeitados.')
+def importar_usuarios(arquivo, formato, tipo, lote, checkpoint, erros):
+    """Importa pacientes e médicos de um arquivo CSV ou NDJSON."""
+    formato = formato or ('csv' if arquivo.lower().endswith('.csv') else 'ndjson')
+    inicio = _ler_checkpoint(checkpoint, arquivo)
+    if inicio:
+        click.echo(f'Retomando após o registro {inicio}.')
+
+    relatorio = None
+    if erros:
+        novo = not (inicio and os.path.exists(erros))
+        relatorio_arquivo = open(erros, 'w' if novo else 'a', newline='')
+        relatorio = csv.writer(relatorio_arquivo)
+        if novo:
+            relatorio.writerow(['registro', 'email', 'erro'])
+
+    importados = rejeitados = 0
+
+    def processar(pendentes, recusados, ultimo):
+        # As recusas do lote só vão para o relatório junto com o checkpoint dele: se a
+        # importação parar antes, o lote é refeito na retomada sem linhas repetidas.
+        nonlocal importados, rejeitados
+        pendentes, cpfs_invalidos = filtrar_cpfs(pendentes)
+        aceitos, duplicados = filtrar_duplicados(pendentes)
+        if aceitos:
+            inserir_lote(aceitos)
+        recusados = sorted(recusados + [
+            (numero, registro['email'], mensagem)
+            for numero, registro, mensagem in cpfs_invalidos + duplicados
+        ])
+        if relatorio:
+            relatorio.writerows(recusados)
+            # O relatório chega ao disco antes do checkpoint que o torna definitivo
+            relatorio_arquivo.flush()
+            os.fsync(relatorio_arquivo.fileno())
+        importados += len(aceitos)
+        rejeitados += len(recusados)
+        _gravar_checkpoint(checkpoint, arquivo, ultimo)
+
+    try:
+        with open(arquivo, newline='', encoding='utf-8') as f:
+            pendentes, recusados = [], []
+            numero = 0
+            for numero, (dados, mensagem) in enumerate(ler_registros(f, formato), start=1):
+                if numero <= inicio:
+                    continue
+                registro = None
+                if not mensagem:
+                    registro, mensagem = validar_registro(dados, tipo)
+                if mensagem:
+                    recusados.append((numero, dados.get('email', ''), mensagem))
+                else:
+                    pendentes.append((numero, registro))
+
+                if len(pendentes) + len(recusados) >= lote:
+                    processar(pendentes, recusados, numero)
+                    pendentes, recusados = [], []
+
+            processar(pendentes, recusados, numero)
+    finally:
+        if relatorio:
+            relatorio_arquivo.close()
+
+    click.echo(f'{importados} usuário(s) importado(s), {rejeitados} rejeitado(s).')
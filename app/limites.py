@@ -0,0 +1,102 @@
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import urlparse
+from limits.storage import Storage
+
+
+# [SEGURANÇA] Armazenamento dos contadores do Flask-Limiter compartilhado entre todos os
+# workers do mesmo servidor. Com "memory://" cada processo do gunicorn conta as
+# tentativas de login separadamente (5/min vira 5 x workers) e tudo se perde ao
+# reiniciar. Aqui os contadores ficam num arquivo SQLite em modo WAL, atualizado com
+# um único UPSERT atômico, sem depender de Redis ou outro serviço externo.
+#
+# Uso: storage_uri = "medeasy+sqlite:////caminho/para/limites.db"
+
+
+def uri_na_instancia(app):
+    """
+    URI padrão: limites.db na pasta instance/ da aplicação, que é do próprio
+    deploy e sobrevive a reinícios. O diretório temporário do sistema é
+    compartilhado com outros usuários e pode ser limpo a qualquer momento.
+    """
+    os.makedirs(app.instance_path, exist_ok=True)
+    return 'medeasy+sqlite:///' + os.path.join(app.instance_path, 'limites.db')
+
+
+class SQLiteStorage(Storage):
+    STORAGE_SCHEME = ['medeasy+sqlite']
+
+    # A cada quantos incrementos os contadores expirados são apagados do arquivo
+    INTERVALO_LIMPEZA = 1000
+
+    def __init__(self, uri=None, wrap_exceptions=False, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        self.caminho = urlparse(uri).path
+        self._local = threading.local()
+        self._incrementos = 0
+        self._conexao().executescript('''
+            CREATE TABLE IF NOT EXISTS limites (
+                chave TEXT PRIMARY KEY,
+                valor INTEGER NOT NULL,
+                expira_em REAL NOT NULL
+            ) WITHOUT ROWID;
+        ''')
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def _conexao(self):
+        # Uma conexão por thread e por processo (o gunicorn faz fork depois do import)
+        conexao = getattr(self._local, 'conexao', None)
+        if conexao is None or self._local.pid != os.getpid():
+            conexao = sqlite3.connect(self.caminho, timeout=5, isolation_level=None)
+            conexao.execute('PRAGMA journal_mode=WAL')
+            conexao.execute('PRAGMA synchronous=NORMAL')
+            self._local.conexao = conexao
+            self._local.pid = os.getpid()
+        return conexao
+
+    def incr(self, key, expiry, amount=1):
+        agora = time.time()
+        # Se a janela anterior expirou, o contador recomeça; senão é somado.
+        # Uma só instrução: o SQLite garante a atomicidade entre processos.
+        valor, = self._conexao().execute('''
+            INSERT INTO limites (chave, valor, expira_em) VALUES (?, ?, ?)
+            ON CONFLICT (chave) DO UPDATE SET
+                valor = CASE WHEN expira_em <= ? THEN excluded.valor ELSE valor + excluded.valor END,
+                expira_em = CASE WHEN expira_em <= ? THEN excluded.expira_em ELSE expira_em END
+            RETURNING valor
+        ''', (key, amount, agora + expiry, agora, agora)).fetchone()
+
+        self._incrementos += 1
+        if self._incrementos % self.INTERVALO_LIMPEZA == 0:
+            self._conexao().execute('DELETE FROM limites WHERE expira_em <= ?', (agora,))
+        return valor
+
+    def get(self, key):
+        linha = self._conexao().execute(
+            'SELECT valor FROM limites WHERE chave = ? AND expira_em > ?', (key, time.time())
+        ).fetchone()
+        return linha[0] if linha else 0
+
+    def get_expiry(self, key):
+        linha = self._conexao().execute(
+            'SELECT expira_em FROM limites WHERE chave = ? AND expira_em > ?', (key, time.time())
+        ).fetchone()
+        return linha[0] if linha else time.time()
+
+    def check(self):
+        try:
+            self._conexao().execute('SELECT 1')
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self):
+        return self._conexao().execute('DELETE FROM limites').rowcount
+
+    def clear(self, key):
+        self._conexao().execute('DELETE FROM limites WHERE chave = ?', (key,))
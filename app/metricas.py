@@ -0,0 +1,212 @@
+import bisect
+import threading
+import time
+from collections import defaultdict, deque
+from flask import g, has_app_context, request, template_rendered, before_render_template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app import app
+
+
+# Instrumentação por requisição: quantidade e tempo de SQL (e quantas consultas
+# saíram de dentro de templates, sinal de lazy load), tempo de Jinja, de hashing de
+# senha e total. Cada resposta recebe um cabeçalho Server-Timing e os valores vão
+# para histogramas por rota, expostos em /metrics no formato do Prometheus.
+#
+# Desligada (METRICAS_ATIVAS=0, padrão) nenhum listener é registrado: o custo é zero.
+# Os histogramas são por processo; com vários workers, cada um é coletado à parte.
+# Em respostas em streaming (prontuário, exportação) o total não inclui o envio do corpo.
+
+ATIVAS = app.config.get('METRICAS_ATIVAS', False)
+
+BUCKETS_SEGUNDOS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BUCKETS_CONSULTAS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+PERCENTIS = (0.5, 0.9, 0.95, 0.99)
+# Quantas durações recentes por rota entram no cálculo dos percentis
+AMOSTRAS_POR_ROTA = 1024
+
+
+class Histograma(object):
+    __slots__ = ('buckets', 'contagens', 'soma', 'total')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.contagens = [0] * len(buckets)
+        self.soma = 0
+        self.total = 0
+
+    def observar(self, valor):
+        indice = bisect.bisect_left(self.buckets, valor)
+        if indice < len(self.contagens):
+            self.contagens[indice] += 1
+        self.soma += valor
+        self.total += 1
+
+
+# (métrica, rota) -> Histograma; rota -> durações recentes
+_lock = threading.Lock()
+_histogramas = {}
+_amostras = defaultdict(lambda: deque(maxlen=AMOSTRAS_POR_ROTA))
+
+METRICAS = {
+    # nome: (descrição, buckets)
+    'medeasy_requisicao_segundos': ('Duração total da requisição.', BUCKETS_SEGUNDOS),
+    'medeasy_sql_segundos': ('Tempo gasto em SQL por requisição.', BUCKETS_SEGUNDOS),
+    'medeasy_sql_consultas': ('Consultas SQL por requisição.', BUCKETS_CONSULTAS),
+    'medeasy_sql_consultas_em_template': ('Consultas SQL disparadas durante a renderização (lazy load).',
+                                          BUCKETS_CONSULTAS),
+    'medeasy_template_segundos': ('Tempo de renderização Jinja por requisição.', BUCKETS_SEGUNDOS),
+    'medeasy_senha_segundos': ('Tempo de hashing/verificação de senha por requisição.', BUCKETS_SEGUNDOS),
+}
+
+
+def _medicao_atual():
+    # SQL também roda fora de requisições (CLI, worker), às vezes sem contexto da aplicação
+    return g.get('_medicao') if has_app_context() else None
+
+
+def registrar_tempo(nome, segundos):
+    """Soma um tempo medido fora do SQL/Jinja (ex.: 'senha') à requisição atual."""
+    medicao = _medicao_atual() if ATIVAS else None
+    if medicao is not None:
+        medicao[nome] = medicao.get(nome, 0.0) + segundos
+
+
+def _observar(rota, medicao, total):
+    valores = {
+        'medeasy_requisicao_segundos': total,
+        'medeasy_sql_segundos': medicao['sql'],
+        'medeasy_sql_consultas': medicao['consultas'],
+        'medeasy_sql_consultas_em_template': medicao['consultas_template'],
+        'medeasy_template_segundos': medicao['template'],
+        'medeasy_senha_segundos': medicao.get('senha', 0.0),
+    }
+    with _lock:
+        for nome, valor in valores.items():
+            histograma = _histogramas.get((nome, rota))
+            if histograma is None:
+                histograma = _histogramas[(nome, rota)] = Histograma(METRICAS[nome][1])
+            histograma.observar(valor)
+        _amostras[rota].append(total)
+
+
+def _server_timing(medicao, total):
+    partes = [
+        f'db;dur={medicao["sql"] * 1000:.1f};desc="{medicao["consultas"]} consultas'
+        f' ({medicao["consultas_template"]} em template)"',
+        f'tpl;dur={medicao["template"] * 1000:.1f}',
+    ]
+    if 'senha' in medicao:
+        partes.append(f'senha;dur={medicao["senha"] * 1000:.1f}')
+    partes.append(f'total;dur={total * 1000:.1f}')
+    return ', '.join(partes)
+
+
+def _percentil(ordenados, quantil):
+    return ordenados[min(int(quantil * len(ordenados)), len(ordenados) - 1)]
+
+
+def exportar_prometheus():
+    """Texto no formato de exposição do Prometheus com todas as métricas."""
+    # Importados aqui para evitar import circular (models -> senhas -> metricas)
+    from app.prontuario import estatisticas_cache_timeline
+    from app.fragmentos import estatisticas_cache_fragmentos
+
+    linhas = []
+    with _lock:
+        por_metrica = defaultdict(list)
+        for (nome, rota), histograma in sorted(_histogramas.items()):
+            por_metrica[nome].append((rota, histograma))
+
+        for nome, (descricao, buckets) in METRICAS.items():
+            linhas.append(f'# HELP {nome} {descricao}')
+            linhas.append(f'# TYPE {nome} histogram')
+            for rota, histograma in por_metrica.get(nome, ()):
+                acumulado = 0
+                for limite, contagem in zip(buckets, histograma.contagens):
+                    acumulado += contagem
+                    linhas.append(f'{nome}_bucket{{rota="{rota}",le="{limite}"}} {acumulado}')
+                linhas.append(f'{nome}_bucket{{rota="{rota}",le="+Inf"}} {histograma.total}')
+                linhas.append(f'{nome}_sum{{rota="{rota}"}} {histograma.soma}')
+                linhas.append(f'{nome}_count{{rota="{rota}"}} {histograma.total}')
+
+        nome = 'medeasy_requisicao_recente_segundos'
+        linhas.append(f'# HELP {nome} Percentis da duração das últimas {AMOSTRAS_POR_ROTA} requisições por rota.')
+        linhas.append(f'# TYPE {nome} summary')
+        for rota, amostras in sorted(_amostras.items()):
+            ordenados = sorted(amostras)
+            for quantil in PERCENTIS:
+                linhas.append(f'{nome}{{rota="{rota}",quantile="{quantil}"}} {_percentil(ordenados, quantil)}')
+            linhas.append(f'{nome}_sum{{rota="{rota}"}} {sum(ordenados)}')
+            linhas.append(f'{nome}_count{{rota="{rota}"}} {len(ordenados)}')
+
+    caches = {
+        'timeline': estatisticas_cache_timeline(),
+        'fragmentos': estatisticas_cache_fragmentos(),
+    }
+    for contador, chave in (('medeasy_cache_acertos_total', 'acertos'), ('medeasy_cache_falhas_total', 'falhas')):
+        linhas.append(f'# TYPE {contador} counter')
+        for cache, estatisticas in caches.items():
+            linhas.append(f'{contador}{{cache="{cache}"}} {estatisticas[chave]}')
+
+    return '\n'.join(linhas) + '\n'
+
+
+def _antes_da_execucao(conn, cursor, statement, parameters, context, executemany):
+    medicao = _medicao_atual()
+    if medicao is not None:
+        conn.info['_inicio_sql'] = time.perf_counter()
+
+
+def _depois_da_execucao(conn, cursor, statement, parameters, context, executemany):
+    medicao = _medicao_atual()
+    inicio = conn.info.pop('_inicio_sql', None)
+    if medicao is not None and inicio is not None:
+        medicao['sql'] += time.perf_counter() - inicio
+        medicao['consultas'] += 1
+        if medicao['profundidade_template']:
+            medicao['consultas_template'] += 1
+
+
+def _antes_do_template(sender, template, context, **extra):
+    medicao = _medicao_atual()
+    if medicao is not None:
+        # Templates aninhados (fragmentos) contam uma vez só, no mais externo
+        if not medicao['profundidade_template']:
+            medicao['_inicio_template'] = time.perf_counter()
+        medicao['profundidade_template'] += 1
+
+
+def _template_renderizado(sender, template, context, **extra):
+    medicao = _medicao_atual()
+    if medicao is not None and medicao['profundidade_template']:
+        medicao['profundidade_template'] -= 1
+        if not medicao['profundidade_template']:
+            medicao['template'] += time.perf_counter() - medicao.pop('_inicio_template')
+
+
+def _iniciar_medicao():
+    g._medicao = {
+        'inicio': time.perf_counter(),
+        'sql': 0.0, 'consultas': 0, 'consultas_template': 0,
+        'template': 0.0, 'profundidade_template': 0,
+    }
+
+
+def _finalizar_medicao(resposta):
+    medicao = g.pop('_medicao', None)
+    if medicao is None or request.endpoint == 'metrics':
+        return resposta
+    total = time.perf_counter() - medicao['inicio']
+    resposta.headers['Server-Timing'] = _server_timing(medicao, total)
+    _observar(request.endpoint or 'nao_encontrada', medicao, total)
+    return resposta
+
+
+if ATIVAS:
+    event.listen(Engine, 'before_cursor_execute', _antes_da_execucao)
+    event.listen(Engine, 'after_cursor_execute', _depois_da_execucao)
+    before_render_template.connect(_antes_do_template, app)
+    template_rendered.connect(_template_renderizado, app)
+    app.before_request(_iniciar_medicao)
+    app.after_request(_finalizar_medicao)
@@ -1,8 +1,10 @@
 import datetime
+from sqlalchemy import text
 from app import db
-from werkzeug.security import generate_password_hash, check_password_hash
-# [SEGURANÇA] generate_password_hash() transforma uma senha em texto puro num hash scrypt seguro.
-# check_password_hash() compara uma senha digitada com um hash armazenado sem precisar decifrar o hash.
+from app.senhas import gerar_hash, verificar_senha, precisa_rehash
+# [SEGURANÇA] gerar_hash() transforma uma senha em texto puro num hash scrypt seguro.
+# verificar_senha() compara uma senha digitada com um hash armazenado sem precisar decifrar o hash.
+# Ambas usam o werkzeug, mas rodam num pool limitado de processos (ver app/senhas.py).
 
 class User(db.Model):
     __tablename__ = 'users'
@@ -18,10 +20,14 @@ class User(db.Model):
     }
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = gerar_hash(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return verificar_senha(self.password_hash, password)
+
+    def senha_precisa_rehash(self):
+        """Indica se o hash foi gerado com parâmetros diferentes dos configurados."""
+        return precisa_rehash(self.password_hash)
 
     def is_authenticated(self):
         return True
@@ -66,14 +72,58 @@ class Paciente(User):
     def __repr__(self):
         return f'<Paciente {self.name}, CPF: {self.cpf}>'
 
+# Status que ocupam o horário do médico
+STATUS_ATIVOS = ('Agendada', 'Confirmada')
+
+# Nome do índice único parcial que garante um único agendamento ativo por horário
+INDICE_HORARIO_ATIVO = 'uq_consultas_medico_horario_ativo'
+
+
+def conflito_de_horario(erro):
+    """
+    Indica se uma IntegrityError foi causada pelo índice único de horário
+    (PostgreSQL informa o nome do índice; SQLite informa as colunas).
+    """
+    mensagem = str(getattr(erro, 'orig', erro))
+    return (INDICE_HORARIO_ATIVO in mensagem
+            or 'consultas.medico_id, consultas.data_hora' in mensagem)
+
+
 class Consulta(db.Model):
     __tablename__ = 'consultas'
+    # Índices compostos para a agenda do médico (e checagem de conflito de horário)
+    # e para a listagem do paciente, ambas ordenadas por data_hora.
+    __table_args__ = (
+        db.Index('ix_consultas_medico_id_data_hora', 'medico_id', 'data_hora'),
+        db.Index('ix_consultas_paciente_id_data_hora', 'paciente_id', 'data_hora'),
+        # Última alteração das consultas de cada médico/paciente (validadores HTTP)
+        db.Index('ix_consultas_medico_id_atualizada_em', 'medico_id', 'atualizada_em'),
+        db.Index('ix_consultas_paciente_id_atualizada_em', 'paciente_id', 'atualizada_em'),
+        # Ocorrências de uma série de consultas recorrentes, em ordem
+        db.Index('ix_consultas_serie_id_data_hora', 'serie_id', 'data_hora'),
+        # Índice único parcial: o próprio banco impede dois agendamentos ativos
+        # (Agendada/Confirmada) do mesmo médico no mesmo horário, mesmo com
+        # requisições concorrentes.
+        db.Index(
+            INDICE_HORARIO_ATIVO, 'medico_id', 'data_hora',
+            unique=True,
+            sqlite_where=text("status IN ('Agendada', 'Confirmada')"),
+            postgresql_where=text("status IN ('Agendada', 'Confirmada')")
+        ),
+    )
     id = db.Column(db.Integer, primary_key=True)
     data_hora = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
     status = db.Column(db.String(50), default='Agendada', nullable=False)
+    # Versão da consulta: muda a cada INSERT/UPDATE (inclusive UPDATEs em lote do Core)
+    atualizada_em = db.Column(db.DateTime, default=datetime.datetime.utcnow,
+                              onupdate=datetime.datetime.utcnow)
+    # Momento do agendamento (antecedência nos relatórios); nulo nas consultas anteriores à coluna
+    criada_em = db.Column(db.DateTime, default=datetime.datetime.utcnow)
 
     paciente_id = db.Column(db.Integer, db.ForeignKey('pacientes.id'), nullable=False)
     medico_id = db.Column(db.Integer, db.ForeignKey('medicos.id'), nullable=False)
+    # Série recorrente da qual a consulta faz parte (nulo nas consultas avulsas)
+    serie_id = db.Column(db.Integer, db.ForeignKey('series_consultas.id'))
 
     paciente = db.relationship('Paciente', backref=db.backref('consultas', lazy=True))
     medico = db.relationship('Medico', backref=db.backref('consultas', lazy=True))
@@ -83,8 +133,31 @@ class Consulta(db.Model):
     def __repr__(self):
         return f'<Consulta {self.id} - {self.paciente.name} com {self.medico.name} em {self.data_hora}>'
 
+class SerieConsultas(db.Model):
+    """
+    Consultas recorrentes: mesmo paciente, médico e horário a cada
+    intervalo_semanas semanas. As ocorrências são linhas comuns de "consultas"
+    com serie_id preenchido (ver app/series.py).
+    """
+    __tablename__ = 'series_consultas'
+    id = db.Column(db.Integer, primary_key=True)
+    intervalo_semanas = db.Column(db.Integer, nullable=False)
+    criada_em = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+
+    paciente_id = db.Column(db.Integer, db.ForeignKey('pacientes.id'), nullable=False)
+    medico_id = db.Column(db.Integer, db.ForeignKey('medicos.id'), nullable=False)
+
+    paciente = db.relationship('Paciente')
+    medico = db.relationship('Medico')
+
+    def __repr__(self):
+        return f'<SerieConsultas {self.id} a cada {self.intervalo_semanas} semana(s)>'
+
 class Evolucao(db.Model):
     __tablename__ = 'evolucoes'
+    __table_args__ = (
+        db.Index('ix_evolucoes_consulta_id_data_criacao', 'consulta_id', 'data_criacao'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     conteudo = db.Column(db.Text, nullable=False)
     data_criacao = db.Column(db.DateTime, default=datetime.datetime.utcnow)
@@ -100,6 +173,9 @@ class Evolucao(db.Model):
 
 class Receita(db.Model):
     __tablename__ = 'receitas'
+    __table_args__ = (
+        db.Index('ix_receitas_consulta_id_timestamp', 'consulta_id', 'timestamp'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     descricao = db.Column(db.Text, nullable=False)
     timestamp = db.Column(db.DateTime, index=True, default=datetime.datetime.utcnow)
@@ -107,4 +183,47 @@ class Receita(db.Model):
     consulta_id = db.Column(db.Integer, db.ForeignKey('consultas.id'), nullable=False)
 
     def __repr__(self):
-        return f'<Receita {self.id} da Consulta {self.consulta_id}>'
\ No newline at end of file
+        return f'<Receita {self.id} da Consulta {self.consulta_id}>'
+
+class Notificacao(db.Model):
+    """
+    Caixa de saída (outbox) de notificações por e-mail. A linha é gravada na mesma
+    transação da mudança de status da consulta e enviada depois pelo worker
+    (flask worker), fora do ciclo da requisição.
+    """
+    __tablename__ = 'notificacoes'
+    __table_args__ = (
+        # Fila do worker: pendentes cuja próxima tentativa já venceu
+        db.Index('ix_notificacoes_status_proxima_tentativa', 'status', 'proxima_tentativa'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    tipo = db.Column(db.String(20), nullable=False)
+    # Mesma chave = mesma notificação; o worker envia apenas uma delas
+    chave = db.Column(db.String(120), nullable=False, index=True)
+    status = db.Column(db.String(20), default='pendente', nullable=False)
+    tentativas = db.Column(db.Integer, default=0, nullable=False)
+    proxima_tentativa = db.Column(db.DateTime, default=datetime.datetime.utcnow, nullable=False)
+    ultimo_erro = db.Column(db.Text)
+    criada_em = db.Column(db.DateTime, default=datetime.datetime.utcnow, nullable=False)
+    enviada_em = db.Column(db.DateTime)
+
+    consulta_id = db.Column(db.Integer, db.ForeignKey('consultas.id'), nullable=False)
+    destinatario_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+
+    def __repr__(self):
+        return f'<Notificacao {self.id} {self.tipo} da Consulta {self.consulta_id}>'
+
+class ContadorAgenda(db.Model):
+    """
+    Resumo da agenda: quantidade de consultas por médico, dia e status. Mantido
+    pelos eventos de Consulta na mesma transação de cada mudança (ver
+    app/contadores.py), para o painel do médico não contar a tabela de consultas.
+    """
+    __tablename__ = 'contadores_agenda'
+    medico_id = db.Column(db.Integer, db.ForeignKey('medicos.id'), primary_key=True)
+    dia = db.Column(db.Date, primary_key=True)
+    status = db.Column(db.String(50), primary_key=True)
+    total = db.Column(db.Integer, default=0, nullable=False)
+
+    def __repr__(self):
+        return f'<ContadorAgenda medico={self.medico_id} {self.dia} {self.status}: {self.total}>'
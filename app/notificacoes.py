@@ -0,0 +1,244 @@
+import datetime
+import time
+import click
+from flask_mail import Mail, Message
+from sqlalchemy import String, cast, exists, literal, update
+from app import app, db
+from app.models import User, Consulta, Notificacao, STATUS_ATIVOS
+
+
+# Notificações por e-mail com caixa de saída (transactional outbox): as views só
+# gravam linhas em "notificacoes" na mesma transação da mudança de status, sem
+# esperar pelo SMTP. O worker (flask worker) lê as pendentes em lotes, envia por
+# uma única conexão SMTP, refaz as que falharam com espera crescente e descarta
+# duplicadas (mesma chave). Para testar localmente, aponte MAIL_SERVER/MAIL_PORT
+# para um servidor SMTP de teste (ex.: python -m aiosmtpd -n -l localhost:1025).
+
+mail = Mail(app)
+
+# Quem recebe cada tipo de notificação
+DESTINATARIOS = {
+    'agendada': ('paciente', 'medico'),
+    'confirmada': ('paciente',),
+    'cancelada': ('paciente', 'medico'),
+    'finalizada': ('paciente',),
+    'lembrete': ('paciente',),
+    # Séries recorrentes: um único aviso para a série inteira, com a data da primeira ocorrência
+    'serie_agendada': ('paciente', 'medico'),
+    'serie_alterada': ('paciente', 'medico'),
+    'serie_cancelada': ('paciente', 'medico'),
+}
+
+ASSUNTOS = {
+    'agendada': 'Consulta agendada',
+    'confirmada': 'Consulta confirmada',
+    'cancelada': 'Consulta cancelada',
+    'finalizada': 'Consulta finalizada',
+    'lembrete': 'Lembrete: sua consulta é amanhã',
+    'serie_agendada': 'Consultas recorrentes agendadas',
+    'serie_alterada': 'Consultas recorrentes alteradas',
+    'serie_cancelada': 'Consultas recorrentes canceladas',
+}
+
+MENSAGENS = {
+    'agendada': 'A consulta com Dr(a). {medico} em {data} foi agendada.',
+    'confirmada': 'Sua consulta com Dr(a). {medico} em {data} foi confirmada.',
+    'cancelada': 'A consulta com Dr(a). {medico} em {data} foi cancelada.',
+    'finalizada': 'Sua consulta com Dr(a). {medico} em {data} foi finalizada. '
+                  'As evoluções e receitas estão disponíveis no MedEasy.',
+    'lembrete': 'Lembramos que sua consulta com Dr(a). {medico} é amanhã, {data}.',
+    'serie_agendada': 'As consultas recorrentes com Dr(a). {medico} foram agendadas, a partir de {data}. '
+                      'Veja todas as datas no MedEasy.',
+    'serie_alterada': 'O horário das consultas recorrentes com Dr(a). {medico} foi alterado; '
+                      'a próxima é em {data}.',
+    'serie_cancelada': 'As consultas recorrentes com Dr(a). {medico} a partir de {data} foram canceladas.',
+}
+
+
+def _chave(tipo, consulta_id, destinatario_id, data_hora):
+    # Um aviso de cada tipo por consulta, destinatário e horário marcado
+    return f'{tipo}:{consulta_id}:{destinatario_id}:{data_hora.isoformat()}'
+
+
+def enfileirar_notificacao(consulta, tipo):
+    """
+    Adiciona à sessão as notificações do evento; são gravadas no commit da
+    própria view, junto com a mudança de status. A consulta precisa ter id (flush).
+    """
+    for papel in DESTINATARIOS[tipo]:
+        destinatario_id = consulta.paciente_id if papel == 'paciente' else consulta.medico_id
+        db.session.add(Notificacao(
+            tipo=tipo,
+            chave=_chave(tipo, consulta.id, destinatario_id, consulta.data_hora),
+            consulta_id=consulta.id,
+            destinatario_id=destinatario_id
+        ))
+
+
+def gerar_lembretes(agora=None):
+    """
+    Enfileira, com um único INSERT ... SELECT, o lembrete de todas as consultas
+    ativas do dia seguinte que ainda não têm lembrete. Retorna quantos foram criados.
+    agora é a hora local, a mesma em que data_hora das consultas é gravada.
+    """
+    # "Amanhã" pelo relógio local: em UTC, a partir das 21h de Brasília o dia já
+    # virou e os lembretes sairiam para as consultas de depois de amanhã
+    agora = agora or datetime.datetime.now()
+    # Os horários da fila seguem em UTC, como os do worker (processar_lote)
+    registrada_em = datetime.datetime.utcnow()
+    amanha = datetime.datetime.combine(agora.date() + datetime.timedelta(days=1), datetime.time.min)
+    depois = amanha + datetime.timedelta(days=1)
+
+    chave = (
+        literal('lembrete:') + cast(Consulta.id, String) + literal(':')
+        + cast(Consulta.paciente_id, String) + literal(f':{amanha.date().isoformat()}')
+    )
+    ja_existe = exists().where(Notificacao.chave == chave)
+    selecao = (
+        db.select(
+            literal('lembrete'), chave, literal('pendente'), literal(0), literal(registrada_em),
+            literal(registrada_em), Consulta.id, Consulta.paciente_id
+        )
+        .where(
+            Consulta.data_hora >= amanha,
+            Consulta.data_hora < depois,
+            Consulta.status.in_(STATUS_ATIVOS),
+            ~ja_existe
+        )
+    )
+    resultado = db.session.execute(
+        Notificacao.__table__.insert().from_select(
+            ['tipo', 'chave', 'status', 'tentativas', 'proxima_tentativa',
+             'criada_em', 'consulta_id', 'destinatario_id'],
+            selecao
+        )
+    )
+    db.session.commit()
+    return resultado.rowcount
+
+
+def _espera(tentativas):
+    """Espera antes da próxima tentativa: 1, 2, 4, 8... minutos (máximo de 1 hora)."""
+    return datetime.timedelta(minutes=min(2 ** (tentativas - 1), 60))
+
+
+def _montar_mensagem(linha):
+    texto = MENSAGENS[linha.tipo].format(
+        medico=linha.medico,
+        data=linha.data_hora.strftime('%d/%m/%Y às %H:%M')
+    )
+    return Message(
+        subject=f'MedEasy - {ASSUNTOS[linha.tipo]}',
+        recipients=[linha.email],
+        body=f'Olá, {linha.nome}!\n\n{texto}\n\nEquipe MedEasy'
+    )
+
+
+def _marcar(ids, **valores):
+    if ids:
+        db.session.execute(update(Notificacao).where(Notificacao.id.in_(ids)).values(**valores))
+
+
+def processar_lote(tamanho=None, agora=None):
+    """
+    Envia um lote de notificações pendentes. Retorna quantas foram processadas
+    (enviadas, descartadas ou reagendadas); 0 quando a fila está vazia.
+    """
+    tamanho = tamanho or app.config.get('NOTIFICACOES_LOTE', 100)
+    max_tentativas = app.config.get('NOTIFICACOES_MAX_TENTATIVAS', 5)
+    agora = agora or datetime.datetime.utcnow()
+
+    destinatarios = User.__table__.alias('destinatarios')
+    medicos = User.__table__.alias('nomes_medicos')
+    # SKIP LOCKED (PostgreSQL): vários workers dividem a fila sem pegar a mesma linha
+    linhas = db.session.execute(
+        db.select(
+            Notificacao.id, Notificacao.tipo, Notificacao.chave, Notificacao.tentativas,
+            destinatarios.c.email, destinatarios.c.name.label('nome'),
+            Consulta.data_hora, Consulta.status, medicos.c.name.label('medico')
+        )
+        .join(Consulta, Consulta.id == Notificacao.consulta_id)
+        .join(destinatarios, destinatarios.c.id == Notificacao.destinatario_id)
+        .join(medicos, medicos.c.id == Consulta.medico_id)
+        .where(Notificacao.status == 'pendente', Notificacao.proxima_tentativa <= agora)
+        .order_by(Notificacao.id)
+        .limit(tamanho)
+        .with_for_update(skip_locked=True, of=Notificacao)
+    ).all()
+    if not linhas:
+        db.session.commit()
+        return 0
+
+    # Duplicadas: chave já enviada antes ou repetida dentro do próprio lote
+    chaves_enviadas = set(db.session.scalars(
+        db.select(Notificacao.chave).where(
+            Notificacao.chave.in_({linha.chave for linha in linhas}),
+            Notificacao.status == 'enviada'
+        )
+    ))
+    enviar, descartadas = [], []
+    for linha in linhas:
+        obsoleto = linha.tipo == 'lembrete' and linha.status not in STATUS_ATIVOS
+        if linha.chave in chaves_enviadas or obsoleto:
+            descartadas.append(linha.id)
+        else:
+            chaves_enviadas.add(linha.chave)
+            enviar.append(linha)
+
+    enviadas, falhas = [], []
+    try:
+        with mail.connect() as conexao:
+            for linha in enviar:
+                try:
+                    conexao.send(_montar_mensagem(linha))
+                    enviadas.append(linha.id)
+                except Exception as erro:
+                    falhas.append((linha, erro))
+    except Exception as erro:
+        # Falha ao conectar (ou a conexão caiu): o que não foi enviado volta para a fila
+        tratadas = set(enviadas) | {linha.id for linha, _ in falhas}
+        falhas.extend((linha, erro) for linha in enviar if linha.id not in tratadas)
+
+    _marcar(enviadas, status='enviada', enviada_em=datetime.datetime.utcnow())
+    _marcar(descartadas, status='descartada')
+    for linha, erro in falhas:
+        tentativas = linha.tentativas + 1
+        _marcar(
+            [linha.id],
+            tentativas=tentativas,
+            ultimo_erro=str(erro)[:1000],
+            status='falhou' if tentativas >= max_tentativas else 'pendente',
+            proxima_tentativa=agora + _espera(tentativas)
+        )
+    db.session.commit()
+
+    if falhas:
+        app.logger.warning('%d notificação(ões) não enviada(s); última falha: %s',
+                           len(falhas), falhas[-1][1])
+    return len(linhas)
+
+
+@app.cli.command('worker')
+@click.option('--intervalo', default=30, show_default=True,
+              help='Segundos de espera quando a fila está vazia.')
+@click.option('--lote', default=None, type=int, help='Notificações por lote (padrão: NOTIFICACOES_LOTE).')
+@click.option('--uma-vez', is_flag=True, help='Processa a fila uma vez e sai.')
+def worker(intervalo, lote, uma_vez):
+    """Envia as notificações pendentes e gera os lembretes do dia seguinte."""
+    while True:
+        criados = gerar_lembretes()
+        if criados:
+            click.echo(f'{criados} lembrete(s) enfileirado(s).')
+
+        total = 0
+        while True:
+            processadas = processar_lote(lote)
+            total += processadas
+            if not processadas:
+                break
+        if total:
+            click.echo(f'{total} notificação(ões) processada(s).')
+
+        if uma_vez:
+            break
+        time.sleep(intervalo)
@@ -0,0 +1,169 @@
+import contextlib
+import os
+import sys
+import sysconfig
+import threading
+from flask import g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app import app
+
+
+# Orçamento de consultas SQL: falha (AssertionError) quando um trecho de código ou
+# uma rota executa mais SQL do que o declarado, listando cada comando com a linha
+# do código e, nos lazy loads, a linha do template que o disparou. Serve para pegar
+# N+1 novos nos testes (ex.: consulta.medico acessado no loop de consultas.html).
+#
+# Uso:
+#   with orcamento_de_consultas(3):            # ou @orcamento_de_consultas(3)
+#       ...
+#
+#   Por rota: ORCAMENTO_CONSULTAS = {'minhas_consultas': 4} (definido em TestingConfig)
+#   é verificado em cada requisição; a resposta estourada levanta OrcamentoExcedido.
+#
+#   pytest: fixture orcamento_sql em tests/conftest.py
+#   (ex.: with orcamento_sql(4): client.get('/consultas/')).
+
+_ESTE_ARQUIVO = os.path.abspath(__file__)
+_DIRETORIO_APP = os.path.dirname(_ESTE_ARQUIVO) + os.sep
+_RAIZ = os.path.dirname(os.path.dirname(_ESTE_ARQUIVO))
+# Frames da biblioteca padrão e dos pacotes instalados não identificam a origem
+_BIBLIOTECAS = tuple({sysconfig.get_path(nome) for nome in ('stdlib', 'purelib', 'platlib')})
+_local = threading.local()
+
+
+class OrcamentoExcedido(AssertionError):
+    """Mais consultas SQL do que o orçamento declarado."""
+
+
+def _origem():
+    """
+    Onde o comando foi disparado: a primeira linha de código da aplicação na pilha
+    (ou do próprio teste, se o SQL não passou pela aplicação) e, se houver, a linha
+    do template Jinja em renderização.
+    """
+    codigo = chamador = template = None
+    frame = sys._getframe(2)
+    while frame is not None and (codigo is None or template is None):
+        jinja = frame.f_globals.get('__jinja_template__')
+        if jinja is not None:
+            if template is None:
+                nome = jinja.name or '<string>'
+                template = f'{nome}:{jinja.get_corresponding_lineno(frame.f_lineno)}'
+        else:
+            arquivo = frame.f_code.co_filename
+            # '<string>' e afins: código gerado (ex.: __init__ dos modelos do SQLAlchemy)
+            if not arquivo.startswith('<'):
+                arquivo = os.path.abspath(arquivo)
+                if arquivo == _ESTE_ARQUIVO:
+                    pass
+                elif codigo is None and arquivo.startswith(_DIRETORIO_APP):
+                    codigo = f'{os.path.relpath(arquivo, _RAIZ)}:{frame.f_lineno}'
+                elif chamador is None and not arquivo.startswith(_BIBLIOTECAS):
+                    chamador = f'{arquivo}:{frame.f_lineno}'
+        frame = frame.f_back
+    return codigo or chamador or '?', template
+
+
+class _Contador(object):
+    def __init__(self):
+        self.comandos = []
+
+    def registrar(self, statement):
+        codigo, template = _origem()
+        self.comandos.append((statement, codigo, template))
+
+    def verificar(self, maximo, descricao):
+        if len(self.comandos) <= maximo:
+            return
+        linhas = [f'{descricao}: {len(self.comandos)} consultas SQL (orçamento: {maximo})']
+        for numero, (statement, codigo, template) in enumerate(self.comandos, start=1):
+            origem = codigo
+            if template:
+                origem += f' (template {template})'
+            linhas.append(f'  {numero}. [{origem}] {" ".join(statement.split())}')
+        raise OrcamentoExcedido('\n'.join(linhas))
+
+
+def _contadores_ativos():
+    contadores = list(getattr(_local, 'contadores', ()))
+    if has_app_context():
+        contador_da_requisicao = g.get('_contador_sql')
+        if contador_da_requisicao is not None:
+            contadores.append(contador_da_requisicao)
+    return contadores
+
+
+def _ao_executar(conn, cursor, statement, parameters, context, executemany):
+    for contador in _contadores_ativos():
+        contador.registrar(statement)
+
+
+_ouvintes = {'total': 0}
+_lock_ouvintes = threading.Lock()
+
+
+def _ligar():
+    # O listener só existe enquanto algum orçamento está ativo
+    with _lock_ouvintes:
+        if not _ouvintes['total']:
+            event.listen(Engine, 'before_cursor_execute', _ao_executar)
+        _ouvintes['total'] += 1
+
+
+def _desligar():
+    with _lock_ouvintes:
+        _ouvintes['total'] -= 1
+        if not _ouvintes['total']:
+            event.remove(Engine, 'before_cursor_execute', _ao_executar)
+
+
+class orcamento_de_consultas(contextlib.ContextDecorator):
+    """Context manager/decorator: falha se o bloco executar mais de 'maximo' consultas SQL."""
+
+    def __init__(self, maximo, descricao='Orçamento de consultas excedido'):
+        self.maximo = maximo
+        self.descricao = descricao
+
+    def __enter__(self):
+        self.contador = _Contador()
+        if not hasattr(_local, 'contadores'):
+            _local.contadores = []
+        _local.contadores.append(self.contador)
+        _ligar()
+        return self.contador
+
+    def __exit__(self, tipo, valor, traceback):
+        _local.contadores.remove(self.contador)
+        _desligar()
+        if tipo is None:
+            self.contador.verificar(self.maximo, self.descricao)
+        return False
+
+
+# Orçamento por rota: ORCAMENTO_CONSULTAS = {endpoint: máximo}. A configuração é lida
+# a cada requisição (os testes aplicam TestingConfig depois do import); sem orçamento
+# para a rota, o listener de SQL nem é registrado. Em respostas em streaming
+# (prontuário, exportação) só conta o SQL executado antes do envio do corpo.
+@app.before_request
+def _iniciar_orcamento():
+    if request.endpoint in app.config.get('ORCAMENTO_CONSULTAS', {}):
+        g._contador_sql = _Contador()
+        _ligar()
+
+
+@app.after_request
+def _verificar_orcamento(resposta):
+    contador = g.get('_contador_sql')
+    if contador is not None:
+        contador.verificar(
+            app.config['ORCAMENTO_CONSULTAS'][request.endpoint],
+            f'Rota {request.endpoint} ({request.full_path.rstrip("?")})'
+        )
+    return resposta
+
+
+@app.teardown_request
+def _encerrar_orcamento(erro=None):
+    if g.pop('_contador_sql', None) is not None:
+        _desligar()
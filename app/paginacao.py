@@ -0,0 +1,89 @@
+import datetime
+from sqlalchemy import and_, or_
+
+
+# Paginação por cursor (keyset): em vez de OFFSET, cada página guarda a posição
+# (data/hora, id) do último item exibido e a próxima consulta busca apenas o que
+# vem depois dela. O custo de cada página fica constante, não importa o tamanho
+# do histórico.
+
+TAMANHO_PAGINA = 20
+
+
+def codificar_cursor(data_hora, item_id):
+    """
+    Gera o cursor textual '<data ISO>_<id>' a partir do último item da página.
+    Item sem data (registros antigos) gera '_<id>'.
+    """
+    data_iso = data_hora.isoformat() if data_hora is not None else ''
+    return f'{data_iso}_{item_id}'
+
+
+def decodificar_cursor(cursor):
+    """
+    Converte o cursor textual de volta em (data_hora, id).
+    Retorna None se o cursor estiver ausente ou mal formado.
+    """
+    if not cursor:
+        return None
+    try:
+        data_iso, item_id = cursor.rsplit('_', 1)
+        data_hora = datetime.datetime.fromisoformat(data_iso) if data_iso else None
+        return data_hora, int(item_id)
+    except ValueError:
+        return None
+
+
+def ordenacao(coluna_data, coluna_id, descendente=True, datas_nulas=False):
+    """
+    ORDER BY (coluna_data, coluna_id) usado com filtro_apos_cursor. Com datas_nulas,
+    os itens sem data vêm por último (NULLS LAST): o SQLite e o PostgreSQL põem
+    NULL em pontas opostas, e o cursor precisa de uma ordem só.
+    """
+    if descendente:
+        data, item = coluna_data.desc(), coluna_id.desc()
+    else:
+        data, item = coluna_data.asc(), coluna_id.asc()
+    return (data.nulls_last() if datas_nulas else data), item
+
+
+def filtro_apos_cursor(coluna_data, coluna_id, cursor, descendente=True, datas_nulas=False):
+    """
+    Condição SQL que seleciona os itens posteriores ao cursor na ordenação
+    (coluna_data, coluna_id). Escrita com OR/AND para funcionar tanto no
+    SQLite quanto no PostgreSQL. Com datas_nulas, segue a ordem de ordenacao():
+    os itens sem data vêm depois de todos os datados.
+    """
+    data_hora, item_id = cursor
+    depois_do_id = coluna_id < item_id if descendente else coluna_id > item_id
+    if data_hora is None:
+        return and_(coluna_data.is_(None), depois_do_id)
+    depois_da_data = coluna_data < data_hora if descendente else coluna_data > data_hora
+    condicoes = [depois_da_data, and_(coluna_data == data_hora, depois_do_id)]
+    if datas_nulas:
+        condicoes.append(coluna_data.is_(None))
+    return or_(*condicoes)
+
+
+def paginar(query, coluna_data, coluna_id, cursor=None, descendente=True, tamanho=TAMANHO_PAGINA):
+    """
+    Aplica ordenação, cursor e limite à query e retorna (itens, proximo_cursor).
+    Busca um item a mais que o tamanho da página apenas para saber se existe
+    uma próxima página, sem precisar de um COUNT(*).
+    """
+    query = query.order_by(*ordenacao(coluna_data, coluna_id, descendente))
+
+    posicao = decodificar_cursor(cursor)
+    if posicao is not None:
+        query = query.filter(filtro_apos_cursor(coluna_data, coluna_id, posicao, descendente))
+
+    itens = query.limit(tamanho + 1).all()
+
+    proximo_cursor = None
+    if len(itens) > tamanho:
+        itens = itens[:tamanho]
+        ultimo = itens[-1]
+        proximo_cursor = codificar_cursor(
+            getattr(ultimo, coluna_data.key), getattr(ultimo, coluna_id.key)
+        )
+    return itens, proximo_cursor
@@ -0,0 +1,244 @@
+from collections import namedtuple
+from sqlalchemy import event, literal, null, union_all
+from sqlalchemy.orm import object_session
+from app import app, db
+from app.cache import criar_cache
+from app.models import User, Medico, Consulta, Evolucao, Receita
+from app.paginacao import TAMANHO_PAGINA, codificar_cursor, decodificar_cursor, filtro_apos_cursor, ordenacao
+from app.replicas import ler_do_primario
+
+
+# Linha do tempo do prontuário: evoluções e receitas de uma consulta intercaladas
+# em ordem cronológica (mais recentes primeiro), com o nome do médico autor já
+# incluído. Tudo vem de um único SELECT (UNION ALL) paginado por cursor, então a
+# primeira tela custa o mesmo número de consultas com 5 ou 500 entradas.
+
+EntradaTimeline = namedtuple('EntradaTimeline', ['tipo', 'id', 'data', 'texto', 'autor'])
+
+
+def _subconsulta_timeline(consulta_id):
+    """
+    UNION ALL de evoluções e receitas da consulta. A coluna 'chave' combina tipo e id
+    num inteiro único (evolução = 2*id, receita = 2*id + 1), usado como desempate
+    entre entradas com a mesma data na paginação por cursor.
+    """
+    evolucoes = (
+        db.select(
+            literal('evolucao').label('tipo'),
+            Evolucao.id.label('id'),
+            (Evolucao.id * 2).label('chave'),
+            Evolucao.data_criacao.label('data'),
+            Evolucao.conteudo.label('texto'),
+            User.name.label('autor'),
+        )
+        .join(User, User.id == Evolucao.medico_id)
+        .where(Evolucao.consulta_id == consulta_id)
+    )
+    receitas = (
+        db.select(
+            literal('receita').label('tipo'),
+            Receita.id.label('id'),
+            (Receita.id * 2 + 1).label('chave'),
+            Receita.timestamp.label('data'),
+            Receita.descricao.label('texto'),
+            null().label('autor'),
+        )
+        .where(Receita.consulta_id == consulta_id)
+    )
+    return union_all(evolucoes, receitas).subquery('timeline')
+
+
+def _consultar_timeline(consulta_id, cursor, tamanho):
+    timeline = _subconsulta_timeline(consulta_id)
+    # data_criacao e timestamp aceitam NULL (registros antigos): essas entradas vão
+    # para o fim da linha do tempo
+    consulta = db.select(timeline).order_by(*ordenacao(timeline.c.data, timeline.c.chave, datas_nulas=True))
+
+    posicao = decodificar_cursor(cursor)
+    if posicao is not None:
+        consulta = consulta.where(
+            filtro_apos_cursor(timeline.c.data, timeline.c.chave, posicao, datas_nulas=True))
+
+    linhas = db.session.execute(consulta.limit(tamanho + 1)).all()
+
+    proximo_cursor = None
+    if len(linhas) > tamanho:
+        linhas = linhas[:tamanho]
+        proximo_cursor = codificar_cursor(linhas[-1].data, linhas[-1].chave)
+
+    entradas = [
+        EntradaTimeline(linha.tipo, linha.id, linha.data, linha.texto, linha.autor)
+        for linha in linhas
+    ]
+    return entradas, proximo_cursor
+
+
+# Cache read-through da primeira página da linha do tempo (a exibida ao abrir
+# historico_consulta e gerenciar_evolucoes), por id da consulta. Consultas
+# finalizadas quase nunca mudam, então a maioria das visitas não vai ao banco.
+# Páginas seguintes (com cursor) sempre consultam o banco.
+_timelines = criar_cache(
+    app.config.get('TIMELINE_CACHE_URI', 'memory://'),
+    capacidade=app.config.get('TIMELINE_CACHE_TAMANHO', 2048),
+    ttl=app.config.get('TIMELINE_CACHE_TTL', 300),
+    prefixo='timeline:'
+)
+
+
+def carregar_timeline(consulta_id, cursor=None, tamanho=TAMANHO_PAGINA):
+    """
+    Retorna (entradas, proximo_cursor) com uma página da linha do tempo.
+    proximo_cursor é None quando não há entradas mais antigas.
+    """
+    if cursor or tamanho != TAMANHO_PAGINA:
+        return _consultar_timeline(consulta_id, cursor, tamanho)
+
+    pagina = _timelines.get(consulta_id)
+    if pagina is None:
+        # O cache só é invalidado no commit: lida da réplica atrasada, uma página
+        # antiga ficaria no cache até o TTL
+        with ler_do_primario():
+            pagina = _consultar_timeline(consulta_id, None, tamanho)
+        _timelines.set(consulta_id, pagina)
+    return pagina
+
+
+def invalidar_timeline(consulta_id):
+    _timelines.delete(consulta_id)
+
+
+def estatisticas_cache_timeline():
+    """Acertos e falhas do cache da linha do tempo neste processo."""
+    return {'acertos': _timelines.acertos, 'falhas': _timelines.falhas}
+
+
+# Invalidação: evoluções e receitas novas, alteradas ou removidas (e alterações na
+# própria consulta) marcam o id da consulta na sessão; a entrada sai do cache após
+# o commit. Com "memory://" e vários workers, o TTL limita o atraso nos demais.
+@event.listens_for(Evolucao, 'after_insert')
+@event.listens_for(Evolucao, 'after_update')
+@event.listens_for(Evolucao, 'after_delete')
+@event.listens_for(Receita, 'after_insert')
+@event.listens_for(Receita, 'after_update')
+@event.listens_for(Receita, 'after_delete')
+def _marcar_registro_alterado(mapper, connection, target):
+    marcar_timelines_alteradas(object_session(target), [target.consulta_id])
+
+
+@event.listens_for(Consulta, 'after_update')
+@event.listens_for(Consulta, 'after_delete')
+def _marcar_consulta_alterada(mapper, connection, target):
+    marcar_timelines_alteradas(object_session(target), [target.id])
+
+
+def marcar_timelines_alteradas(sessao, consulta_ids):
+    """Invalida a timeline das consultas após o commit (UPDATEs em lote não disparam os eventos)."""
+    sessao.info.setdefault('timelines_alteradas', set()).update(consulta_ids)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _invalidar_timelines_apos_commit(session):
+    for consulta_id in session.info.pop('timelines_alteradas', ()):
+        invalidar_timeline(consulta_id)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _descartar_timelines_alteradas(session):
+    session.info.pop('timelines_alteradas', None)
+
+
+# Prontuário longitudinal: todas as consultas do paciente com suas evoluções e
+# receitas. São exatamente três SELECTs (consultas, evoluções, receitas), todos
+# ordenados pela mesma chave (data da consulta, id da consulta) e lidos em lotes
+# (yield_per). Os três cursores avançam juntos, como num merge, então só os dados
+# de uma consulta ficam em memória por vez, mesmo com décadas de histórico.
+
+TAMANHO_LOTE_PRONTUARIO = 500
+
+ConsultaProntuario = namedtuple(
+    'ConsultaProntuario',
+    ['id', 'data_hora', 'status', 'medico', 'especialidade', 'evolucoes', 'receitas']
+)
+
+
+def _filtro_consultas(paciente_id, medico_id):
+    condicoes = [Consulta.paciente_id == paciente_id]
+    if medico_id is not None:
+        # Médicos só enxergam o prontuário das consultas que eles mesmos atenderam
+        condicoes.append(Consulta.medico_id == medico_id)
+    return condicoes
+
+
+def _agrupar_por_consulta(linhas):
+    """Agrupa um fluxo ordenado por consulta_id em (consulta_id, [linhas])."""
+    atual, grupo = None, []
+    for linha in linhas:
+        if linha.consulta_id != atual:
+            if grupo:
+                yield atual, grupo
+            atual, grupo = linha.consulta_id, []
+        grupo.append(linha)
+    if grupo:
+        yield atual, grupo
+
+
+def percorrer_prontuario(paciente_id, medico_id=None):
+    """
+    Gera ConsultaProntuario para cada consulta do paciente, da mais antiga para a
+    mais recente, com as evoluções (e autores) e receitas de cada uma.
+    """
+    filtros = _filtro_consultas(paciente_id, medico_id)
+    ordem = (Consulta.data_hora, Consulta.id)
+    opcoes = {'yield_per': TAMANHO_LOTE_PRONTUARIO}
+    # Tabelas (e não as entidades com herança) para evitar JOINs extras em users
+    users = User.__table__
+    medicos = Medico.__table__
+    autores = users.alias('autores')
+
+    consultas = db.session.execute(
+        db.select(Consulta.id, Consulta.data_hora, Consulta.status,
+                  users.c.name.label('medico'), medicos.c.especialidade)
+        .join(medicos, medicos.c.id == Consulta.medico_id)
+        .join(users, users.c.id == medicos.c.id)
+        .where(*filtros)
+        .order_by(*ordem)
+        .execution_options(**opcoes)
+    )
+    evolucoes = db.session.execute(
+        db.select(Evolucao.consulta_id, Evolucao.id, Evolucao.data_criacao,
+                  Evolucao.conteudo, autores.c.name.label('autor'))
+        .join(Consulta, Consulta.id == Evolucao.consulta_id)
+        .join(autores, autores.c.id == Evolucao.medico_id)
+        .where(*filtros)
+        .order_by(*ordem, Evolucao.data_criacao, Evolucao.id)
+        .execution_options(**opcoes)
+    )
+    receitas = db.session.execute(
+        db.select(Receita.consulta_id, Receita.id, Receita.timestamp, Receita.descricao)
+        .join(Consulta, Consulta.id == Receita.consulta_id)
+        .where(*filtros)
+        .order_by(*ordem, Receita.timestamp, Receita.id)
+        .execution_options(**opcoes)
+    )
+
+    grupos_evolucoes = _agrupar_por_consulta(evolucoes)
+    grupos_receitas = _agrupar_por_consulta(receitas)
+    proxima_evolucao = next(grupos_evolucoes, None)
+    proxima_receita = next(grupos_receitas, None)
+
+    for consulta in consultas:
+        evolucoes_da_consulta = []
+        if proxima_evolucao is not None and proxima_evolucao[0] == consulta.id:
+            evolucoes_da_consulta = proxima_evolucao[1]
+            proxima_evolucao = next(grupos_evolucoes, None)
+
+        receitas_da_consulta = []
+        if proxima_receita is not None and proxima_receita[0] == consulta.id:
+            receitas_da_consulta = proxima_receita[1]
+            proxima_receita = next(grupos_receitas, None)
+
+        yield ConsultaProntuario(
+            consulta.id, consulta.data_hora, consulta.status,
+            consulta.medico, consulta.especialidade,
+            evolucoes_da_consulta, receitas_da_consulta
+        )
@@ -0,0 +1,322 @@
+import csv
+import datetime
+import json
+import click
+import numpy as np
+from sqlalchemy import func, literal_column
+from app import app, db
+from app.agenda import JANELAS_ATENDIMENTO, SLOTS, indice_slot, segundos_desde_1970
+from app.models import User, Medico, Consulta, STATUS_ATIVOS
+from app.replicas import ler_da_replica
+
+
+# Relatório gerencial da clínica: ocupação da agenda por médico e especialidade,
+# taxas de cancelamento e de não comparecimento e a distribuição da antecedência
+# dos agendamentos. O banco agrega as consultas do período (GROUP BY) em três
+# consultas: por médico, status e horário do dia; por data e hora (grade dia da
+# semana x slot); e por dias de antecedência. Só os grupos chegam ao Python, em
+# lotes (yield_per), e cada lote vira arrays NumPy somados em contadores de
+# tamanho fixo (bincount ponderado pela contagem do grupo), então a memória não
+# cresce com a quantidade de consultas nem de grupos.
+#
+# Definições:
+# - capacidade: dias do período x slots do dia (SLOTS, janelas do validate_data_hora);
+# - ocupação: consultas não canceladas em horários válidos / capacidade;
+# - não comparecimento: consulta que já passou e continua Agendada/Confirmada
+#   (nunca foi finalizada);
+# - antecedência: dias entre criada_em (UTC) e data_hora (horário local); consultas
+#   sem criada_em (anteriores à coluna) ficam fora da distribuição.
+
+TAMANHO_LOTE_RELATORIO = 50000
+
+STATUS = ('Agendada', 'Confirmada', 'Finalizada', 'Cancelada')
+_CODIGO_STATUS = {status: codigo for codigo, status in enumerate(STATUS)}
+_CANCELADA = _CODIGO_STATUS['Cancelada']
+_ATIVOS = np.array([_CODIGO_STATUS[status] for status in STATUS_ATIVOS])
+
+# Antecedência das consultas sem criada_em (nenhum intervalo real chega perto)
+SEM_DATA = -2 ** 62
+
+# Antecedência em dias: um bucket por dia até um ano, mais um para o que passar disso
+ANTECEDENCIA_MAXIMA = 365
+FAIXAS_ANTECEDENCIA = ((0, 0), (1, 1), (2, 3), (4, 7), (8, 14), (15, 30), (31, 60), (61, 90),
+                       (91, 180), (181, ANTECEDENCIA_MAXIMA))
+
+# Slot de cada minuto do dia (-1 fora das janelas) e minutos em que a janela termina
+_SLOT_MINUTO = np.array([
+    -1 if indice is None else indice
+    for indice in (indice_slot(datetime.time(minuto // 60, minuto % 60)) for minuto in range(24 * 60))
+], dtype=np.int16)
+_FINAIS_DE_JANELA = np.array([fim.hour * 60 + fim.minute for _, fim in JANELAS_ATENDIMENTO])
+
+CAMPOS_CSV = ('tipo', 'id', 'nome', 'especialidade', 'consultas', 'agendadas', 'confirmadas',
+              'finalizadas', 'canceladas', 'nao_comparecimentos', 'taxa_cancelamento',
+              'taxa_nao_comparecimento', 'capacidade', 'ocupacao')
+
+
+def _carregar_medicos():
+    linhas = db.session.execute(
+        db.select(Medico.__table__.c.id, User.__table__.c.name, Medico.__table__.c.especialidade)
+        .join(User.__table__, User.__table__.c.id == Medico.__table__.c.id)
+        .order_by(Medico.__table__.c.id)
+    ).all()
+    ids = np.array([linha.id for linha in linhas], dtype=np.int64)
+    especialidades, especialidade_do_medico = np.unique(
+        np.array([linha.especialidade or 'Sem especialidade' for linha in linhas], dtype=object),
+        return_inverse=True
+    )
+    return ids, [linha.name for linha in linhas], especialidades, especialidade_do_medico
+
+
+def _slots(segundos_do_dia):
+    """Índice do slot (mesma regra de agenda.indice_slot) de cada horário; -1 fora das janelas."""
+    minutos = segundos_do_dia // 60
+    slots = _SLOT_MINUTO[minutos]
+    # 11:00 e 17:30 valem; 11:00:30 já não
+    fora = (segundos_do_dia % 60 > 0) & np.isin(minutos, _FINAIS_DE_JANELA)
+    return np.where(fora, -1, slots)
+
+
+def _contar(indices, quantidade, tamanho):
+    """bincount em que cada índice vale a contagem do seu grupo."""
+    return np.bincount(indices, weights=quantidade, minlength=tamanho).astype(np.int64)
+
+
+class _Acumulador(object):
+    """Contadores de tamanho fixo, somados lote a lote com o total de cada grupo como peso."""
+
+    def __init__(self, n_medicos):
+        self.n_medicos = n_medicos
+        self.por_medico_status = np.zeros(n_medicos * len(STATUS), dtype=np.int64)
+        self.ocupadas = np.zeros(n_medicos, dtype=np.int64)
+        self.nao_comparecimentos = np.zeros(n_medicos, dtype=np.int64)
+        self.passadas = np.zeros(n_medicos, dtype=np.int64)
+        self.dia_da_semana_slot = np.zeros(7 * len(SLOTS), dtype=np.int64)
+        self.antecedencia = np.zeros(ANTECEDENCIA_MAXIMA + 2, dtype=np.int64)
+        self.sem_criada_em = 0
+
+    def somar_medicos(self, medico, status, passada, segundos_do_dia, quantidade):
+        """Grupos (médico, status, já passou, segundos desde a meia-noite) e suas contagens."""
+        n = self.n_medicos
+        self.por_medico_status += _contar(medico * len(STATUS) + status, quantidade, n * len(STATUS))
+
+        valida = (status != _CANCELADA) & (_slots(segundos_do_dia) >= 0)
+        self.ocupadas += _contar(medico[valida], quantidade[valida], n)
+
+        passadas = passada & (status != _CANCELADA)
+        self.passadas += _contar(medico[passadas], quantidade[passadas], n)
+        nao_compareceu = passadas & np.isin(status, _ATIVOS)
+        self.nao_comparecimentos += _contar(medico[nao_compareceu], quantidade[nao_compareceu], n)
+
+    def somar_horarios(self, data_hora, quantidade):
+        """Consultas não canceladas por data e hora (segundos desde 1970-01-01)."""
+        dias, segundos_do_dia = np.divmod(data_hora, 86400)
+        slots = _slots(segundos_do_dia)
+        valida = slots >= 0
+        # 1970-01-01 foi quinta-feira: (dias + 3) % 7 dá 0 = segunda
+        dia_da_semana = (dias[valida] + 3) % 7
+        self.dia_da_semana_slot += _contar(dia_da_semana * len(SLOTS) + slots[valida],
+                                                quantidade[valida], 7 * len(SLOTS))
+
+    def somar_antecedencias(self, dias, quantidade):
+        """Consultas por dias de antecedência (SEM_DATA: sem criada_em)."""
+        com_data = dias != SEM_DATA
+        self.sem_criada_em += int(quantidade[~com_data].sum())
+        self.antecedencia += _contar(np.clip(dias[com_data], 0, ANTECEDENCIA_MAXIMA + 1),
+                                          quantidade[com_data], ANTECEDENCIA_MAXIMA + 2)
+
+
+# As datas saem do banco como inteiros (segundos), e só uma vez por grupo quando
+# possível: converter milhões de datetime em Python custaria mais que o relatório.
+# O GROUP BY usa os rótulos das colunas (aceitos pelo SQLite e pelo PostgreSQL):
+# repetir a expressão, com os próprios parâmetros, faria o SQLite calculá-la duas
+# vezes por consulta.
+
+def _rotulos(*colunas):
+    return [literal_column(coluna.name) for coluna in colunas]
+
+
+def _grupos_por_medico(periodo, agora):
+    tabela = Consulta.__table__
+    passada = (tabela.c.data_hora < agora).label('passada')
+    segundos_do_dia = (segundos_desde_1970(tabela.c.data_hora) % 86400).label('segundos_do_dia')
+    # medico_id fora do início: agrupando por ele primeiro, o SQLite percorre o índice
+    # (medico_id, data_hora) e lê a tabela fora de ordem, uma linha por consulta
+    return (
+        db.select(tabela.c.medico_id, tabela.c.status, passada, segundos_do_dia, func.count())
+        .where(*periodo)
+        .group_by(*_rotulos(passada, segundos_do_dia), tabela.c.medico_id, tabela.c.status)
+    )
+
+
+def _grupos_por_horario(periodo):
+    # Agrupa pela coluna: o epoch é calculado por data e hora distinta, não por consulta
+    tabela = Consulta.__table__
+    return (
+        db.select(segundos_desde_1970(tabela.c.data_hora), func.count())
+        .where(*periodo, tabela.c.status != 'Cancelada')
+        .group_by(tabela.c.data_hora)
+    )
+
+
+def _grupos_por_antecedencia(periodo):
+    # Divisão inteira (trunca em zero): antecedências negativas caem no dia 0 de qualquer forma
+    tabela = Consulta.__table__
+    dias = func.coalesce(
+        (segundos_desde_1970(tabela.c.data_hora) - segundos_desde_1970(tabela.c.criada_em)) // 86400, SEM_DATA
+    ).label('dias')
+    return db.select(dias, func.count()).where(*periodo).group_by(*_rotulos(dias))
+
+
+def _lotes(consulta, tamanho):
+    """Grupos em lotes: (colunas agrupadas, contagem de cada grupo como array NumPy)."""
+    resultado = db.session.execute(consulta.execution_options(yield_per=tamanho))
+    try:
+        for lote in resultado.partitions():
+            colunas = list(zip(*lote))
+            yield colunas[:-1], np.fromiter(colunas[-1], dtype=np.int64, count=len(lote))
+    finally:
+        resultado.close()
+
+
+def _percentil(histograma, quantil):
+    total = histograma.sum()
+    if not total:
+        return None
+    return int(np.searchsorted(np.cumsum(histograma), quantil * total))
+
+
+def _taxa(parte, todo):
+    return np.divide(parte, todo, out=np.zeros(len(parte)), where=todo > 0)
+
+
+def _linhas(tipo, ids, nomes, especialidades, contagens, nao_comparecimentos, passadas, ocupadas, capacidade):
+    canceladas = contagens[:, _CANCELADA]
+    totais = contagens.sum(axis=1)
+    taxa_cancelamento = _taxa(canceladas, totais)
+    taxa_nao_comparecimento = _taxa(nao_comparecimentos, passadas)
+    ocupacao = _taxa(ocupadas, capacidade)
+    return [
+        {
+            'tipo': tipo, 'id': ids[i], 'nome': nomes[i], 'especialidade': especialidades[i],
+            'consultas': int(totais[i]),
+            **{f'{status.lower()}s': int(contagens[i, codigo]) for codigo, status in enumerate(STATUS)},
+            'nao_comparecimentos': int(nao_comparecimentos[i]),
+            'taxa_cancelamento': round(float(taxa_cancelamento[i]), 4),
+            'taxa_nao_comparecimento': round(float(taxa_nao_comparecimento[i]), 4),
+            'capacidade': int(capacidade[i]),
+            'ocupacao': round(float(ocupacao[i]), 4),
+        }
+        for i in range(len(ids))
+    ]
+
+
+def gerar_relatorio(inicio, fim, agora=None, tamanho_lote=TAMANHO_LOTE_RELATORIO):
+    """
+    Calcula o relatório das consultas com data entre inicio e fim (datas; fim
+    inclusive). Retorna um dicionário pronto para JSON.
+    """
+    agora = agora or datetime.datetime.now()
+    limite_inferior = datetime.datetime.combine(inicio, datetime.time.min)
+    limite_superior = datetime.datetime.combine(fim + datetime.timedelta(days=1), datetime.time.min)
+    periodo = (Consulta.data_hora >= limite_inferior, Consulta.data_hora < limite_superior)
+    dias = (fim - inicio).days + 1
+
+    ids, nomes, especialidades, especialidade_do_medico = _carregar_medicos()
+    acumulador = _Acumulador(len(ids))
+    for (medico_ids, status, passada, segundos_do_dia), quantidade in _lotes(
+            _grupos_por_medico(periodo, agora), tamanho_lote):
+        acumulador.somar_medicos(
+            np.searchsorted(ids, np.array(medico_ids, dtype=np.int64)),
+            np.array([_CODIGO_STATUS[valor] for valor in status], dtype=np.int64),
+            np.array(passada, dtype=bool),
+            np.array(segundos_do_dia, dtype=np.int64),
+            quantidade
+        )
+    for (datas,), quantidade in _lotes(_grupos_por_horario(periodo), tamanho_lote):
+        acumulador.somar_horarios(np.array(datas, dtype=np.int64), quantidade)
+    for (antecedencias,), quantidade in _lotes(_grupos_por_antecedencia(periodo), tamanho_lote):
+        acumulador.somar_antecedencias(np.array(antecedencias, dtype=np.int64), quantidade)
+
+    por_medico = acumulador.por_medico_status.reshape(len(ids), len(STATUS))
+    capacidade = np.full(len(ids), dias * len(SLOTS), dtype=np.int64)
+    medicos = _linhas(
+        'medico', ids.tolist(), nomes, especialidades[especialidade_do_medico].tolist(),
+        por_medico, acumulador.nao_comparecimentos, acumulador.passadas, acumulador.ocupadas, capacidade
+    )
+
+    # Especialidade = soma dos seus médicos (bincount com pesos sobre o índice da especialidade)
+    def por_especialidade(valores):
+        return np.bincount(especialidade_do_medico, weights=valores, minlength=len(especialidades)).astype(np.int64)
+
+    contagens = np.column_stack([por_especialidade(por_medico[:, codigo]) for codigo in range(len(STATUS))])
+    grupos = _linhas(
+        'especialidade', list(range(len(especialidades))), especialidades.tolist(), especialidades.tolist(),
+        contagens, por_especialidade(acumulador.nao_comparecimentos), por_especialidade(acumulador.passadas),
+        por_especialidade(acumulador.ocupadas), por_especialidade(capacidade)
+    )
+    for grupo in grupos:
+        grupo['id'] = None
+
+    total = _linhas(
+        'total', [None], ['Todas as consultas'], [None],
+        por_medico.sum(axis=0, keepdims=True), acumulador.nao_comparecimentos.sum(keepdims=True),
+        acumulador.passadas.sum(keepdims=True), acumulador.ocupadas.sum(keepdims=True),
+        capacidade.sum(keepdims=True)
+    )
+
+    histograma = acumulador.antecedencia
+    return {
+        'periodo': {'inicio': inicio.isoformat(), 'fim': fim.isoformat(), 'dias': dias},
+        'gerado_em': str(np.datetime64(agora, 's')),
+        'total': total[0],
+        'especialidades': grupos,
+        'medicos': medicos,
+        'ocupacao_por_dia_da_semana_e_horario': {
+            'dias_da_semana': ['seg', 'ter', 'qua', 'qui', 'sex', 'sab', 'dom'],
+            'horarios': [hora.strftime('%H:%M') for hora in SLOTS],
+            'consultas': acumulador.dia_da_semana_slot.reshape(7, len(SLOTS)).tolist(),
+        },
+        'antecedencia_dias': {
+            'faixas': [
+                {'de': de, 'ate': ate, 'consultas': int(histograma[de:ate + 1].sum())}
+                for de, ate in FAIXAS_ANTECEDENCIA
+            ] + [{'de': ANTECEDENCIA_MAXIMA + 1, 'ate': None,
+                  'consultas': int(histograma[ANTECEDENCIA_MAXIMA + 1])}],
+            'mediana': _percentil(histograma, 0.5),
+            'p90': _percentil(histograma, 0.9),
+            'sem_data_de_agendamento': acumulador.sem_criada_em,
+        },
+    }
+
+
+def escrever_csv(relatorio, destino):
+    """Uma linha por médico, por especialidade e o total (a distribuição da antecedência só vai no JSON)."""
+    escritor = csv.DictWriter(destino, fieldnames=CAMPOS_CSV)
+    escritor.writeheader()
+    escritor.writerow(relatorio['total'])
+    escritor.writerows(relatorio['especialidades'])
+    escritor.writerows(relatorio['medicos'])
+
+
+@app.cli.command('report')
+@click.option('--inicio', type=click.DateTime(['%Y-%m-%d']), help='Data inicial (AAAA-MM-DD); padrão: 365 dias antes do fim.')
+@click.option('--fim', type=click.DateTime(['%Y-%m-%d']), help='Data final, inclusive (AAAA-MM-DD); padrão: hoje.')
+@click.option('--formato', type=click.Choice(['json', 'csv']), default='json', show_default=True)
+@click.option('--saida', default='-', show_default=True, type=click.Path(dir_okay=False, allow_dash=True),
+              help='Arquivo de destino ("-" para a saída padrão).')
+def relatorio(inicio, fim, formato, saida):
+    """Relatório de ocupação, cancelamentos, não comparecimentos e antecedência."""
+    fim = fim.date() if fim else datetime.date.today()
+    inicio = inicio.date() if inicio else fim - datetime.timedelta(days=364)
+    if inicio > fim:
+        raise click.BadParameter('a data inicial é posterior à final.', param_hint='--inicio')
+
+    with ler_da_replica():
+        dados = gerar_relatorio(inicio, fim)
+    with click.open_file(saida, 'w', encoding='utf-8') as destino:
+        if formato == 'csv':
+            escrever_csv(dados, destino)
+        else:
+            json.dump(dados, destino, ensure_ascii=False, indent=2)
+            destino.write('\n')
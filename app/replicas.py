@@ -0,0 +1,106 @@
+import functools
+import time
+from contextlib import contextmanager
+from flask import g, has_app_context, has_request_context, session as sessao_navegador
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from app import app
+
+
+# Roteamento de leitura para a réplica (SQLALCHEMY_BINDS['replica']). Sem réplica
+# configurada, tudo vai para o primário, como antes.
+#
+# Vai para a réplica só o SELECT de rotas marcadas com @somente_leitura (ou de
+# blocos com ler_da_replica()), e só enquanto a sessão não escreveu nada: depois de
+# um flush, de um UPDATE/INSERT/DELETE ou de um SELECT ... FOR UPDATE, a transação
+# fica presa ao primário até o commit/rollback, para ler o que ela mesma gravou.
+#
+# Atraso de replicação: após um commit com escrita, o navegador do usuário lê do
+# primário por REPLICA_ATRASO_MAXIMO segundos (marca na sessão do Flask), para ver
+# na próxima página o que acabou de salvar.
+
+CHAVE_REPLICA = 'replica'
+
+
+class SessaoRoteada(Session):
+    """Sessão do Flask-SQLAlchemy que envia as leituras permitidas para a réplica."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        replica = self._db.engines.get(CHAVE_REPLICA)
+        if replica is None or bind is not None or engine is not self._db.engine:
+            return engine
+
+        if _escrita(clause) or self._flushing:
+            self.info['primario'] = True
+            return engine
+        if self.info.get('primario') or not _leitura_na_replica():
+            return engine
+        return replica
+
+
+def _escrita(clause):
+    if clause is None:
+        return False
+    if clause.is_dml or getattr(clause, '_for_update_arg', None) is not None:
+        return True
+    # text() e afins: na dúvida, primário
+    return not getattr(clause, 'is_select', False)
+
+
+def _leitura_na_replica():
+    if not has_app_context() or g.get('_leitura') != CHAVE_REPLICA:
+        return False
+    if has_request_context() and sessao_navegador.get('_primario_ate', 0) > time.time():
+        return False
+    return True
+
+
+@event.listens_for(SessaoRoteada, 'after_flush')
+def _fixar_no_primario(sessao, contexto):
+    sessao.info['primario'] = True
+
+
+@event.listens_for(SessaoRoteada, 'after_commit')
+def _apos_commit(sessao):
+    escreveu = sessao.info.pop('primario', False)
+    if escreveu and has_request_context() and CHAVE_REPLICA in app.config.get('SQLALCHEMY_BINDS', {}):
+        sessao_navegador['_primario_ate'] = time.time() + app.config.get('REPLICA_ATRASO_MAXIMO', 5)
+
+
+@event.listens_for(SessaoRoteada, 'after_rollback')
+def _apos_rollback(sessao):
+    sessao.info.pop('primario', None)
+
+
+@contextmanager
+def _leitura(destino):
+    anterior = g.get('_leitura')
+    g._leitura = destino
+    try:
+        yield
+    finally:
+        g._leitura = anterior
+
+
+def ler_da_replica():
+    """Bloco cujas leituras podem ir para a réplica (ex.: exportação pela CLI)."""
+    return _leitura(CHAVE_REPLICA)
+
+
+def ler_do_primario():
+    """Bloco que precisa do dado mais recente mesmo numa rota somente leitura."""
+    return _leitura('primario')
+
+
+def somente_leitura(view):
+    """
+    Marca a rota inteira (inclusive o corpo em streaming) como somente leitura.
+    Use apenas em rotas GET: uma decisão de escrita baseada em leitura atrasada
+    da réplica (ex.: conflito de horário) seria incorreta.
+    """
+    @functools.wraps(view)
+    def rota(*args, **kwargs):
+        g._leitura = CHAVE_REPLICA
+        return view(*args, **kwargs)
+    return rota
@@ -0,0 +1,121 @@
+import os
+import threading
+import time
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError
+from werkzeug.security import generate_password_hash, check_password_hash, DEFAULT_PBKDF2_ITERATIONS
+from app import app
+from app.metricas import ATIVAS as METRICAS_ATIVAS, registrar_tempo
+
+
+# [SEGURANÇA] O scrypt é propositalmente lento (consome CPU e memória) para dificultar
+# ataques de força bruta. Executá-lo na thread da requisição trava o worker durante
+# os picos de login; por isso o cálculo é enviado a um pool limitado de processos.
+# Quando a fila enche, a requisição é recusada na hora (503 + Retry-After) em vez de
+# acumular espera.
+
+
+class ServicoSobrecarregado(Exception):
+    """O pool de hashing de senhas está cheio; o cliente deve tentar novamente depois."""
+
+
+_lock = threading.Lock()
+_estado = {'executor': None, 'vagas': None}
+
+
+def _obter_executor():
+    with _lock:
+        if _estado['executor'] is None:
+            tipo = app.config.get('SENHAS_EXECUTOR', 'processo')
+            workers = app.config.get('SENHAS_WORKERS') or os.cpu_count() or 1
+            if tipo == 'processo':
+                _estado['executor'] = ProcessPoolExecutor(max_workers=workers)
+            elif tipo == 'thread':
+                _estado['executor'] = ThreadPoolExecutor(max_workers=workers)
+            else:
+                return None
+            # Tarefas em execução + em espera; acima disso a requisição é recusada
+            _estado['vagas'] = threading.BoundedSemaphore(app.config.get('SENHAS_FILA_MAXIMA', 32))
+        return _estado['executor']
+
+
+def _executar(funcao, *args):
+    if not METRICAS_ATIVAS:
+        return _executar_no_pool(funcao, *args)
+    inicio = time.perf_counter()
+    try:
+        return _executar_no_pool(funcao, *args)
+    finally:
+        registrar_tempo('senha', time.perf_counter() - inicio)
+
+
+def _executar_no_pool(funcao, *args):
+    executor = _obter_executor()
+    if executor is None:
+        # Modo 'inline' (testes): calcula na própria thread
+        return funcao(*args)
+
+    vagas = _estado['vagas']
+    if not vagas.acquire(blocking=False):
+        raise ServicoSobrecarregado()
+    try:
+        futuro = executor.submit(funcao, *args)
+    except Exception:
+        vagas.release()
+        raise
+    futuro.add_done_callback(lambda _futuro: vagas.release())
+
+    try:
+        return futuro.result(timeout=app.config.get('SENHAS_TIMEOUT', 10))
+    except TimeoutError:
+        raise ServicoSobrecarregado()
+
+
+def gerar_hash(senha):
+    """Gera o hash da senha com o método configurado (SENHAS_METODO)."""
+    return _executar(generate_password_hash, senha, app.config.get('SENHAS_METODO', 'scrypt'))
+
+
+def gerar_hashes(senhas):
+    """
+    Gera os hashes de várias senhas em paralelo, usando todos os workers do pool.
+    Pensado para tarefas em lote (ex.: importação de usuários), fora do ciclo de
+    requisição, por isso não passa pelo limite de fila.
+    """
+    metodo = app.config.get('SENHAS_METODO', 'scrypt')
+    executor = _obter_executor()
+    if executor is None:
+        return [generate_password_hash(senha, metodo) for senha in senhas]
+    return list(executor.map(generate_password_hash, senhas, repeat(metodo), chunksize=8))
+
+
+def verificar_senha(password_hash, senha):
+    """Compara a senha digitada com o hash armazenado."""
+    if not password_hash:
+        return False
+    return _executar(check_password_hash, password_hash, senha)
+
+
+def _normalizar_metodo(metodo):
+    """Completa o método com os parâmetros padrão do werkzeug (ex.: 'scrypt' -> 'scrypt:32768:8:1')."""
+    partes = metodo.split(':')
+    if partes[0] == 'scrypt':
+        padrao = ['scrypt', '32768', '8', '1']
+    elif partes[0] == 'pbkdf2':
+        padrao = ['pbkdf2', 'sha256', str(DEFAULT_PBKDF2_ITERATIONS)]
+    else:
+        return metodo
+    return ':'.join(partes + padrao[len(partes):])
+
+
+def precisa_rehash(password_hash):
+    """
+    Indica se o hash foi gerado com parâmetros diferentes dos atuais
+    (ex.: custo do scrypt aumentado ou hash antigo em pbkdf2).
+    O hash do werkzeug tem o formato 'metodo:param1:param2$salt$hash'.
+    """
+    if not password_hash or '$' not in password_hash:
+        return False
+    metodo_hash = password_hash.split('$', 1)[0]
+    metodo_atual = app.config.get('SENHAS_METODO', 'scrypt')
+    return _normalizar_metodo(metodo_hash) != _normalizar_metodo(metodo_atual)
@@ -0,0 +1,149 @@
+import datetime
+from collections import Counter, namedtuple
+from sqlalchemy import case, insert, or_, update
+from app import db
+from app.models import Consulta, SerieConsultas, STATUS_ATIVOS
+from app.agenda import horario_permitido
+from app.contadores import ajustar_contadores
+from app.notificacoes import enfileirar_notificacao
+from app.prontuario import marcar_timelines_alteradas
+from app.transicoes import aplicar_transicao
+
+
+# Séries de consultas recorrentes (fisioterapia, psiquiatria...): o mesmo horário
+# toda semana ou a cada duas semanas, por N ocorrências ou até uma data.
+#
+# A série inteira é resolvida com uma quantidade fixa de comandos, qualquer que
+# seja o número de ocorrências: as datas são geradas e conferidas contra as
+# janelas de atendimento em memória, os conflitos saem de uma única consulta por
+# intervalo na agenda do médico e as ocorrências são gravadas num único INSERT em
+# lote. Alterar ou cancelar a série também é um UPDATE só. Como os comandos em
+# lote não disparam os eventos do ORM, contadores da agenda, notificações e cache
+# da timeline são atualizados aqui, na mesma transação.
+
+# Intervalo, em semanas, de cada frequência oferecida no formulário
+FREQUENCIAS = {'semanal': 1, 'quinzenal': 2}
+
+# Quantidade máxima de ocorrências por série (um ano de consultas semanais)
+MAXIMO_OCORRENCIAS = 52
+
+ResultadoSerie = namedtuple('ResultadoSerie', 'serie agendadas conflitos fora_da_janela')
+
+
+def datas_da_serie(inicio, intervalo_semanas, ocorrencias=None, ate=None):
+    """
+    Datas das ocorrências a partir de inicio (inclusive): ocorrencias datas ou,
+    sem ocorrencias, todas até o dia ate. Nunca passa de MAXIMO_OCORRENCIAS.
+    """
+    passo = datetime.timedelta(weeks=intervalo_semanas)
+    limite = min(ocorrencias or MAXIMO_OCORRENCIAS, MAXIMO_OCORRENCIAS)
+    datas = []
+    data_hora = inicio
+    while len(datas) < limite and (ate is None or data_hora.date() <= ate):
+        datas.append(data_hora)
+        data_hora += passo
+    return datas
+
+
+def horarios_ocupados(medico_id, datas, ignorar_serie_id=None):
+    """
+    Quais das datas já têm consulta ativa do médico, com uma única consulta pelo
+    intervalo da série (índice medico_id + data_hora). As ocorrências da própria
+    série podem ser ignoradas (ao mudar o horário dela).
+    """
+    if not datas:
+        return set()
+    consulta = (
+        db.select(Consulta.data_hora)
+        .where(Consulta.medico_id == medico_id,
+               Consulta.status.in_(STATUS_ATIVOS),
+               Consulta.data_hora.between(min(datas), max(datas)))
+    )
+    if ignorar_serie_id is not None:
+        consulta = consulta.where(or_(Consulta.serie_id.is_(None), Consulta.serie_id != ignorar_serie_id))
+    return set(db.session.scalars(consulta)) & set(datas)
+
+
+def criar_serie(paciente_id, medico_id, datas, intervalo_semanas, pular_conflitos=False):
+    """
+    Agenda as datas como uma série e retorna um ResultadoSerie. Com algum horário
+    fora das janelas de atendimento ou ocupado, nada é gravado (serie é None),
+    a menos que pular_conflitos=True: aí só os horários ocupados são deixados de
+    fora. Não faz commit; o índice único de horário ainda pode recusar o INSERT
+    se outra requisição ocupar um dos horários no meio tempo (IntegrityError).
+    """
+    fora_da_janela = [data_hora for data_hora in datas if not horario_permitido(data_hora.time())]
+    conflitos = sorted(horarios_ocupados(medico_id, datas))
+    livres = [data_hora for data_hora in datas if data_hora not in conflitos]
+    if fora_da_janela or not livres or (conflitos and not pular_conflitos):
+        return ResultadoSerie(None, [], conflitos, fora_da_janela)
+
+    serie = SerieConsultas(paciente_id=paciente_id, medico_id=medico_id,
+                           intervalo_semanas=intervalo_semanas)
+    db.session.add(serie)
+    db.session.flush()
+
+    agendadas = db.session.execute(
+        insert(Consulta).returning(Consulta.id, Consulta.medico_id, Consulta.paciente_id, Consulta.data_hora),
+        [
+            {'data_hora': data_hora, 'paciente_id': paciente_id, 'medico_id': medico_id,
+             'status': 'Agendada', 'serie_id': serie.id}
+            for data_hora in livres
+        ]
+    ).all()
+
+    ajustar_contadores(db.session.connection(), Counter(
+        (medico_id, consulta.data_hora.date(), 'Agendada') for consulta in agendadas
+    ))
+    enfileirar_notificacao(min(agendadas, key=lambda consulta: consulta.data_hora), 'serie_agendada')
+    return ResultadoSerie(serie, agendadas, conflitos, [])
+
+
+def _futuras(serie, agora):
+    """Condição das ocorrências ativas da série que ainda não aconteceram."""
+    return ((Consulta.serie_id == serie.id)
+            & Consulta.status.in_(STATUS_ATIVOS)
+            & (Consulta.data_hora >= agora))
+
+
+def alterar_horario_serie(serie, hora, agora=None):
+    """
+    Muda para hora o horário das ocorrências futuras da série, mantendo os dias.
+    Retorna (alteradas, conflitos): com algum conflito na agenda do médico nada é
+    alterado. Não faz commit.
+    """
+    agora = agora or datetime.datetime.now()
+    atuais = db.session.execute(
+        db.select(Consulta.id, Consulta.data_hora).where(_futuras(serie, agora)).with_for_update()
+    ).all()
+    novas = {consulta.id: datetime.datetime.combine(consulta.data_hora.date(), hora) for consulta in atuais}
+
+    conflitos = sorted(horarios_ocupados(serie.medico_id, list(novas.values()), ignorar_serie_id=serie.id))
+    if conflitos or not novas:
+        return [], conflitos
+
+    # Um UPDATE só, com o novo horário de cada ocorrência num CASE por id. O dia e o
+    # status não mudam, então os contadores da agenda continuam valendo.
+    alteradas = db.session.execute(
+        update(Consulta)
+        .where(Consulta.id.in_(novas))
+        .values(data_hora=case(novas, value=Consulta.id))
+        .returning(Consulta.id, Consulta.medico_id, Consulta.paciente_id, Consulta.data_hora)
+        .execution_options(synchronize_session=False)
+    ).all()
+
+    marcar_timelines_alteradas(db.session, [consulta.id for consulta in alteradas])
+    enfileirar_notificacao(min(alteradas, key=lambda consulta: consulta.data_hora), 'serie_alterada')
+    return alteradas, []
+
+
+def cancelar_serie(serie, agora=None):
+    """
+    Cancela as ocorrências futuras da série e retorna quantas foram canceladas.
+    As que já aconteceram ficam como estão. Não faz commit.
+    """
+    agora = agora or datetime.datetime.now()
+    _, alteradas = aplicar_transicao('cancelar', _futuras(serie, agora), notificar=False)
+    if alteradas:
+        enfileirar_notificacao(min(alteradas.values(), key=lambda consulta: consulta.data_hora), 'serie_cancelada')
+    return len(alteradas)
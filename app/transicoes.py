@@ -0,0 +1,107 @@
+from collections import Counter, namedtuple
+from sqlalchemy import update
+from app import db
+from app.models import Consulta, STATUS_ATIVOS
+from app.contadores import ajustar_contadores
+from app.notificacoes import enfileirar_notificacao
+from app.prontuario import marcar_timelines_alteradas
+
+
+# Mudança de status de várias consultas de uma vez (agenda do médico com seleção
+# múltipla e cancelamento de séries recorrentes). As regras são as das rotas individuais: confirmar só o que está
+# Agendada, finalizar só o que está Confirmada (como em finalizar_consulta) e
+# cancelar o que ainda está ativo.
+#
+# São dois comandos, qualquer que seja a quantidade: um SELECT ... FOR UPDATE que
+# trava as consultas do médico e informa o status de cada uma, e um único
+# UPDATE ... WHERE id IN (...) RETURNING. Como o UPDATE em lote não dispara os
+# eventos do ORM, contadores da agenda, notificações e cache da timeline são
+# atualizados aqui, na mesma transação.
+
+# Quantidade máxima de consultas por requisição (limita o tamanho do IN; conferido na view)
+MAXIMO_CONSULTAS_EM_LOTE = 200
+
+Transicao = namedtuple('Transicao', 'origens destino notificacao')
+
+TRANSICOES = {
+    'confirmar': Transicao(('Agendada',), 'Confirmada', 'confirmada'),
+    'finalizar': Transicao(('Confirmada',), 'Finalizada', 'finalizada'),
+    'cancelar': Transicao(STATUS_ATIVOS, 'Cancelada', 'cancelada'),
+}
+
+# Resultado por consulta
+ALTERADA = 'alterada'
+STATUS_INVALIDO = 'status_invalido'
+NAO_ENCONTRADA = 'nao_encontrada'
+
+ResultadoLote = namedtuple('ResultadoLote', 'consulta_id resultado status data_hora')
+
+
+def aplicar_transicao(acao, condicao, notificar=True):
+    """
+    Aplica a transição às consultas que atendem à condição (expressão SQL sobre
+    Consulta) e mantêm contadores, notificações e cache da timeline. Retorna
+    (atuais, alteradas): dicionários por id com as linhas antes do UPDATE e as
+    devolvidas pelo RETURNING. Com notificar=False quem chama enfileira o aviso
+    (ex.: um único aviso para a série inteira). Não faz commit.
+    """
+    transicao = TRANSICOES[acao]
+    tabela = Consulta.__table__
+
+    atuais = {
+        linha.id: linha
+        for linha in db.session.execute(
+            db.select(tabela.c.id, tabela.c.status, tabela.c.data_hora)
+            .where(condicao)
+            .with_for_update()
+        )
+    }
+    validas = [consulta_id for consulta_id, linha in atuais.items() if linha.status in transicao.origens]
+
+    alteradas = {}
+    if validas:
+        # O status continua no WHERE: só muda o que ainda está numa origem válida
+        alteradas = {
+            linha.id: linha
+            for linha in db.session.execute(
+                update(Consulta)
+                .where(Consulta.id.in_(validas), Consulta.status.in_(transicao.origens))
+                .values(status=transicao.destino)
+                .returning(Consulta.id, Consulta.medico_id, Consulta.paciente_id, Consulta.data_hora)
+                .execution_options(synchronize_session=False)
+            )
+        }
+
+    variacoes = Counter()
+    for consulta_id, consulta in alteradas.items():
+        dia = consulta.data_hora.date()
+        variacoes[(consulta.medico_id, dia, atuais[consulta_id].status)] -= 1
+        variacoes[(consulta.medico_id, dia, transicao.destino)] += 1
+        if notificar:
+            enfileirar_notificacao(consulta, transicao.notificacao)
+    ajustar_contadores(db.session.connection(), variacoes)
+    marcar_timelines_alteradas(db.session, alteradas)
+    return atuais, alteradas
+
+
+def aplicar_em_lote(medico_id, acao, consulta_ids):
+    """
+    Aplica a ação ('confirmar', 'finalizar' ou 'cancelar') às consultas do médico e
+    retorna um ResultadoLote por id pedido, na ordem recebida. status é o status
+    final (ou o atual, se a transição não era válida). Não faz commit.
+    Consultas de outros médicos aparecem como NAO_ENCONTRADA.
+    """
+    consulta_ids = list(dict.fromkeys(consulta_ids))
+    atuais, alteradas = aplicar_transicao(
+        acao, (Consulta.id.in_(consulta_ids)) & (Consulta.medico_id == medico_id))
+
+    resultados = []
+    for consulta_id in consulta_ids:
+        atual = atuais.get(consulta_id)
+        if consulta_id in alteradas:
+            resultados.append(ResultadoLote(consulta_id, ALTERADA, TRANSICOES[acao].destino, atual.data_hora))
+        elif atual is not None:
+            resultados.append(ResultadoLote(consulta_id, STATUS_INVALIDO, atual.status, atual.data_hora))
+        else:
+            resultados.append(ResultadoLote(consulta_id, NAO_ENCONTRADA, None, None))
+    return resultados
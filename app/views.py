@@ -1,31 +1,70 @@
-from flask import abort, request
-from flask import render_template, flash, redirect, url_for, g
+import datetime
+import hmac
+import json
+from flask import abort, request, Response, stream_with_context
+from flask import render_template, stream_template, flash, redirect, url_for, g, jsonify
 from flask_login import login_user, logout_user, current_user, login_required
 from flask_limiter import Limiter                   # [SEGURANÇA] Importa a classe Limiter que controla o número de requisições por IP
 from flask_limiter.util import get_remote_address   # [SEGURANÇA] Importa a função que extrai o endereço IP do cliente de cada requisição
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
 from app import app, db, lm
+from app import limites  # [SEGURANÇA] Registra o esquema "medeasy+sqlite://" no Flask-Limiter
 from app.forms import (
     LoginForm, CadastroPacienteForm, CadastroMedicoForm,
     AgendamentoForm, EditarConsultaForm, EmptyForm,
-    EvolucaoForm, PrescriptionForm
+    EvolucaoForm, PrescriptionForm, FiltroConsultasForm, BuscaForm, AcaoEmLoteForm,
+    AlterarHorarioSerieForm
 )
 from app.models import (
-    User, Paciente, Medico, Consulta,
-    Evolucao, Receita
+    User, Paciente, Medico, Consulta, SerieConsultas,
+    Evolucao, Receita, conflito_de_horario
+)
+from app.paginacao import paginar
+from app.catalogo import buscar_medico
+from app.autenticacao import carregar_principal
+from app.senhas import ServicoSobrecarregado
+from app.prontuario import carregar_timeline, percorrer_prontuario
+from app.busca import buscar_registros
+from app.condicional import (
+    responder_se_nao_modificado, versao_consulta, versao_agenda, ultima_alteracao_consulta
+)
+from app.notificacoes import enfileirar_notificacao
+from app.metricas import exportar_prometheus
+from app.exportacao import gerar_exportacao, nome_arquivo, TIPOS_CONTEUDO
+from app.agenda import disponibilidade, rotulos_da_mascara, DURACAO_SLOT
+from app.replicas import somente_leitura
+from app.contadores import resumo_agenda
+from app.transicoes import (
+    aplicar_em_lote, MAXIMO_CONSULTAS_EM_LOTE, ALTERADA, STATUS_INVALIDO
+)
+from app.series import (
+    FREQUENCIAS, datas_da_serie, criar_serie, alterar_horario_serie, cancelar_serie
 )
 
 limiter = Limiter(
     get_remote_address,
     app=app,
     default_limits=[],
-    storage_uri="memory://"
+    storage_uri=app.config['RATELIMIT_STORAGE_URI'] or limites.uri_na_instancia(app)
 )
 
 
-# Carrega o usuário da sessão para o Flask-Login
+# Carrega o usuário da sessão para o Flask-Login. Usa um cache com o Principal
+# (id, nome, tipo); o objeto ORM completo só é carregado se alguma view precisar.
 @lm.user_loader
 def load_user(id):
-    return User.query.get(int(id))
+    return carregar_principal(int(id))
+
+
+# [SEGURANÇA] Pool de hashing de senhas cheio: recusa na hora em vez de enfileirar
+@app.errorhandler(ServicoSobrecarregado)
+def servico_sobrecarregado(erro):
+    return (
+        'Serviço temporariamente sobrecarregado. Tente novamente em instantes.',
+        503,
+        {'Retry-After': str(app.config.get('SENHAS_RETRY_AFTER', 2))}
+    )
 
 
 # Define o g.user antes de cada requisição
@@ -55,6 +94,12 @@ def login():
             flash('E-mail ou senha inválidos.')
             return redirect(url_for('login'))
 
+        # [SEGURANÇA] Se o hash foi gerado com parâmetros antigos, aproveita a senha
+        # correta que acabou de ser digitada para regravá-lo com os parâmetros atuais.
+        if user.senha_precisa_rehash():
+            user.set_password(form.password.data)
+            db.session.commit()
+
         login_user(user)
         flash('Login realizado com sucesso!')
         return redirect(url_for('dashboard'))
@@ -75,7 +120,9 @@ def logout():
 @app.route('/dashboard/')
 @login_required
 def dashboard():
-    return render_template('dashboard.html', user=g.user)
+    # Resumo da agenda lido dos contadores (no máximo uma linha por dia e status)
+    resumo = resumo_agenda(g.user.id) if g.user.user_type == 'medico' else None
+    return render_template('dashboard.html', user=g.user, resumo=resumo)
 
 
 # Rota para escolher o tipo de cadastro
@@ -155,48 +202,278 @@ def agendar_consulta():
     form = AgendamentoForm()
 
     if form.validate_on_submit():
-        medico_id = form.medico.data.id
-        data_hora = form.data_hora.data
+        if form.recorrencia.data:
+            return _agendar_serie(form)
 
-        consulta_existente = Consulta.query.filter(
-            Consulta.medico_id == medico_id,
-            Consulta.data_hora == data_hora,
-            Consulta.status.in_(['Agendada', 'Confirmada'])
-        ).first()
-
-        if consulta_existente:
-            flash(
-                f'O Dr(a). {consulta_existente.medico.name} já possui uma consulta '
-                f'agendada ou confirmada para este horário.',
-                'danger'
-            )
-            return redirect(url_for('agendar_consulta'))
+        medico = form.medico.data
+        data_hora = form.data_hora.data
 
+        # O índice único parcial (medico_id, data_hora) garante que não haja dois
+        # agendamentos ativos no mesmo horário: basta tentar inserir e tratar o erro,
+        # sem um SELECT prévio sujeito a condição de corrida.
         nova_consulta = Consulta(
             data_hora=data_hora,
             paciente_id=current_user.id,
-            medico_id=medico_id,
+            medico_id=medico.id,
             status='Agendada'
         )
         db.session.add(nova_consulta)
-        db.session.commit()
+        try:
+            # flush: gera o id da consulta (e detecta o conflito) antes de enfileirar os avisos
+            db.session.flush()
+            enfileirar_notificacao(nova_consulta, 'agendada')
+            db.session.commit()
+        except IntegrityError as erro:
+            db.session.rollback()
+            if not conflito_de_horario(erro):
+                raise
+            flash(
+                f'O Dr(a). {medico.name} já possui uma consulta '
+                f'agendada ou confirmada para este horário.',
+                'danger'
+            )
+            return redirect(url_for('agendar_consulta'))
         flash('Consulta agendada com sucesso!')
         return redirect(url_for('minhas_consultas'))
 
     return render_template('agendar_consulta.html', title='Agendar Consulta', form=form)
 
 
+def _formatar_datas(datas):
+    return ', '.join(data_hora.strftime('%d/%m/%Y %H:%M') for data_hora in datas)
+
+
+def _agendar_serie(form):
+    """Agenda todas as ocorrências da série de uma vez (ver app/series.py)."""
+    medico = form.medico.data
+    datas = datas_da_serie(
+        form.data_hora.data, FREQUENCIAS[form.recorrencia.data],
+        ocorrencias=form.ocorrencias.data, ate=form.repetir_ate.data
+    )
+    try:
+        resultado = criar_serie(current_user.id, medico.id, datas, FREQUENCIAS[form.recorrencia.data],
+                                pular_conflitos=form.pular_conflitos.data)
+        db.session.commit()
+    except IntegrityError as erro:
+        # Outro agendamento ocupou um dos horários entre a checagem e o INSERT
+        db.session.rollback()
+        if not conflito_de_horario(erro):
+            raise
+        flash('Um dos horários acabou de ser ocupado. Tente novamente.', 'danger')
+        return render_template('agendar_consulta.html', title='Agendar Consulta', form=form)
+
+    if resultado.serie is None:
+        if resultado.fora_da_janela:
+            flash('Fora do horário de atendimento: ' + _formatar_datas(resultado.fora_da_janela), 'danger')
+        if resultado.conflitos:
+            flash(
+                f'O Dr(a). {medico.name} já possui consulta agendada ou confirmada em: '
+                + _formatar_datas(resultado.conflitos) + '. Nenhuma consulta da série foi agendada.',
+                'danger'
+            )
+        return render_template('agendar_consulta.html', title='Agendar Consulta', form=form)
+
+    flash(f'{len(resultado.agendadas)} consulta(s) agendada(s) com sucesso!')
+    if resultado.conflitos:
+        flash('Horários ocupados, não agendados: ' + _formatar_datas(resultado.conflitos), 'warning')
+    return redirect(url_for('ver_serie', serie_id=resultado.serie.id))
+
+
+# Limites da API de disponibilidade, para manter cada chamada barata
+MAX_DIAS_DISPONIBILIDADE = 90
+MAX_MEDICOS_DISPONIBILIDADE = 500
+
+
+@app.route('/api/disponibilidade')
+@login_required
+@somente_leitura
+def api_disponibilidade():
+    """
+    Horários livres de um ou mais médicos em um intervalo de dias.
+    Parâmetros: medico_id (repetível), inicio (AAAA-MM-DD) e dias. Sem medico_id a
+    resposta traz todos os médicos em páginas de MAX_MEDICOS_DISPONIBILIDADE, em
+    ordem de id: o campo proximo (ou null na última página) vai no parâmetro apos
+    da chamada seguinte.
+    """
+    try:
+        medico_ids = [int(valor) for valor in request.args.getlist('medico_id')]
+        apos = int(request.args.get('apos', 0))
+        inicio = request.args.get('inicio')
+        inicio = datetime.date.fromisoformat(inicio) if inicio else datetime.date.today()
+        dias = int(request.args.get('dias', 30))
+    except ValueError:
+        abort(400)
+
+    if not 1 <= dias <= MAX_DIAS_DISPONIBILIDADE:
+        return jsonify({'erros': [f'dias deve estar entre 1 e {MAX_DIAS_DISPONIBILIDADE}.']}), 400
+    if len(medico_ids) > MAX_MEDICOS_DISPONIBILIDADE:
+        return jsonify({'erros': [
+            f'Informe no máximo {MAX_MEDICOS_DISPONIBILIDADE} medico_id por chamada.'
+        ]}), 400
+
+    proximo = None
+    if not medico_ids:
+        # Um a mais que a página só para saber se ainda há médicos depois dela
+        medico_ids = db.session.scalars(
+            db.select(Medico.id).where(Medico.id > apos).order_by(Medico.id)
+            .limit(MAX_MEDICOS_DISPONIBILIDADE + 1)
+        ).all()
+        if len(medico_ids) > MAX_MEDICOS_DISPONIBILIDADE:
+            medico_ids = medico_ids[:MAX_MEDICOS_DISPONIBILIDADE]
+            proximo = medico_ids[-1]
+
+    fim = inicio + datetime.timedelta(days=dias - 1)
+    livres = disponibilidade(medico_ids, inicio, fim)
+
+    return jsonify({
+        'inicio': inicio.isoformat(),
+        'fim': fim.isoformat(),
+        'duracao_slot_minutos': int(DURACAO_SLOT.total_seconds() // 60),
+        'proximo': proximo,
+        'medicos': {
+            str(medico_id): {
+                dia.isoformat(): rotulos_da_mascara(mascara)
+                for dia, mascara in agenda.items()
+            }
+            for medico_id, agenda in livres.items()
+        }
+    })
+
+
+def _filtros_da_listagem(filtro_form):
+    """Status e período (fim exclusivo) escolhidos no formulário de filtros."""
+    filtros = {'status': None, 'inicio': None, 'fim': None}
+    if filtro_form.validate():
+        filtros['status'] = filtro_form.status.data or None
+        if filtro_form.data_inicio.data:
+            filtros['inicio'] = datetime.datetime.combine(filtro_form.data_inicio.data, datetime.time.min)
+        if filtro_form.data_fim.data:
+            filtros['fim'] = datetime.datetime.combine(filtro_form.data_fim.data + datetime.timedelta(days=1), datetime.time.min)
+    return filtros
+
+
 @app.route('/consultas/')
 @login_required
+@somente_leitura
 def minhas_consultas():
     form = EmptyForm()
+    filtro_form = FiltroConsultasForm(formdata=request.args)
     consultas = []
+    proximo_cursor = None
+
     if current_user.user_type == 'paciente':
-        consultas = Consulta.query.filter_by(paciente_id=current_user.id).order_by(Consulta.data_hora.desc()).all()
+        coluna_dono = Consulta.paciente_id
     elif current_user.user_type == 'medico':
-        consultas = Consulta.query.filter_by(medico_id=current_user.id).order_by(Consulta.data_hora.desc()).all()
+        coluna_dono = Consulta.medico_id
+    else:
+        coluna_dono = None
+
+    if coluna_dono is not None:
+        query = Consulta.query.filter(coluna_dono == current_user.id)
+        # Carrega médico e paciente no mesmo SELECT da página, evitando uma
+        # consulta extra por linha ao renderizar o template (N+1).
+        query = query.options(
+            joinedload(Consulta.medico),
+            joinedload(Consulta.paciente)
+        )
+
+        filtros = _filtros_da_listagem(filtro_form)
+        if filtros['status']:
+            query = query.filter(Consulta.status == filtros['status'])
+        if filtros['inicio']:
+            query = query.filter(Consulta.data_hora >= filtros['inicio'])
+        if filtros['fim']:
+            query = query.filter(Consulta.data_hora < filtros['fim'])
+
+        consultas, proximo_cursor = paginar(
+            query, Consulta.data_hora, Consulta.id,
+            cursor=request.args.get('cursor')
+        )
+
+        # Nada mudou desde a última visita: 304 sem renderizar. Renomear médico ou
+        # paciente não altera atualizada_em da consulta, então os nomes exibidos
+        # entram no validador (como na chave dos fragmentos de consultas.html).
+        versao = versao_agenda(coluna_dono, current_user.id)
+        exibidos = [
+            (consulta.id, consulta.medico.name, consulta.medico.especialidade, consulta.paciente.name)
+            for consulta in consultas
+        ]
+        resposta = responder_se_nao_modificado(versao, exibidos, ultima_modificacao=versao)
+        if resposta is not None:
+            return resposta
+
+    # Mantém os filtros atuais no link da próxima página
+    filtros_ativos = {
+        chave: valor for chave, valor in request.args.items()
+        if chave in ('status', 'data_inicio', 'data_fim') and valor
+    }
 
-    return render_template('consultas.html', title='Minhas Consultas', consultas=consultas, form=form)
+    return render_template(
+        'consultas.html',
+        title='Minhas Consultas',
+        consultas=consultas,
+        form=form,
+        filtro_form=filtro_form,
+        proximo_cursor=proximo_cursor,
+        filtros_ativos=filtros_ativos,
+        lote_form=AcaoEmLoteForm() if current_user.user_type == 'medico' else None
+    )
+
+
+@app.route('/busca/')
+@login_required
+@somente_leitura
+def buscar():
+    """Busca nas evoluções e receitas das consultas do médico logado."""
+    if current_user.user_type != 'medico':
+        abort(403)
+
+    form = BuscaForm(formdata=request.args)
+    resultados = []
+    proxima_pagina = None
+
+    if request.args.get('q') and form.validate():
+        resultados, proxima_pagina = buscar_registros(
+            current_user.id, form.q.data,
+            pagina=request.args.get('pagina', 1, type=int)
+        )
+
+    return render_template(
+        'busca.html',
+        title='Buscar no Prontuário',
+        form=form,
+        resultados=resultados,
+        proxima_pagina=proxima_pagina
+    )
+
+
+@app.route('/consultas/exportar')
+@login_required
+@somente_leitura
+def exportar_consultas():
+    """
+    Exporta as consultas do usuário (com os mesmos filtros da listagem) em CSV ou
+    NDJSON, opcionalmente compactado (?gzip=1). O arquivo é enviado em streaming.
+    """
+    formato = request.args.get('formato', 'csv')
+    if formato not in TIPOS_CONTEUDO:
+        abort(400)
+
+    if current_user.user_type == 'paciente':
+        dono = {'paciente_id': current_user.id}
+    elif current_user.user_type == 'medico':
+        dono = {'medico_id': current_user.id}
+    else:
+        abort(403)
+
+    filtros = _filtros_da_listagem(FiltroConsultasForm(formdata=request.args))
+    gzip = request.args.get('gzip') == '1'
+
+    return Response(
+        stream_with_context(gerar_exportacao(formato, gzip=gzip, **dono, **filtros)),
+        mimetype='application/gzip' if gzip else TIPOS_CONTEUDO[formato],
+        headers={'Content-Disposition': f'attachment; filename={nome_arquivo(formato, gzip)}'}
+    )
 
 
 @app.route('/consulta/<int:consulta_id>/editar', methods=['GET', 'POST'])
@@ -207,7 +484,7 @@ def editar_consulta(consulta_id):
     if current_user.id not in [consulta.paciente_id, consulta.medico_id]:
         abort(403)
 
-    form = EditarConsultaForm(obj=consulta)
+    form = EditarConsultaForm(obj=consulta, medico=buscar_medico(consulta.medico_id))
 
     if current_user.user_type == 'paciente':
         form.status.choices = [
@@ -224,30 +501,30 @@ def editar_consulta(consulta_id):
             flash('Você não tem permissão para alterar o status para Confirmada ou Finalizada.', 'danger')
             return redirect(url_for('editar_consulta', consulta_id=consulta.id))
 
-        if novo_status in ['Agendada', 'Confirmada']:
-            consulta_existente = Consulta.query.filter(
-                Consulta.medico_id == novo_medico_id,
-                Consulta.data_hora == nova_data_hora,
-                Consulta.id != consulta.id,
-                Consulta.status.in_(['Agendada', 'Confirmada'])
-            ).first()
-
-            if consulta_existente:
-                flash(
-                    f'O Dr(a). {consulta_existente.medico.name} já possui outra consulta '
-                    f'agendada ou confirmada para este horário.',
-                    'danger'
-                )
-                return redirect(url_for('editar_consulta', consulta_id=consulta.id))
-
+        mudou_status = novo_status != consulta.status
         consulta.medico_id = novo_medico_id
         consulta.data_hora = nova_data_hora
         consulta.status = novo_status
-        db.session.commit()
+        # Mesma caixa de saída das rotas de confirmar/cancelar, no mesmo commit
+        # (tipos: 'agendada', 'confirmada', 'finalizada', 'cancelada')
+        if mudou_status:
+            enfileirar_notificacao(consulta, novo_status.lower())
+        try:
+            db.session.commit()
+        except IntegrityError as erro:
+            db.session.rollback()
+            if not conflito_de_horario(erro):
+                raise
+            flash(
+                f'O Dr(a). {form.medico.data.name} já possui outra consulta '
+                f'agendada ou confirmada para este horário.',
+                'danger'
+            )
+            return redirect(url_for('editar_consulta', consulta_id=consulta_id))
         flash('Consulta atualizada com sucesso!')
         return redirect(url_for('minhas_consultas'))
 
-    form.medico.data = consulta.medico
+    form.medico.data = buscar_medico(consulta.medico_id)
     form.data_hora.data = consulta.data_hora
 
     return render_template('editar_consulta.html', title='Editar Consulta', form=form, consulta=consulta)
@@ -261,7 +538,16 @@ def confirmar_consulta(consulta_id):
         abort(403)
 
     consulta.status = 'Confirmada'
-    db.session.commit()
+    enfileirar_notificacao(consulta, 'confirmada')
+    try:
+        db.session.commit()
+    except IntegrityError as erro:
+        # Reativar uma consulta cancelada pode colidir com outro agendamento no horário
+        db.session.rollback()
+        if not conflito_de_horario(erro):
+            raise
+        flash('Já existe outra consulta agendada ou confirmada para este horário.', 'danger')
+        return redirect(url_for('minhas_consultas'))
     flash('Consulta confirmada com sucesso!')
     return redirect(url_for('minhas_consultas'))
 
@@ -274,18 +560,94 @@ def cancelar_consulta(consulta_id):
         abort(403)
 
     consulta.status = 'Cancelada'
+    enfileirar_notificacao(consulta, 'cancelada')
     db.session.commit()
     flash('Consulta cancelada.')
     return redirect(url_for('minhas_consultas'))
 
 
+def _carregar_serie(serie_id):
+    serie = db.get_or_404(SerieConsultas, serie_id)
+    if current_user.id not in [serie.paciente_id, serie.medico_id]:
+        abort(403)
+    return serie
+
+
+@app.route('/serie/<int:serie_id>')
+@login_required
+@somente_leitura
+def ver_serie(serie_id):
+    serie = _carregar_serie(serie_id)
+    consultas = db.session.scalars(
+        db.select(Consulta).where(Consulta.serie_id == serie.id).order_by(Consulta.data_hora)
+    ).all()
+    return render_template(
+        'serie.html', title='Consultas Recorrentes', serie=serie, consultas=consultas,
+        form=EmptyForm(), horario_form=AlterarHorarioSerieForm()
+    )
+
+
+@app.route('/serie/<int:serie_id>/horario', methods=['POST'])
+@login_required
+def alterar_horario_da_serie(serie_id):
+    serie = _carregar_serie(serie_id)
+    form = AlterarHorarioSerieForm()
+    if not form.validate_on_submit():
+        for erro in form.hora.errors:
+            flash(erro, 'danger')
+        return redirect(url_for('ver_serie', serie_id=serie.id))
+
+    try:
+        alteradas, conflitos = alterar_horario_serie(serie, form.hora.data)
+        db.session.commit()
+    except IntegrityError as erro:
+        db.session.rollback()
+        if not conflito_de_horario(erro):
+            raise
+        flash('Um dos horários acabou de ser ocupado. Tente novamente.', 'danger')
+        return redirect(url_for('ver_serie', serie_id=serie.id))
+
+    if conflitos:
+        flash(
+            f'O Dr(a). {serie.medico.name} já possui consulta agendada ou confirmada em: '
+            + _formatar_datas(conflitos) + '. O horário da série não foi alterado.',
+            'danger'
+        )
+    elif alteradas:
+        flash(f'Horário alterado em {len(alteradas)} consulta(s).')
+    else:
+        flash('A série não tem consultas futuras para alterar.', 'warning')
+    return redirect(url_for('ver_serie', serie_id=serie.id))
+
+
+@app.route('/serie/<int:serie_id>/cancelar', methods=['POST'])
+@login_required
+def cancelar_consultas_da_serie(serie_id):
+    serie = _carregar_serie(serie_id)
+    canceladas = cancelar_serie(serie)
+    db.session.commit()
+    flash(f'{canceladas} consulta(s) da série cancelada(s).')
+    return redirect(url_for('ver_serie', serie_id=serie.id))
+
+
 @app.route('/consulta/<int:consulta_id>/evolucoes', methods=['GET', 'POST'])
 @login_required
 def gerenciar_evolucoes(consulta_id):
     if current_user.user_type != 'medico':
         abort(403)
 
-    consulta = Consulta.query.get_or_404(consulta_id)
+    # GET sem alterações desde a última visita: 304 antes de carregar a consulta
+    versao = versao_consulta(consulta_id)
+    if versao is not None and versao.medico_id == current_user.id:
+        resposta = responder_se_nao_modificado(
+            tuple(versao), ultima_modificacao=ultima_alteracao_consulta(versao))
+        if resposta is not None:
+            return resposta
+
+    consulta = Consulta.query.options(
+        joinedload(Consulta.paciente),
+        joinedload(Consulta.medico)
+    ).get_or_404(consulta_id)
 
     if current_user.id != consulta.medico_id:
         flash('Você não tem permissão para acessar o prontuário desta consulta.')
@@ -303,7 +665,8 @@ def gerenciar_evolucoes(consulta_id):
         db.session.add(nova_evolucao)
         db.session.commit()
         flash('Evolução salva com sucesso!')
-        return redirect(url_for('gerenciar_evolucoes', consulta_id=consulta.id))
+        # Id da rota: consulta.id depois do commit recarregaria a consulta (SELECT a mais)
+        return redirect(url_for('gerenciar_evolucoes', consulta_id=consulta_id))
 
     if prescription_form.submit_receita.data and prescription_form.validate_on_submit():
         nova_receita = Receita(
@@ -313,10 +676,9 @@ def gerenciar_evolucoes(consulta_id):
         db.session.add(nova_receita)
         db.session.commit()
         flash('Receita salva com sucesso!')
-        return redirect(url_for('gerenciar_evolucoes', consulta_id=consulta.id))
+        return redirect(url_for('gerenciar_evolucoes', consulta_id=consulta_id))
 
-    evolucoes = consulta.evolucoes.order_by(Evolucao.data_criacao.asc()).all()
-    receitas = consulta.receitas.order_by(Receita.timestamp.desc()).all()
+    entradas, proximo_cursor = carregar_timeline(consulta.id, cursor=request.args.get('cursor'))
 
     return render_template(
         'evolucoes.html',
@@ -324,34 +686,111 @@ def gerenciar_evolucoes(consulta_id):
         evolucao_form=evolucao_form,
         prescription_form=prescription_form,
         consulta=consulta,
-        evolucoes=evolucoes,
-        receitas=receitas
+        entradas=entradas,
+        proximo_cursor=proximo_cursor
     )
 
 
 @app.route('/consulta/<int:consulta_id>/historico/')
 @login_required
+@somente_leitura
 def historico_consulta(consulta_id):
     if current_user.user_type != 'paciente':
         abort(403)
 
-    consulta = Consulta.query.get_or_404(consulta_id)
+    versao = versao_consulta(consulta_id)
+    if versao is not None and versao.paciente_id == current_user.id:
+        resposta = responder_se_nao_modificado(
+            tuple(versao), ultima_modificacao=ultima_alteracao_consulta(versao))
+        if resposta is not None:
+            return resposta
+
+    consulta = Consulta.query.options(
+        joinedload(Consulta.paciente),
+        joinedload(Consulta.medico)
+    ).get_or_404(consulta_id)
 
     if current_user.id != consulta.paciente_id:
         abort(403)
 
-    evolucoes = consulta.evolucoes.order_by(Evolucao.data_criacao.asc()).all()
-    receitas = consulta.receitas.order_by(Receita.timestamp.desc()).all()
+    entradas, proximo_cursor = carregar_timeline(consulta.id, cursor=request.args.get('cursor'))
 
     return render_template(
         'historico_consulta.html',
         title='Histórico da Consulta',
         consulta=consulta,
-        evolucoes=evolucoes,
-        receitas=receitas
+        entradas=entradas,
+        proximo_cursor=proximo_cursor
     )
 
 
+def _prontuario_json(paciente, consultas):
+    """Gera o prontuário em JSON aos pedaços, uma consulta por vez."""
+    yield json.dumps({'id': paciente.id, 'nome': paciente.name})[:-1] + ', "consultas": ['
+    for indice, consulta in enumerate(consultas):
+        yield (',' if indice else '') + json.dumps({
+            'id': consulta.id,
+            'data_hora': consulta.data_hora.isoformat(),
+            'status': consulta.status,
+            'medico': consulta.medico,
+            'especialidade': consulta.especialidade,
+            'evolucoes': [
+                {'id': evolucao.id, 'data_criacao': evolucao.data_criacao.isoformat(),
+                 'autor': evolucao.autor, 'conteudo': evolucao.conteudo}
+                for evolucao in consulta.evolucoes
+            ],
+            'receitas': [
+                {'id': receita.id, 'timestamp': receita.timestamp.isoformat(),
+                 'descricao': receita.descricao}
+                for receita in consulta.receitas
+            ],
+        })
+    yield ']}'
+
+
+@app.route('/paciente/<int:paciente_id>/prontuario')
+@login_required
+@somente_leitura
+def prontuario_paciente(paciente_id):
+    """
+    Histórico completo do paciente (todas as consultas, evoluções e receitas),
+    enviado em streaming como HTML ou JSON (?formato=json).
+    """
+    if current_user.user_type == 'paciente':
+        if current_user.id != paciente_id:
+            abort(403)
+        medico_id = None
+    elif current_user.user_type == 'medico':
+        # O médico só vê as consultas que atendeu, e precisa ter atendido ao menos uma
+        medico_id = current_user.id
+        atendeu = db.session.scalar(
+            db.select(Consulta.id).where(
+                Consulta.paciente_id == paciente_id,
+                Consulta.medico_id == medico_id
+            ).limit(1)
+        )
+        if atendeu is None:
+            abort(403)
+    else:
+        abort(403)
+
+    paciente = db.get_or_404(Paciente, paciente_id)
+    consultas = percorrer_prontuario(paciente_id, medico_id=medico_id)
+
+    if request.args.get('formato') == 'json':
+        return Response(
+            stream_with_context(_prontuario_json(paciente, consultas)),
+            mimetype='application/json'
+        )
+
+    return Response(stream_template(
+        'prontuario_paciente.html',
+        title='Prontuário do Paciente',
+        paciente=paciente,
+        consultas=consultas
+    ))
+
+
 @app.route('/consulta/<int:consulta_id>/finalizar', methods=['POST'])
 @login_required
 def finalizar_consulta(consulta_id):
@@ -365,6 +804,82 @@ def finalizar_consulta(consulta_id):
         return redirect(url_for('minhas_consultas'))
 
     consulta.status = 'Finalizada'
+    enfileirar_notificacao(consulta, 'finalizada')
     db.session.commit()
     flash('Consulta marcada como finalizada com sucesso!')
-    return redirect(url_for('minhas_consultas'))
\ No newline at end of file
+    return redirect(url_for('minhas_consultas'))
+
+
+# Filtros e página da agenda preservados no retorno da ação em lote
+_PARAMETROS_DA_AGENDA = ('status', 'data_inicio', 'data_fim', 'cursor')
+
+_MENSAGENS_LOTE = {
+    'confirmar': '{} consulta(s) confirmada(s).',
+    'finalizar': '{} consulta(s) finalizada(s).',
+    'cancelar': '{} consulta(s) cancelada(s).',
+}
+
+
+def _parametros_da_agenda():
+    return {chave: request.form[chave] for chave in _PARAMETROS_DA_AGENDA if request.form.get(chave)}
+
+
+@app.route('/consultas/lote', methods=['POST'])
+@login_required
+def acoes_em_lote():
+    """
+    Confirma, finaliza ou cancela de uma vez as consultas marcadas na agenda do
+    médico. Responde com o resultado de cada consulta em JSON (?formato=json) ou
+    em mensagens na própria agenda.
+    """
+    if current_user.user_type != 'medico':
+        abort(403)
+
+    form = AcaoEmLoteForm()
+    como_json = request.args.get('formato') == 'json'
+    if not form.validate_on_submit() or len(form.consulta_ids.data) > MAXIMO_CONSULTAS_EM_LOTE:
+        erros = [erro for erros in form.errors.values() for erro in erros] or [
+            f'Selecione no máximo {MAXIMO_CONSULTAS_EM_LOTE} consultas por vez.'
+        ]
+        if como_json:
+            return jsonify({'erros': erros}), 400
+        for erro in erros:
+            flash(erro, 'danger')
+        return redirect(url_for('minhas_consultas', **_parametros_da_agenda()))
+
+    resultados = aplicar_em_lote(current_user.id, form.acao.data, form.consulta_ids.data)
+    db.session.commit()
+
+    if como_json:
+        return jsonify({'resultados': [
+            {'id': item.consulta_id, 'resultado': item.resultado, 'status': item.status}
+            for item in resultados
+        ]})
+
+    alteradas = [item for item in resultados if item.resultado == ALTERADA]
+    if alteradas:
+        flash(_MENSAGENS_LOTE[form.acao.data].format(len(alteradas)))
+    ignoradas = [item for item in resultados if item.resultado == STATUS_INVALIDO]
+    if ignoradas:
+        flash('Não alteradas (status não permite a ação): ' + ', '.join(
+            f'{item.data_hora.strftime("%d/%m %H:%M")} ({item.status})' for item in ignoradas
+        ), 'warning')
+    nao_encontradas = len(resultados) - len(alteradas) - len(ignoradas)
+    if nao_encontradas:
+        flash(f'{nao_encontradas} consulta(s) não encontrada(s) na sua agenda.', 'danger')
+    return redirect(url_for('minhas_consultas', **_parametros_da_agenda()))
+
+
+
+# [SEGURANÇA] Métricas de desempenho para o Prometheus, protegidas por token (Bearer).
+# Sem METRICAS_TOKEN configurado a rota fica indisponível.
+@app.route('/metrics')
+@limiter.exempt
+def metrics():
+    token = app.config.get('METRICAS_TOKEN')
+    if not app.config.get('METRICAS_ATIVAS') or not token:
+        abort(404)
+    enviado = request.headers.get('Authorization', '')
+    if not hmac.compare_digest(enviado.encode(), f'Bearer {token}'.encode()):
+        abort(401)
+    return Response(exportar_prometheus(), mimetype='text/plain; version=0.0.4')
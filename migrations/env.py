@@ -90,9 +90,23 @@ def run_migrations_online():
                 directives[:] = []
                 logger.info('No changes in schema detected.')
 
+    # a busca textual (tabelas FTS5 no SQLite, coluna tsvector e índices GIN no
+    # PostgreSQL) é mantida fora dos modelos; o autogenerate não deve removê-la
+    def include_object(object, name, type_, reflected, compare_to):
+        if reflected and compare_to is None:
+            if type_ == 'table' and name.startswith('busca_clinica'):
+                return False
+            if type_ == 'column' and name == 'busca':
+                return False
+            if type_ == 'index' and name in ('ix_evolucoes_busca', 'ix_receitas_busca'):
+                return False
+        return True
+
     conf_args = current_app.extensions['migrate'].configure_args
     if conf_args.get("process_revision_directives") is None:
         conf_args["process_revision_directives"] = process_revision_directives
+    if conf_args.get("include_object") is None:
+        conf_args["include_object"] = include_object
 
     connectable = get_engine()
 
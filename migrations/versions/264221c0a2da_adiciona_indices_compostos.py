@@ -0,0 +1,52 @@
+"""Adiciona índices compostos para consultas, evoluções e receitas.
+
+Revision ID: 264221c0a2da
+Revises: 13b367dd3406
+Create Date: 2026-10-18 10:12:41.302118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '264221c0a2da'
+down_revision = '13b367dd3406'
+branch_labels = None
+depends_on = None
+
+
+# (nome, tabela, colunas) — cada índice corresponde a um caminho de acesso das views:
+# agenda do médico e checagem de conflito, listagem do paciente e carga do prontuário.
+INDICES = [
+    ('ix_consultas_medico_id_data_hora', 'consultas', ['medico_id', 'data_hora']),
+    ('ix_consultas_paciente_id_data_hora', 'consultas', ['paciente_id', 'data_hora']),
+    ('ix_evolucoes_consulta_id_data_criacao', 'evolucoes', ['consulta_id', 'data_criacao']),
+    ('ix_receitas_consulta_id_timestamp', 'receitas', ['consulta_id', 'timestamp']),
+]
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        # CREATE INDEX CONCURRENTLY não pode rodar dentro de uma transação e
+        # evita travar as tabelas para escrita durante a criação.
+        with op.get_context().autocommit_block():
+            for nome, tabela, colunas in INDICES:
+                op.create_index(nome, tabela, colunas, unique=False,
+                                postgresql_concurrently=True, if_not_exists=True)
+    else:
+        for nome, tabela, colunas in INDICES:
+            with op.batch_alter_table(tabela, schema=None) as batch_op:
+                batch_op.create_index(nome, colunas, unique=False)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            for nome, tabela, colunas in reversed(INDICES):
+                op.drop_index(nome, table_name=tabela,
+                              postgresql_concurrently=True, if_exists=True)
+    else:
+        for nome, tabela, colunas in reversed(INDICES):
+            with op.batch_alter_table(tabela, schema=None) as batch_op:
+                batch_op.drop_index(nome)
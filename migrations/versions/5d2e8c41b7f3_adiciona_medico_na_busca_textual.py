@@ -0,0 +1,104 @@
+"""Adiciona o médico da consulta ao índice de busca textual (SQLite).
+
+Revision ID: 5d2e8c41b7f3
+Revises: 86ab07c043a6
+Create Date: 2026-10-18 16:05:42.118203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d2e8c41b7f3'
+down_revision = '86ab07c043a6'
+branch_labels = None
+depends_on = None
+
+
+# Só o SQLite muda: a tabela FTS5 busca_clinica ganha a coluna "medico" (médico da
+# consulta), usada no MATCH para o FTS5 ranquear apenas as anotações do médico que
+# busca. Tabelas virtuais não aceitam ALTER TABLE, então a tabela é recriada e
+# preenchida de novo. No PostgreSQL nada muda no esquema.
+
+MEDICO_DA_CONSULTA = "(SELECT medico_id FROM consultas WHERE id = new.consulta_id)"
+
+TRIGGERS_ANTIGOS = [
+    'evolucoes_busca_insert', 'evolucoes_busca_update', 'evolucoes_busca_delete',
+    'receitas_busca_insert', 'receitas_busca_update', 'receitas_busca_delete',
+]
+
+TRIGGERS_SQLITE = [
+    "CREATE TRIGGER evolucoes_busca_insert AFTER INSERT ON evolucoes BEGIN "
+    "INSERT INTO busca_clinica (rowid, texto, medico) "
+    f"VALUES (new.id * 2, new.conteudo, {MEDICO_DA_CONSULTA}); END",
+    "CREATE TRIGGER evolucoes_busca_update AFTER UPDATE OF conteudo, consulta_id ON evolucoes BEGIN "
+    f"UPDATE busca_clinica SET texto = new.conteudo, medico = {MEDICO_DA_CONSULTA} "
+    "WHERE rowid = old.id * 2; END",
+    "CREATE TRIGGER evolucoes_busca_delete AFTER DELETE ON evolucoes BEGIN "
+    "DELETE FROM busca_clinica WHERE rowid = old.id * 2; END",
+    "CREATE TRIGGER receitas_busca_insert AFTER INSERT ON receitas BEGIN "
+    "INSERT INTO busca_clinica (rowid, texto, medico) "
+    f"VALUES (new.id * 2 + 1, new.descricao, {MEDICO_DA_CONSULTA}); END",
+    "CREATE TRIGGER receitas_busca_update AFTER UPDATE OF descricao, consulta_id ON receitas BEGIN "
+    f"UPDATE busca_clinica SET texto = new.descricao, medico = {MEDICO_DA_CONSULTA} "
+    "WHERE rowid = old.id * 2 + 1; END",
+    "CREATE TRIGGER receitas_busca_delete AFTER DELETE ON receitas BEGIN "
+    "DELETE FROM busca_clinica WHERE rowid = old.id * 2 + 1; END",
+    "CREATE TRIGGER consultas_busca_medico AFTER UPDATE OF medico_id ON consultas "
+    "WHEN old.medico_id IS NOT new.medico_id BEGIN "
+    "UPDATE busca_clinica SET medico = new.medico_id WHERE rowid IN ("
+    "SELECT id * 2 FROM evolucoes WHERE consulta_id = new.id "
+    "UNION ALL SELECT id * 2 + 1 FROM receitas WHERE consulta_id = new.id); END",
+]
+
+# Versão anterior (a4461d0f712d), recriada no downgrade
+TRIGGERS_ANTERIORES = [
+    "CREATE TRIGGER evolucoes_busca_insert AFTER INSERT ON evolucoes BEGIN "
+    "INSERT INTO busca_clinica (rowid, texto) VALUES (new.id * 2, new.conteudo); END",
+    "CREATE TRIGGER evolucoes_busca_update AFTER UPDATE OF conteudo ON evolucoes BEGIN "
+    "UPDATE busca_clinica SET texto = new.conteudo WHERE rowid = old.id * 2; END",
+    "CREATE TRIGGER evolucoes_busca_delete AFTER DELETE ON evolucoes BEGIN "
+    "DELETE FROM busca_clinica WHERE rowid = old.id * 2; END",
+    "CREATE TRIGGER receitas_busca_insert AFTER INSERT ON receitas BEGIN "
+    "INSERT INTO busca_clinica (rowid, texto) VALUES (new.id * 2 + 1, new.descricao); END",
+    "CREATE TRIGGER receitas_busca_update AFTER UPDATE OF descricao ON receitas BEGIN "
+    "UPDATE busca_clinica SET texto = new.descricao WHERE rowid = old.id * 2 + 1; END",
+    "CREATE TRIGGER receitas_busca_delete AFTER DELETE ON receitas BEGIN "
+    "DELETE FROM busca_clinica WHERE rowid = old.id * 2 + 1; END",
+]
+
+
+def _remover_busca():
+    for nome in TRIGGERS_ANTIGOS + ['consultas_busca_medico']:
+        op.execute(f'DROP TRIGGER IF EXISTS {nome}')
+    op.execute('DROP TABLE IF EXISTS busca_clinica')
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        return
+    _remover_busca()
+    op.execute("CREATE VIRTUAL TABLE busca_clinica "
+               "USING fts5(texto, medico, tokenize = 'unicode61 remove_diacritics 2')")
+    op.execute("INSERT INTO busca_clinica (busca_clinica, rank) VALUES ('rank', 'bm25(1.0, 0.0)')")
+    for comando in TRIGGERS_SQLITE:
+        op.execute(comando)
+    op.execute("INSERT INTO busca_clinica (rowid, texto, medico) "
+               "SELECT evolucoes.id * 2, evolucoes.conteudo, consultas.medico_id "
+               "FROM evolucoes JOIN consultas ON consultas.id = evolucoes.consulta_id "
+               "UNION ALL SELECT receitas.id * 2 + 1, receitas.descricao, consultas.medico_id "
+               "FROM receitas JOIN consultas ON consultas.id = receitas.consulta_id")
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        return
+    _remover_busca()
+    op.execute("CREATE VIRTUAL TABLE busca_clinica "
+               "USING fts5(texto, tokenize = 'unicode61 remove_diacritics 2')")
+    for comando in TRIGGERS_ANTERIORES:
+        op.execute(comando)
+    op.execute("INSERT INTO busca_clinica (rowid, texto) "
+               "SELECT id * 2, conteudo FROM evolucoes "
+               "UNION ALL SELECT id * 2 + 1, descricao FROM receitas")
@@ -0,0 +1,51 @@
+"""Adiciona consultas.atualizada_em (versão para validadores HTTP).
+
+Revision ID: 94479461bc8a
+Revises: a4461d0f712d
+Create Date: 2026-10-18 15:02:41.776310
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '94479461bc8a'
+down_revision = 'a4461d0f712d'
+branch_labels = None
+depends_on = None
+
+
+INDICES = [
+    ('ix_consultas_medico_id_atualizada_em', ['medico_id', 'atualizada_em']),
+    ('ix_consultas_paciente_id_atualizada_em', ['paciente_id', 'atualizada_em']),
+]
+
+
+def upgrade():
+    op.add_column('consultas', sa.Column('atualizada_em', sa.DateTime(), nullable=True))
+    # Consultas existentes: considera a data da migração como última alteração
+    op.execute('UPDATE consultas SET atualizada_em = CURRENT_TIMESTAMP')
+
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            for nome, colunas in INDICES:
+                op.create_index(nome, 'consultas', colunas, unique=False,
+                                postgresql_concurrently=True, if_not_exists=True)
+    else:
+        for nome, colunas in INDICES:
+            op.create_index(nome, 'consultas', colunas, unique=False)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            for nome, colunas in reversed(INDICES):
+                op.drop_index(nome, table_name='consultas',
+                              postgresql_concurrently=True, if_exists=True)
+    else:
+        for nome, colunas in reversed(INDICES):
+            op.drop_index(nome, table_name='consultas')
+
+    with op.batch_alter_table('consultas', schema=None) as batch_op:
+        batch_op.drop_column('atualizada_em')
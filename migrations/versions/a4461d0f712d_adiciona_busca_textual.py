@@ -0,0 +1,75 @@
+"""Adiciona busca textual em evoluções e receitas.
+
+Revision ID: a4461d0f712d
+Revises: bf6197d08bf2
+Create Date: 2026-10-18 14:12:05.301127
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4461d0f712d'
+down_revision = 'bf6197d08bf2'
+branch_labels = None
+depends_on = None
+
+
+# PostgreSQL: coluna gerada tsvector + índice GIN. Atenção: adicionar uma coluna
+# STORED reescreve a tabela (bloqueio exclusivo); aplique fora do horário de pico.
+# SQLite: tabela FTS5 espelhada por triggers, preenchida com os registros atuais.
+
+TRIGGERS_SQLITE = [
+    "CREATE TRIGGER evolucoes_busca_insert AFTER INSERT ON evolucoes BEGIN "
+    "INSERT INTO busca_clinica (rowid, texto) VALUES (new.id * 2, new.conteudo); END",
+    "CREATE TRIGGER evolucoes_busca_update AFTER UPDATE OF conteudo ON evolucoes BEGIN "
+    "UPDATE busca_clinica SET texto = new.conteudo WHERE rowid = old.id * 2; END",
+    "CREATE TRIGGER evolucoes_busca_delete AFTER DELETE ON evolucoes BEGIN "
+    "DELETE FROM busca_clinica WHERE rowid = old.id * 2; END",
+    "CREATE TRIGGER receitas_busca_insert AFTER INSERT ON receitas BEGIN "
+    "INSERT INTO busca_clinica (rowid, texto) VALUES (new.id * 2 + 1, new.descricao); END",
+    "CREATE TRIGGER receitas_busca_update AFTER UPDATE OF descricao ON receitas BEGIN "
+    "UPDATE busca_clinica SET texto = new.descricao WHERE rowid = old.id * 2 + 1; END",
+    "CREATE TRIGGER receitas_busca_delete AFTER DELETE ON receitas BEGIN "
+    "DELETE FROM busca_clinica WHERE rowid = old.id * 2 + 1; END",
+]
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("ALTER TABLE evolucoes ADD COLUMN busca tsvector "
+                   "GENERATED ALWAYS AS (to_tsvector('portuguese', conteudo)) STORED")
+        op.execute("ALTER TABLE receitas ADD COLUMN busca tsvector "
+                   "GENERATED ALWAYS AS (to_tsvector('portuguese', descricao)) STORED")
+        with op.get_context().autocommit_block():
+            op.create_index('ix_evolucoes_busca', 'evolucoes', ['busca'],
+                            postgresql_using='gin', postgresql_concurrently=True,
+                            if_not_exists=True)
+            op.create_index('ix_receitas_busca', 'receitas', ['busca'],
+                            postgresql_using='gin', postgresql_concurrently=True,
+                            if_not_exists=True)
+    else:
+        op.execute("CREATE VIRTUAL TABLE busca_clinica "
+                   "USING fts5(texto, tokenize = 'unicode61 remove_diacritics 2')")
+        for comando in TRIGGERS_SQLITE:
+            op.execute(comando)
+        op.execute("INSERT INTO busca_clinica (rowid, texto) "
+                   "SELECT id * 2, conteudo FROM evolucoes "
+                   "UNION ALL SELECT id * 2 + 1, descricao FROM receitas")
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            op.drop_index('ix_receitas_busca', table_name='receitas',
+                          postgresql_concurrently=True, if_exists=True)
+            op.drop_index('ix_evolucoes_busca', table_name='evolucoes',
+                          postgresql_concurrently=True, if_exists=True)
+        op.drop_column('receitas', 'busca')
+        op.drop_column('evolucoes', 'busca')
+    else:
+        for nome in ('evolucoes_busca_insert', 'evolucoes_busca_update', 'evolucoes_busca_delete',
+                     'receitas_busca_insert', 'receitas_busca_update', 'receitas_busca_delete'):
+            op.execute(f'DROP TRIGGER IF EXISTS {nome}')
+        op.execute('DROP TABLE IF EXISTS busca_clinica')
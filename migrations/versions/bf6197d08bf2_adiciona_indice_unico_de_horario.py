@@ -0,0 +1,43 @@
+"""Adiciona índice único parcial de horário ativo por médico.
+
+Revision ID: bf6197d08bf2
+Revises: 264221c0a2da
+Create Date: 2026-10-18 11:03:27.518940
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'bf6197d08bf2'
+down_revision = '264221c0a2da'
+branch_labels = None
+depends_on = None
+
+
+# Atenção: se já existirem consultas ativas duplicadas (mesmo médico e horário),
+# a criação do índice falha. Cancele as duplicadas antes de aplicar a migração.
+CONDICAO = sa.text("status IN ('Agendada', 'Confirmada')")
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            op.create_index('uq_consultas_medico_horario_ativo', 'consultas',
+                            ['medico_id', 'data_hora'], unique=True,
+                            postgresql_where=CONDICAO,
+                            postgresql_concurrently=True, if_not_exists=True)
+    else:
+        op.create_index('uq_consultas_medico_horario_ativo', 'consultas',
+                        ['medico_id', 'data_hora'], unique=True,
+                        sqlite_where=CONDICAO)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            op.drop_index('uq_consultas_medico_horario_ativo', table_name='consultas',
+                          postgresql_concurrently=True, if_exists=True)
+    else:
+        op.drop_index('uq_consultas_medico_horario_ativo', table_name='consultas')
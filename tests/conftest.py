@@ -0,0 +1,120 @@
+import datetime
+import os
+import tempfile
+
+# A aplicação é configurada no import: o ambiente de teste precisa vir antes.
+# Cada execução usa um arquivo SQLite novo (vários testes abrem conexões em
+# threads/processos, o que um banco :memory: não permite).
+_DIRETORIO = tempfile.mkdtemp(prefix='medeasy-testes-')
+os.environ['MEDEASY_CONFIG'] = 'app.configuration.TestingConfig'
+os.environ.setdefault('TEST_DATABASE_URL', 'sqlite:///' + os.path.join(_DIRETORIO, 'testes.db'))
+
+import pytest
+from flask.testing import FlaskClient
+from flask_migrate import upgrade
+from app import app as aplicacao, db
+from app.models import Medico, Paciente, Consulta
+from app import autenticacao, catalogo, fragmentos, prontuario
+from app.orcamento import orcamento_de_consultas
+
+SENHA = 'senha-de-teste'
+MIGRACOES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+
+
+# Testes de desempenho (tempo de relógio): lentos e sensíveis à carga da máquina,
+# ficam fora da execução normal. Rode com: pytest --benchmark
+def pytest_addoption(parser):
+    parser.addoption('--benchmark', action='store_true',
+                     help='Roda também os testes marcados com @pytest.mark.benchmark.')
+
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'benchmark: teste de desempenho, só roda com --benchmark')
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption('--benchmark'):
+        return
+    pular = pytest.mark.skip(reason='teste de desempenho: use --benchmark')
+    for item in items:
+        if 'benchmark' in item.keywords:
+            item.add_marker(pular)
+
+
+class ClienteDeTeste(FlaskClient):
+    """
+    Cada requisição ganha o próprio contexto de aplicação, como no servidor: sem
+    isso ela reaproveitaria o contexto do teste, e g (usuário logado, destino das
+    leituras) e db.session vazariam de uma requisição para a outra. O corpo é lido
+    dentro do contexto, inclusive nas respostas em streaming.
+    """
+    def open(self, *args, **kwargs):
+        kwargs.setdefault('buffered', True)
+        with self.application.app_context():
+            return super().open(*args, **kwargs)
+
+
+@pytest.fixture
+def app():
+    """
+    Aplicação com o banco recriado pelas migrações (como em produção: a busca
+    textual só existe nelas) e os caches em memória vazios.
+    """
+    aplicacao.test_client_class = ClienteDeTeste
+    with aplicacao.app_context():
+        upgrade(directory=MIGRACOES)
+        yield aplicacao
+        db.session.remove()
+        db.drop_all()
+        # Fora do metadata dos modelos: a tabela FTS5 (SQLite) e a versão do Alembic
+        with db.engine.begin() as conexao:
+            conexao.exec_driver_sql('DROP TABLE IF EXISTS busca_clinica')
+            conexao.exec_driver_sql('DROP TABLE IF EXISTS alembic_version')
+    autenticacao._principais.clear()
+    catalogo.invalidar_catalogo()
+    fragmentos._fragmentos.clear()
+    prontuario._timelines.clear()
+
+
+@pytest.fixture
+def orcamento_sql():
+    """orcamento_sql(maximo): falha o bloco que executar mais de 'maximo' consultas SQL."""
+    return orcamento_de_consultas
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def criar_medico(nome='Dra. Ana', crm='1000', especialidade='Clínica Geral'):
+    medico = Medico(name=nome, email=f'{crm}@medicos.medeasy.com.br', crm=crm, especialidade=especialidade)
+    medico.set_password(SENHA)
+    db.session.add(medico)
+    db.session.commit()
+    return medico
+
+
+def criar_paciente(nome='João', cpf='52998224725'):
+    paciente = Paciente(name=nome, email=f'{cpf}@pacientes.medeasy.com.br', cpf=cpf)
+    paciente.set_password(SENHA)
+    db.session.add(paciente)
+    db.session.commit()
+    return paciente
+
+
+def criar_consultas(medico, paciente, quantidade, inicio=datetime.datetime(2030, 1, 7, 8, 0), status='Agendada'):
+    """Uma consulta por dia, no mesmo horário, a partir de inicio."""
+    consultas = [
+        Consulta(data_hora=inicio + datetime.timedelta(days=dia), medico_id=medico.id,
+                 paciente_id=paciente.id, status=status)
+        for dia in range(quantidade)
+    ]
+    db.session.add_all(consultas)
+    db.session.commit()
+    return consultas
+
+
+def entrar(client, usuario):
+    resposta = client.post('/login/', data={'email': usuario.email, 'password': SENHA})
+    assert resposta.status_code == 302, resposta.get_data(as_text=True)
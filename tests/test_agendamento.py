@@ -0,0 +1,80 @@
+import threading
+from app.models import Consulta
+from conftest import criar_medico, criar_paciente, entrar
+
+CONCORRENTES = 16
+
+
+def test_agendamentos_simultaneos_no_mesmo_horario(app):
+    """
+    Vários pacientes tentam o mesmo médico e horário ao mesmo tempo: o índice único
+    parcial deixa exatamente um agendamento passar e os demais recebem a mensagem
+    de conflito, sem erro 500.
+    """
+    medico_id = criar_medico().id
+    clientes = []
+    for indice in range(CONCORRENTES):
+        cliente = app.test_client()
+        entrar(cliente, criar_paciente(nome=f'Paciente {indice}', cpf=_cpf(indice)))
+        clientes.append(cliente)
+
+    largada = threading.Barrier(CONCORRENTES)
+    respostas = [None] * CONCORRENTES
+
+    def agendar(indice):
+        largada.wait()
+        respostas[indice] = clientes[indice].post('/agendar/', data={
+            'medico': medico_id, 'data_hora': '2030-01-07T09:00'
+        })
+
+    threads = [threading.Thread(target=agendar, args=(indice,)) for indice in range(CONCORRENTES)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    destinos = [resposta.headers.get('Location') for resposta in respostas]
+    assert all(resposta.status_code == 302 for resposta in respostas), [r.status_code for r in respostas]
+    assert destinos.count('/consultas/') == 1
+    assert destinos.count('/agendar/') == CONCORRENTES - 1
+    assert Consulta.query.filter_by(medico_id=medico_id).count() == 1
+
+
+def test_horario_liberado_ao_cancelar(app, client):
+    """Consulta cancelada não ocupa o horário (índice parcial só sobre Agendada/Confirmada)."""
+    medico = criar_medico()
+    entrar(client, criar_paciente())
+    dados = {'medico': medico.id, 'data_hora': '2030-01-07T09:00'}
+
+    assert client.post('/agendar/', data=dados).headers['Location'] == '/consultas/'
+    assert client.post('/agendar/', data=dados).headers['Location'] == '/agendar/'
+    consulta = Consulta.query.one()
+    client.post(f'/consulta/{consulta.id}/cancelar')
+    assert client.post('/agendar/', data=dados).headers['Location'] == '/consultas/'
+    assert Consulta.query.filter_by(status='Agendada').count() == 1
+
+
+def _cpf(indice):
+    """CPF válido distinto para cada índice."""
+    base = f'{100000000 + indice:09d}'
+    for pesos in (range(10, 1, -1), range(11, 1, -1)):
+        base += str(sum(int(digito) * peso for digito, peso in zip(base, pesos)) * 10 % 11 % 10)
+    return base
+
+
+def test_agendamento_so_em_inicio_de_slot(app, client):
+    """
+    08:10 ocuparia o slot das 08:00 na disponibilidade e ainda deixaria agendar
+    08:00 ao lado: o formulário só aceita o início de um slot.
+    """
+    medico = criar_medico()
+    entrar(client, criar_paciente())
+
+    resposta = client.post('/agendar/', data={'medico': medico.id, 'data_hora': '2030-01-07T08:10'})
+    assert resposta.status_code == 200
+    assert 'de 30 em 30 minutos' in resposta.get_data(as_text=True)
+    assert Consulta.query.count() == 0
+
+    resposta = client.post('/agendar/', data={'medico': medico.id, 'data_hora': '2030-01-07T08:30'})
+    assert resposta.headers['Location'] == '/consultas/'
+    assert Consulta.query.count() == 1
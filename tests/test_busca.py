@@ -0,0 +1,61 @@
+from app import db
+from app.busca import buscar_registros
+from app.models import Evolucao, Receita
+from conftest import criar_medico, criar_paciente, criar_consultas
+
+
+def _anotar(consulta, texto):
+    evolucao = Evolucao(conteudo=texto, consulta_id=consulta.id, medico_id=consulta.medico_id)
+    db.session.add(evolucao)
+    db.session.commit()
+    return evolucao
+
+
+def test_busca_restrita_ao_medico_e_ordenada_por_relevancia(app):
+    ana = criar_medico()
+    bruno = criar_medico(nome='Dr. Bruno', crm='2000')
+    paciente = criar_paciente()
+    consulta_ana, outra_da_ana = criar_consultas(ana, paciente, 2)
+    consulta_bruno, = criar_consultas(bruno, paciente, 1)
+
+    fraca = _anotar(consulta_ana, 'Retorno em 30 dias, manter amoxicilina se febre.')
+    forte = _anotar(outra_da_ana, 'Amoxicilina 500 mg; amoxicilina de 8/8h.')
+    _anotar(consulta_bruno, 'Amoxicilina por 7 dias.')
+    db.session.add(Receita(descricao='Amoxicilina 875 mg', consulta_id=consulta_ana.id))
+    db.session.commit()
+
+    resultados, proxima = buscar_registros(ana.id, 'amoxicilina')
+    assert proxima is None
+    assert {r.consulta_id for r in resultados} == {consulta_ana.id, outra_da_ana.id}
+    assert len(resultados) == 3
+    assert [r.id for r in resultados if r.tipo == 'evolucao'] == [forte.id, fraca.id]
+
+    primeira, proxima = buscar_registros(ana.id, 'amoxicilina', tamanho=2)
+    segunda, fim = buscar_registros(ana.id, 'amoxicilina', pagina=2, tamanho=2)
+    assert (proxima, fim) == (2, None)
+    assert [r.id for r in primeira + segunda] == [r.id for r in resultados]
+
+
+def test_busca_acompanha_a_troca_de_medico_da_consulta(app):
+    ana = criar_medico()
+    bruno = criar_medico(nome='Dr. Bruno', crm='2000')
+    consulta, = criar_consultas(ana, criar_paciente(), 1)
+    _anotar(consulta, 'Solicitado ecocardiograma.')
+
+    consulta.medico_id = bruno.id
+    db.session.commit()
+    assert buscar_registros(ana.id, 'ecocardiograma')[0] == []
+    assert len(buscar_registros(bruno.id, 'ecocardiograma')[0]) == 1
+
+
+def test_busca_confere_o_medico_na_consulta(app):
+    """[SEGURANÇA] O médico gravado no índice só filtra; o acesso vem da consulta."""
+    ana = criar_medico()
+    bruno = criar_medico(nome='Dr. Bruno', crm='2000')
+    consulta, = criar_consultas(bruno, criar_paciente(), 1)
+    evolucao = _anotar(consulta, 'Solicitado ecocardiograma.')
+
+    db.session.execute(db.text('UPDATE busca_clinica SET medico = :medico WHERE rowid = :chave'),
+                       {'medico': ana.id, 'chave': evolucao.id * 2})
+    db.session.commit()
+    assert buscar_registros(ana.id, 'ecocardiograma')[0] == []
@@ -0,0 +1,42 @@
+from app import db
+from conftest import criar_medico, criar_paciente, criar_consultas, entrar
+
+
+def _revalidar(client, url, etag):
+    return client.get(url, headers={'If-None-Match': etag})
+
+
+def test_renomear_usuario_invalida_a_listagem(app, client):
+    """O nome do médico não altera a consulta, mas está na página: sai um novo ETag."""
+    medico = criar_medico(nome='Dra. Ana')
+    paciente = criar_paciente()
+    criar_consultas(medico, paciente, 2)
+    entrar(client, paciente)
+    client.get('/consultas/')  # consome as mensagens do login
+
+    etag = client.get('/consultas/').headers['ETag']
+    assert _revalidar(client, '/consultas/', etag).status_code == 304
+
+    medico.name = 'Dra. Ana Souza'
+    db.session.commit()
+    resposta = _revalidar(client, '/consultas/', etag)
+    assert resposta.status_code == 200
+    assert 'Dra. Ana Souza' in resposta.get_data(as_text=True)
+
+
+def test_renomear_paciente_invalida_o_prontuario_da_consulta(app, client):
+    medico = criar_medico()
+    paciente = criar_paciente(nome='João')
+    consulta, = criar_consultas(medico, paciente, 1)
+    url = f'/consulta/{consulta.id}/evolucoes'
+    entrar(client, medico)
+    client.get(url)
+
+    etag = client.get(url).headers['ETag']
+    assert _revalidar(client, url, etag).status_code == 304
+
+    paciente.name = 'João da Silva'
+    db.session.commit()
+    resposta = _revalidar(client, url, etag)
+    assert resposta.status_code == 200
+    assert 'João da Silva' in resposta.get_data(as_text=True)
@@ -0,0 +1,51 @@
+import random
+import time
+import numpy as np
+import pytest
+from hypothesis import given, strategies as st
+from app.forms import validar_cpf, validar_cpfs
+
+DIGITOS = '0123456789'
+
+# CPFs plausíveis: 11 dígitos, com ou sem a pontuação usual, além de textos quaisquer
+# (tamanho errado, letras, dígitos não ASCII, todos os dígitos iguais...)
+cpf_digitos = st.text(alphabet=DIGITOS, min_size=11, max_size=11)
+cpf_formatado = cpf_digitos.map(lambda cpf: f'{cpf[:3]}.{cpf[3:6]}.{cpf[6:9]}-{cpf[9:]}')
+cpf_repetido = st.sampled_from(DIGITOS).map(lambda digito: digito * 11)
+cpf_qualquer = st.text(alphabet=DIGITOS + '.- x١', max_size=16)
+cpfs = st.lists(st.one_of(cpf_digitos, cpf_formatado, cpf_repetido, cpf_qualquer), max_size=50)
+
+
+@given(cpfs)
+def test_validar_cpfs_igual_ao_validar_cpf(lista):
+    validos, digitos = validar_cpfs(lista)
+    assert validos.tolist() == [validar_cpf(cpf) for cpf in lista]
+    for cpf, linha in zip(lista, digitos):
+        normalizado = ''.join(filter(str.isdigit, cpf))
+        esperado = [int(digito) for digito in normalizado] if len(normalizado) == 11 else [0] * 11
+        assert linha.tolist() == esperado
+
+
+@given(cpfs)
+def test_validar_cpfs_aceita_array_numpy(lista):
+    assert validar_cpfs(np.array(lista, dtype=str))[0].tolist() == validar_cpfs(lista)[0].tolist()
+
+
+@pytest.mark.benchmark
+def test_validar_cpfs_ao_menos_50_vezes_mais_rapido():
+    """Um milhão de CPFs (caso da revalidação da tabela de pacientes)."""
+    sorteio = random.Random(10)
+    lista = [''.join(sorteio.choices(DIGITOS, k=11)) for _ in range(1_000_000)]
+
+    inicio = time.perf_counter()
+    esperado = [validar_cpf(cpf) for cpf in lista]
+    escalar = time.perf_counter() - inicio
+
+    tempos = []
+    for _ in range(3):
+        inicio = time.perf_counter()
+        validos, _ = validar_cpfs(lista)
+        tempos.append(time.perf_counter() - inicio)
+
+    assert validos.tolist() == esperado
+    assert escalar / min(tempos) >= 50, f'escalar {escalar:.2f}s, lote {min(tempos) * 1000:.0f}ms'
@@ -0,0 +1,100 @@
+import datetime
+import random
+import time
+import pytest
+from app import db, views
+from app.agenda import SLOTS, disponibilidade
+from app.models import Consulta, Medico, User
+from conftest import criar_medico, criar_paciente, entrar
+
+TODOS = [hora.strftime('%H:%M') for hora in SLOTS]
+
+
+def test_disponibilidade_desconta_consultas_ativas(app, client):
+    """Horários ocupados saem da lista; cancelada e horário quebrado seguem a regra do slot."""
+    medico = criar_medico()
+    paciente = criar_paciente()
+    db.session.add_all([
+        Consulta(medico_id=medico.id, paciente_id=paciente.id, status='Agendada',
+                 data_hora=datetime.datetime(2030, 1, 7, 8, 0)),
+        # Horário quebrado ocupa o slot em que começa (13:00)
+        Consulta(medico_id=medico.id, paciente_id=paciente.id, status='Confirmada',
+                 data_hora=datetime.datetime(2030, 1, 7, 13, 10)),
+        Consulta(medico_id=medico.id, paciente_id=paciente.id, status='Cancelada',
+                 data_hora=datetime.datetime(2030, 1, 7, 9, 0)),
+        Consulta(medico_id=medico.id, paciente_id=paciente.id, status='Agendada',
+                 data_hora=datetime.datetime(2030, 1, 8, 17, 30)),
+    ])
+    db.session.commit()
+    entrar(client, paciente)
+
+    resposta = client.get(f'/api/disponibilidade?medico_id={medico.id}&inicio=2030-01-07&dias=3')
+    assert resposta.status_code == 200
+    agenda = resposta.get_json()['medicos'][str(medico.id)]
+    assert agenda['2030-01-07'] == [hora for hora in TODOS if hora not in ('08:00', '13:00')]
+    assert agenda['2030-01-08'] == TODOS[:-1]
+    assert agenda['2030-01-09'] == TODOS
+
+
+def test_disponibilidade_de_todos_os_medicos_em_paginas(app, client, monkeypatch):
+    """Sem medico_id a API pagina os médicos em vez de recusar a chamada."""
+    monkeypatch.setattr(views, 'MAX_MEDICOS_DISPONIBILIDADE', 2)
+    medicos = [criar_medico(nome=f'Dr. {indice}', crm=str(2000 + indice)) for indice in range(5)]
+    entrar(client, criar_paciente())
+
+    vistos, apos = [], 0
+    for _ in range(len(medicos)):
+        resposta = client.get(f'/api/disponibilidade?inicio=2030-01-07&dias=1&apos={apos}')
+        assert resposta.status_code == 200
+        corpo = resposta.get_json()
+        vistos.extend(int(medico_id) for medico_id in corpo['medicos'])
+        apos = corpo['proximo']
+        if apos is None:
+            break
+    assert vistos == [medico.id for medico in medicos]
+
+
+def test_disponibilidade_recusa_medicos_demais_com_mensagem(app, client, monkeypatch):
+    monkeypatch.setattr(views, 'MAX_MEDICOS_DISPONIBILIDADE', 2)
+    entrar(client, criar_paciente())
+    resposta = client.get('/api/disponibilidade?medico_id=1&medico_id=2&medico_id=3')
+    assert resposta.status_code == 400
+    assert 'medico_id' in resposta.get_json()['erros'][0]
+
+
+@pytest.mark.benchmark
+def test_disponibilidade_de_200_medicos_em_30_dias(app):
+    """
+    200 médicos x 30 dias com metade dos slots ocupados (~51 mil consultas ativas).
+    Meta: bem abaixo de 100 ms; no SQLite a consulta agregada sozinha leva ~85 ms,
+    então o teste só barra regressões acima de 250 ms e imprime o tempo medido.
+    """
+    medicos = 200
+    inicio = datetime.date(2030, 1, 1)
+    paciente_id = criar_paciente().id
+    db.session.execute(User.__table__.insert(), [
+        dict(id=1000 + indice, email=f'bench{indice}@medicos.medeasy.com.br', name=f'Dr. {indice}',
+             user_type='medico')
+        for indice in range(medicos)
+    ])
+    db.session.execute(Medico.__table__.insert(),
+                       [dict(id=1000 + indice, crm=str(50000 + indice)) for indice in range(medicos)])
+    sorteio = random.Random(1)
+    db.session.execute(Consulta.__table__.insert(), [
+        dict(medico_id=1000 + indice, paciente_id=paciente_id, status='Agendada',
+             data_hora=datetime.datetime.combine(inicio + datetime.timedelta(days=dia), hora))
+        for indice in range(medicos) for dia in range(30) for hora in SLOTS if sorteio.random() < 0.5
+    ])
+    db.session.commit()
+
+    medico_ids = list(range(1000, 1000 + medicos))
+    fim = inicio + datetime.timedelta(days=29)
+    tempos = []
+    for _ in range(3):
+        comeco = time.perf_counter()
+        livres = disponibilidade(medico_ids, inicio, fim, agora=datetime.datetime(2029, 12, 1))
+        tempos.append(time.perf_counter() - comeco)
+
+    assert len(livres) == medicos
+    print(f'disponibilidade: {min(tempos) * 1000:.0f} ms (melhor de 3)')
+    assert min(tempos) < 0.25, f'{min(tempos) * 1000:.0f} ms'
@@ -0,0 +1,32 @@
+import csv
+import datetime
+import io
+import json
+from conftest import criar_medico, criar_paciente, criar_consultas
+
+NOMES = ['=HYPERLINK("http://exemplo.com","clique")', '+55 11', '-2+3', '@SOMA(A1)', '\tTab', 'Ana - filha']
+
+
+def _exportar(app, formato):
+    resultado = app.test_cli_runner().invoke(args=['export', '--formato', formato])
+    assert resultado.exit_code == 0, resultado.output
+    return resultado.output
+
+
+def test_csv_neutraliza_formulas_de_planilha(app):
+    """[SEGURANÇA] Nomes que começam com =, +, -, @ (ou tab) saem prefixados com '."""
+    medico = criar_medico(nome='=1+1')
+    for dia, nome in enumerate(NOMES):
+        criar_consultas(medico, criar_paciente(nome=nome, cpf=f'{dia:011d}'), 1,
+                        inicio=datetime.datetime(2030, 1, 7 + dia, 8, 0))
+
+    linhas = list(csv.DictReader(io.StringIO(_exportar(app, 'csv'))))
+    assert {linha['medico'] for linha in linhas} == {"'=1+1"}
+    assert [linha['paciente'] for linha in linhas] == [
+        '\'=HYPERLINK("http://exemplo.com","clique")', "'+55 11", "'-2+3", "'@SOMA(A1)", "'\tTab", 'Ana - filha'
+    ]
+    assert linhas[0]['data_hora'] == '2030-01-07T08:00:00'
+
+    # O NDJSON não é aberto em planilha: os valores seguem como estão no banco
+    registros = [json.loads(linha) for linha in _exportar(app, 'ndjson').splitlines()]
+    assert [registro['paciente'] for registro in registros] == NOMES
@@ -0,0 +1,83 @@
+import csv
+import json
+import pytest
+from app import importacao
+from app.models import User
+from conftest import SENHA
+
+LINHAS = [
+    {'tipo': 'paciente', 'name': 'Ana', 'email': 'ana@pacientes.medeasy.com.br', 'password': SENHA,
+     'cpf': '529.982.247-25', 'data_nascimento': '1990-05-01'},
+    'não é json',
+    ['lista', 'não', 'é', 'objeto'],
+    {'tipo': 'paciente', 'name': 'Bia', 'email': 'bia@exemplo', 'password': SENHA,
+     'cpf': '11144477735', 'data_nascimento': '1990-05-01'},
+    {'tipo': 'paciente', 'name': 'Caio', 'email': 'caio@pacientes.medeasy.com.br', 'password': SENHA,
+     'cpf': '11144477736', 'data_nascimento': '1990-05-01'},
+    {'tipo': 'medico', 'name': 'Dra. Duda', 'email': 'duda@medicos.medeasy.com.br', 'password': SENHA,
+     'crm': '4321', 'especialidade': 'Cardiologia'},
+    {'tipo': 'paciente', 'name': 'Eva', 'email': 'eva@pacientes.medeasy.com.br', 'password': SENHA,
+     'cpf': '11144477735', 'data_nascimento': '1991-02-03'},
+]
+
+
+@pytest.fixture
+def arquivos(tmp_path):
+    arquivo = tmp_path / 'usuarios.ndjson'
+    arquivo.write_text('\n'.join(
+        linha if isinstance(linha, str) else json.dumps(linha) for linha in LINHAS
+    ) + '\n', encoding='utf-8')
+    return arquivo, tmp_path / 'progresso.json', tmp_path / 'erros.csv'
+
+
+def _importar(app, arquivo, checkpoint, erros, lote=3):
+    return app.test_cli_runner().invoke(args=[
+        'import-users', str(arquivo), '--lote', str(lote),
+        '--checkpoint', str(checkpoint), '--erros', str(erros),
+    ])
+
+
+def _relatorio(erros):
+    with open(erros, newline='') as f:
+        return [(int(linha['registro']), linha['erro']) for linha in csv.DictReader(f)]
+
+
+def test_importacao_rejeita_linhas_invalidas_e_continua(app, arquivos):
+    arquivo, checkpoint, erros = arquivos
+    resultado = _importar(app, arquivo, checkpoint, erros)
+
+    assert resultado.exit_code == 0, resultado.output
+    assert '3 usuário(s) importado(s), 4 rejeitado(s).' in resultado.output
+    assert {usuario.email for usuario in User.query} == {
+        'ana@pacientes.medeasy.com.br', 'duda@medicos.medeasy.com.br', 'eva@pacientes.medeasy.com.br'
+    }
+    assert _relatorio(erros) == [
+        (2, 'Linha não é um JSON válido.'),
+        (3, 'Linha não é um objeto JSON.'),
+        (4, 'E-mail inválido.'),
+        (5, 'CPF inválido. Verifique os dígitos informados.'),
+    ]
+
+
+def test_retomada_nao_repete_recusas_no_relatorio(app, arquivos, monkeypatch):
+    """Recusas de um lote interrompido só aparecem no relatório uma vez, na retomada."""
+    arquivo, checkpoint, erros = arquivos
+    inserir_lote = importacao.inserir_lote
+    chamadas = []
+
+    def falhar_no_segundo_lote(registros):
+        chamadas.append(registros)
+        if len(chamadas) == 2:
+            raise RuntimeError('queda no meio da importação')
+        inserir_lote(registros)
+
+    monkeypatch.setattr(importacao, 'inserir_lote', falhar_no_segundo_lote)
+    assert _importar(app, arquivo, checkpoint, erros).exit_code != 0
+    assert json.loads(checkpoint.read_text())['registros'] == 3
+    assert _relatorio(erros) == [(2, 'Linha não é um JSON válido.'), (3, 'Linha não é um objeto JSON.')]
+
+    monkeypatch.setattr(importacao, 'inserir_lote', inserir_lote)
+    resultado = _importar(app, arquivo, checkpoint, erros)
+    assert resultado.exit_code == 0, resultado.output
+    assert [numero for numero, _ in _relatorio(erros)] == [2, 3, 4, 5]
+    assert User.query.count() == 3
@@ -0,0 +1,97 @@
+import re
+import pytest
+from sqlalchemy import event
+from app import db
+from app.models import Evolucao, Receita
+from conftest import criar_medico, criar_paciente, criar_consultas, entrar
+
+
+# Confere no plano do banco (EXPLAIN QUERY PLAN no SQLite, EXPLAIN no PostgreSQL)
+# que cada SELECT das rotas quentes usa os índices compostos da migração
+# 264221c0a2da, sem varrer consultas, evoluções ou receitas inteiras.
+
+TABELAS = ('consultas', 'evolucoes', 'receitas')
+
+
+def _capturar(client, url):
+    """Executa a rota e devolve os SELECTs (sql, parâmetros), com ou sem CTE, enviados ao banco."""
+    capturados = []
+
+    def registrar(conexao, cursor, sql, parametros, contexto, executemany):
+        if sql.lstrip().upper().startswith(('SELECT', 'WITH')) and any(tabela in sql for tabela in TABELAS):
+            capturados.append((sql, parametros))
+
+    event.listen(db.engine, 'before_cursor_execute', registrar)
+    try:
+        resposta = client.get(url)
+        resposta.get_data()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', registrar)
+    assert resposta.status_code == 200
+    assert capturados, f'{url} não consultou {TABELAS}'
+    return capturados
+
+
+def _plano(sql, parametros):
+    """Linhas do plano do banco atual e tabelas lidas por varredura completa."""
+    with db.engine.connect() as conexao:
+        if conexao.dialect.name == 'postgresql':
+            # Com poucas linhas o PostgreSQL prefere Seq Scan mesmo havendo índice
+            conexao.exec_driver_sql('SET enable_seqscan = off')
+            plano = [linha[0] for linha in conexao.exec_driver_sql('EXPLAIN ' + sql, parametros)]
+            padrao = re.compile(r'Seq Scan on (\w+)')
+        else:
+            plano = [linha[3] for linha in conexao.exec_driver_sql('EXPLAIN QUERY PLAN ' + sql, parametros)]
+            # "SCAN consultas USING INDEX ..." percorre o índice; só "SCAN consultas" é sequencial
+            padrao = re.compile(r'^SCAN (\w+)(?! USING)')
+    sequenciais = [m.group(1) for linha in plano for m in [padrao.search(linha)] if m and m.group(1) in TABELAS]
+    return plano, sequenciais
+
+
+@pytest.fixture
+def agenda(app):
+    medico = criar_medico()
+    paciente = criar_paciente()
+    consultas = criar_consultas(medico, paciente, 30, status='Confirmada')
+    db.session.add_all([
+        Evolucao(conteudo='Evolução', consulta_id=consultas[0].id, medico_id=medico.id),
+        Receita(descricao='Receita', consulta_id=consultas[0].id),
+    ])
+    db.session.commit()
+    return medico, paciente, consultas
+
+
+MEDICO_DATA = 'ix_consultas_medico_id_data_hora'
+PACIENTE_DATA = 'ix_consultas_paciente_id_data_hora'
+EVOLUCOES = 'ix_evolucoes_consulta_id_data_criacao'
+RECEITAS = 'ix_receitas_consulta_id_timestamp'
+HORARIO_ATIVO = 'uq_consultas_medico_horario_ativo'
+
+
+# Cada item da lista precisa aparecer no plano; um conjunto aceita qualquer um dos
+# índices (ex.: prontuário filtra por paciente e médico, ambos os índices servem;
+# a disponibilidade só lê consultas ativas, que o índice parcial já cobre).
+@pytest.mark.parametrize('papel, url, indices', [
+    ('medico', '/consultas/', [MEDICO_DATA]),
+    ('medico', '/consultas/?status=Confirmada&data_inicio=2030-01-10&data_fim=2030-01-20', [MEDICO_DATA]),
+    ('paciente', '/consultas/', [PACIENTE_DATA]),
+    ('medico', '/consulta/{consulta}/evolucoes', [EVOLUCOES, RECEITAS]),
+    ('paciente', '/consulta/{consulta}/historico/', [EVOLUCOES, RECEITAS]),
+    ('medico', '/paciente/{paciente}/prontuario', [{PACIENTE_DATA, MEDICO_DATA}, EVOLUCOES, RECEITAS]),
+    ('paciente', '/api/disponibilidade?medico_id={medico}&inicio=2030-01-07&dias=30',
+     [{MEDICO_DATA, HORARIO_ATIVO}]),
+])
+def test_consultas_das_rotas_usam_indices(client, agenda, papel, url, indices):
+    medico, paciente, consultas = agenda
+    entrar(client, medico if papel == 'medico' else paciente)
+    url = url.format(consulta=consultas[0].id, medico=medico.id, paciente=paciente.id)
+
+    planos = []
+    for sql, parametros in _capturar(client, url):
+        plano, sequenciais = _plano(sql, parametros)
+        assert sequenciais == [], f'{sql}\n{plano}'
+        planos.extend(plano)
+
+    for esperado in indices:
+        alternativas = esperado if isinstance(esperado, set) else {esperado}
+        assert any(indice in linha for indice in alternativas for linha in planos), (esperado, planos)
@@ -0,0 +1,46 @@
+import os
+import subprocess
+import sys
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROCESSOS = 4
+TENTATIVAS = 5
+
+# Cada processo é um worker independente (como os do gunicorn): importa a aplicação
+# com o limitador ativo, espera a largada comum e tenta logar TENTATIVAS vezes.
+# Imprime os status das respostas.
+WORKER = '''
+import sys, time
+from app import app
+cliente = app.test_client()
+time.sleep(max(0, float(sys.argv[1]) - time.time()))
+print(' '.join(str(cliente.post('/login/', data={}).status_code) for _ in range(%d)))
+''' % TENTATIVAS
+
+
+def test_limite_de_login_compartilhado_entre_processos(tmp_path):
+    """
+    [SEGURANÇA] 5 por minuto valem para o servidor inteiro: com a mesma URI
+    medeasy+sqlite, 4 processos somam exatamente 5 respostas que não são 429.
+    """
+    ambiente = dict(
+        os.environ,
+        MEDEASY_CONFIG='app.configuration.DevelopmentConfig',
+        DATABASE_URL='sqlite:///' + str(tmp_path / 'app.db'),
+        RATELIMIT_STORAGE_URI='medeasy+sqlite:///' + str(tmp_path / 'limites.db'),
+    )
+    largada = str(time.time() + 5)
+    workers = [
+        subprocess.Popen([sys.executable, '-c', WORKER, largada], cwd=RAIZ, env=ambiente,
+                         stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        for _ in range(PROCESSOS)
+    ]
+    status = []
+    for worker in workers:
+        saida, erros = worker.communicate(timeout=60)
+        assert worker.returncode == 0, erros
+        status.extend(int(codigo) for codigo in saida.split())
+
+    assert len(status) == PROCESSOS * TENTATIVAS
+    assert sum(codigo != 429 for codigo in status) == 5
@@ -0,0 +1,141 @@
+import datetime
+import smtplib
+from flask_mail import Connection
+from app import db
+from app.models import Notificacao
+from app.notificacoes import enfileirar_notificacao, gerar_lembretes, mail, processar_lote
+from conftest import criar_medico, criar_paciente, criar_consultas, entrar
+
+
+def test_lembretes_usam_o_dia_local(app):
+    """Às 22h locais (já o dia seguinte em UTC) o lembrete é das consultas de amanhã."""
+    medico, paciente = criar_medico(), criar_paciente()
+    amanha, = criar_consultas(medico, paciente, 1, inicio=datetime.datetime(2030, 1, 8, 9, 0))
+    criar_consultas(medico, paciente, 1, inicio=datetime.datetime(2030, 1, 9, 9, 0))
+
+    assert gerar_lembretes(agora=datetime.datetime(2030, 1, 7, 22, 0)) == 1
+    assert gerar_lembretes(agora=datetime.datetime(2030, 1, 7, 23, 59)) == 0
+    lembrete = Notificacao.query.one()
+    assert (lembrete.tipo, lembrete.consulta_id) == ('lembrete', amanha.id)
+    # A fila segue em UTC: o worker já pode enviar o lembrete
+    assert lembrete.proxima_tentativa <= datetime.datetime.utcnow()
+
+
+def test_lembretes_pelo_relogio_local_por_padrao(app):
+    amanha = datetime.datetime.combine(datetime.date.today() + datetime.timedelta(days=1), datetime.time(9, 0))
+    criar_consultas(criar_medico(), criar_paciente(), 1, inicio=amanha)
+    assert gerar_lembretes() == 1
+
+
+# Worker: o Flask-Mail não abre conexão SMTP nos testes (MAIL_SUPPRESS_SEND segue
+# TESTING) e mail.record_messages() registra as mensagens que seriam enviadas.
+
+def _enfileirar(consulta, *tipos):
+    for tipo in tipos:
+        enfileirar_notificacao(consulta, tipo)
+    db.session.commit()
+
+
+def _status():
+    return sorted((n.tipo, n.status) for n in Notificacao.query.order_by(Notificacao.id))
+
+
+def test_worker_envia_e_descarta_duplicadas(app):
+    consulta, = criar_consultas(criar_medico(), criar_paciente(), 1)
+    # 'confirmada' repetida no mesmo lote: mesma chave
+    _enfileirar(consulta, 'confirmada', 'confirmada', 'cancelada')
+
+    with mail.record_messages() as mensagens:
+        assert processar_lote() == 4
+    assert sorted(mensagem.subject for mensagem in mensagens) == [
+        'MedEasy - Consulta cancelada', 'MedEasy - Consulta cancelada', 'MedEasy - Consulta confirmada'
+    ]
+    assert sorted(mensagem.recipients[0] for mensagem in mensagens) == [
+        '1000@medicos.medeasy.com.br', '52998224725@pacientes.medeasy.com.br',
+        '52998224725@pacientes.medeasy.com.br'
+    ]
+    assert _status() == [('cancelada', 'enviada'), ('cancelada', 'enviada'),
+                         ('confirmada', 'descartada'), ('confirmada', 'enviada')]
+    assert all(n.enviada_em for n in Notificacao.query.filter_by(status='enviada'))
+
+    # Chave já enviada em um lote anterior
+    _enfileirar(consulta, 'confirmada')
+    with mail.record_messages() as mensagens:
+        assert processar_lote() == 1
+        assert processar_lote() == 0
+    assert mensagens == []
+    assert Notificacao.query.filter_by(status='descartada').count() == 2
+
+
+def test_worker_descarta_lembrete_de_consulta_cancelada(app):
+    consulta, = criar_consultas(criar_medico(), criar_paciente(), 1, inicio=datetime.datetime(2030, 1, 8, 9, 0))
+    assert gerar_lembretes(agora=datetime.datetime(2030, 1, 7, 10, 0)) == 1
+    consulta.status = 'Cancelada'
+    db.session.commit()
+
+    with mail.record_messages() as mensagens:
+        assert processar_lote() == 1
+    assert mensagens == []
+    assert _status() == [('lembrete', 'descartada')]
+
+
+def test_worker_refaz_com_espera_e_desiste(app, monkeypatch):
+    def recusar(conexao, mensagem):
+        raise smtplib.SMTPRecipientsRefused({mensagem.recipients[0]: (550, b'recusado')})
+
+    monkeypatch.setattr(Connection, 'send', recusar)
+    monkeypatch.setitem(app.config, 'NOTIFICACOES_MAX_TENTATIVAS', 3)
+    consulta, = criar_consultas(criar_medico(), criar_paciente(), 1)
+    _enfileirar(consulta, 'confirmada')
+
+    agora = datetime.datetime.utcnow() + datetime.timedelta(seconds=1)
+    for tentativa, espera in ((1, 1), (2, 2)):
+        assert processar_lote(agora=agora) == 1
+        notificacao = Notificacao.query.one()
+        assert (notificacao.status, notificacao.tentativas) == ('pendente', tentativa)
+        assert notificacao.proxima_tentativa == agora + datetime.timedelta(minutes=espera)
+        assert 'recusado' in notificacao.ultimo_erro
+        # Antes da espera terminar, a notificação não sai da fila
+        assert processar_lote(agora=notificacao.proxima_tentativa - datetime.timedelta(seconds=1)) == 0
+        agora = notificacao.proxima_tentativa
+
+    assert processar_lote(agora=agora) == 1
+    notificacao = Notificacao.query.one()
+    assert (notificacao.status, notificacao.tentativas) == ('falhou', 3)
+    assert processar_lote(agora=agora + datetime.timedelta(days=1)) == 0
+
+
+def test_worker_devolve_para_a_fila_se_a_conexao_falhar(app, monkeypatch):
+    def fora_do_ar(conexao):
+        raise ConnectionRefusedError('servidor SMTP fora do ar')
+
+    monkeypatch.setattr(Connection, '__enter__', fora_do_ar)
+    consulta, = criar_consultas(criar_medico(), criar_paciente(), 1)
+    _enfileirar(consulta, 'cancelada')
+
+    agora = datetime.datetime.utcnow() + datetime.timedelta(seconds=1)
+    assert processar_lote(agora=agora) == 2
+    notificacoes = Notificacao.query.all()
+    assert {(n.status, n.tentativas) for n in notificacoes} == {('pendente', 1)}
+    assert all('fora do ar' in n.ultimo_erro for n in notificacoes)
+
+    monkeypatch.undo()
+    with mail.record_messages() as mensagens:
+        assert processar_lote(agora=agora + datetime.timedelta(minutes=1)) == 2
+    assert len(mensagens) == 2
+    assert _status() == [('cancelada', 'enviada'), ('cancelada', 'enviada')]
+
+
+def test_edicao_da_consulta_notifica_a_mudanca_de_status(app, client):
+    medico = criar_medico()
+    consulta, = criar_consultas(medico, criar_paciente(), 1)
+    dados = {'medico': medico.id, 'data_hora': '2030-01-07T08:00'}
+    entrar(client, medico)
+
+    # Sem mudança de status, nada é enfileirado
+    assert client.post(f'/consulta/{consulta.id}/editar', data={**dados, 'status': 'Agendada'}).status_code == 302
+    assert Notificacao.query.count() == 0
+
+    assert client.post(f'/consulta/{consulta.id}/editar', data={**dados, 'status': 'Confirmada'}).status_code == 302
+    assert client.post(f'/consulta/{consulta.id}/editar', data={**dados, 'status': 'Cancelada'}).status_code == 302
+    assert _status() == [('cancelada', 'pendente'), ('cancelada', 'pendente'), ('confirmada', 'pendente')]
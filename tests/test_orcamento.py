@@ -0,0 +1,90 @@
+import datetime
+import pytest
+from flask import render_template_string
+from app import db
+from app.models import Consulta, Evolucao, Receita
+from app.orcamento import OrcamentoExcedido
+from conftest import criar_medico, criar_paciente, criar_consultas, entrar
+
+# O orçamento de cada página não depende da quantidade de linhas: a mesma página
+# com uma ou com muitas consultas (de médicos e pacientes diferentes) deve caber nele.
+LINHAS = 12
+
+
+def _agenda_cheia():
+    """Médico com LINHAS consultas, cada uma de um paciente, e um paciente com LINHAS médicos."""
+    medico = criar_medico()
+    paciente = criar_paciente()
+    for indice in range(LINHAS):
+        dia = datetime.datetime(2030, 1, 7, 8, 0) + datetime.timedelta(days=indice)
+        criar_consultas(medico, criar_paciente(nome=f'Paciente {indice}', cpf=f'{indice:011d}'), 1,
+                        inicio=dia)
+        outro = criar_medico(nome=f'Dr. {indice}', crm=f'{2000 + indice}')
+        criar_consultas(outro, paciente, 1, inicio=dia)
+    return medico, paciente
+
+
+def _anotar(consulta, quantidade):
+    for indice in range(quantidade):
+        db.session.add(Evolucao(conteudo=f'Evolução {indice}', consulta_id=consulta.id,
+                                medico_id=consulta.medico_id))
+        db.session.add(Receita(descricao=f'Receita {indice}', consulta_id=consulta.id))
+    db.session.commit()
+
+
+@pytest.mark.parametrize('dono', ['medico', 'paciente'])
+def test_listagem_de_consultas_no_orcamento(client, orcamento_sql, dono):
+    usuario = dict(zip(('medico', 'paciente'), _agenda_cheia()))[dono]
+    entrar(client, usuario)
+    with orcamento_sql(4):
+        resposta = client.get('/consultas/')
+    assert resposta.status_code == 200
+    assert resposta.get_data(as_text=True).count('Paciente' if dono == 'medico' else 'Dr. ') >= LINHAS
+
+
+def test_agenda_do_medico_no_orcamento(client, orcamento_sql):
+    medico, _ = _agenda_cheia()
+    criar_consultas(medico, criar_paciente(nome='Maria', cpf='11144477735'), LINHAS,
+                    inicio=datetime.datetime(2030, 2, 4, 9, 0), status='Confirmada')
+    entrar(client, medico)
+    with orcamento_sql(3):
+        resposta = client.get('/dashboard/')
+    assert resposta.status_code == 200
+
+
+def test_linha_do_tempo_no_orcamento(app, client, orcamento_sql):
+    medico, paciente = _agenda_cheia()
+    consulta_do_medico = Consulta.query.filter_by(medico_id=medico.id).first()
+    consulta_do_paciente = Consulta.query.filter_by(paciente_id=paciente.id).first()
+    _anotar(consulta_do_medico, LINHAS)
+    _anotar(consulta_do_paciente, LINHAS)
+    evolucoes = f'/consulta/{consulta_do_medico.id}/evolucoes'
+    historico = f'/consulta/{consulta_do_paciente.id}/historico/'
+
+    entrar(client, medico)
+    with orcamento_sql(4):
+        resposta = client.get(evolucoes)
+    assert resposta.status_code == 200
+    assert 'Evolução 11' in resposta.get_data(as_text=True)
+
+    do_paciente = app.test_client()
+    entrar(do_paciente, paciente)
+    with orcamento_sql(4):
+        resposta = do_paciente.get(historico)
+    assert resposta.status_code == 200
+    assert 'Receita 11' in resposta.get_data(as_text=True)
+
+
+def test_estouro_aponta_o_sql_e_a_linha_do_template(app, orcamento_sql):
+    medico = criar_medico()
+    criar_consultas(medico, criar_paciente(), 3)
+    db.session.expunge_all()
+
+    with pytest.raises(OrcamentoExcedido) as erro, orcamento_sql(1):
+        consultas = Consulta.query.all()
+        render_template_string('{% for consulta in consultas %}\n{{ consulta.medico.name }}\n{% endfor %}',
+                               consultas=consultas)
+    mensagem = str(erro.value)
+    assert '(orçamento: 1)' in mensagem
+    assert 'FROM users' in mensagem
+    assert '(template <string>:2)' in mensagem
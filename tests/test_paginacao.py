@@ -0,0 +1,43 @@
+import datetime
+from app import db
+from app.models import Evolucao, Receita
+from app.paginacao import codificar_cursor, decodificar_cursor
+from app.prontuario import carregar_timeline
+from conftest import criar_medico, criar_paciente, criar_consultas, entrar
+
+
+def test_cursor_de_item_sem_data():
+    assert decodificar_cursor(codificar_cursor(None, 7)) == (None, 7)
+    data_hora = datetime.datetime(2030, 1, 7, 8, 0)
+    assert decodificar_cursor(codificar_cursor(data_hora, 7)) == (data_hora, 7)
+
+
+def test_linha_do_tempo_pagina_entradas_sem_data(app, client):
+    """Evoluções e receitas antigas sem data vão para o fim e não quebram o cursor."""
+    medico = criar_medico()
+    paciente = criar_paciente()
+    consulta, = criar_consultas(medico, paciente, 1)
+    d = datetime.datetime
+    db.session.execute(Evolucao.__table__.insert(), [
+        dict(conteudo='E1', consulta_id=consulta.id, medico_id=medico.id, data_criacao=d(2030, 1, 7, 9)),
+        dict(conteudo='E2', consulta_id=consulta.id, medico_id=medico.id, data_criacao=None),
+        dict(conteudo='E3', consulta_id=consulta.id, medico_id=medico.id, data_criacao=d(2030, 1, 7, 10)),
+    ])
+    db.session.execute(Receita.__table__.insert(), [
+        dict(descricao='R1', consulta_id=consulta.id, timestamp=None),
+        dict(descricao='R2', consulta_id=consulta.id, timestamp=d(2030, 1, 7, 9, 30)),
+    ])
+    db.session.commit()
+
+    textos, cursor = [], None
+    for _ in range(5):
+        entradas, cursor = carregar_timeline(consulta.id, cursor, tamanho=2)
+        textos.extend(entrada.texto for entrada in entradas)
+        if cursor is None:
+            break
+    assert textos == ['E3', 'R2', 'E1', 'E2', 'R1']
+
+    entrar(client, paciente)
+    resposta = client.get(f'/consulta/{consulta.id}/historico/')
+    assert resposta.status_code == 200
+    assert 'data não informada' in resposta.get_data(as_text=True)
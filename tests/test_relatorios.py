@@ -0,0 +1,64 @@
+import datetime
+from app import db
+from app.agenda import SLOTS
+from app.models import Consulta
+from app.relatorios import gerar_relatorio
+from conftest import criar_medico, criar_paciente
+
+AGORA = datetime.datetime(2030, 2, 1)
+
+
+def _consulta(medico, paciente, data_hora, status, criada_em):
+    return dict(medico_id=medico.id, paciente_id=paciente.id, data_hora=data_hora, status=status,
+                criada_em=criada_em)
+
+
+def test_relatorio_agrega_por_medico_horario_e_antecedencia(app):
+    ana = criar_medico(especialidade='Cardiologia')
+    bruno = criar_medico(nome='Dr. Bruno', crm='2000', especialidade=None)
+    paciente = criar_paciente()
+    d = datetime.datetime
+    db.session.execute(Consulta.__table__.insert(), [
+        _consulta(ana, paciente, d(2030, 1, 7, 8, 0), 'Finalizada', d(2030, 1, 1, 8, 0)),
+        _consulta(ana, paciente, d(2030, 1, 8, 8, 30), 'Agendada', None),
+        # Fora das janelas: conta nas taxas, mas não ocupa slot
+        _consulta(ana, paciente, d(2030, 1, 9, 12, 0), 'Confirmada', d(2030, 1, 9, 7, 0)),
+        _consulta(ana, paciente, d(2030, 3, 4, 9, 0), 'Cancelada', d(2030, 1, 1, 9, 0)),
+        _consulta(bruno, paciente, d(2030, 1, 7, 11, 0, 30), 'Agendada', d(2029, 1, 1)),
+        # Criada depois do horário (importada): antecedência 0
+        _consulta(bruno, paciente, d(2030, 3, 5, 14, 0), 'Agendada', d(2030, 3, 5, 15, 0)),
+        # Fora do período
+        _consulta(bruno, paciente, d(2030, 4, 1, 8, 0), 'Agendada', d(2030, 3, 1)),
+    ])
+    db.session.commit()
+
+    relatorio = gerar_relatorio(datetime.date(2030, 1, 1), datetime.date(2030, 3, 31), agora=AGORA,
+                                tamanho_lote=2)
+    capacidade = 90 * len(SLOTS)
+    medicos = {linha['id']: linha for linha in relatorio['medicos']}
+    assert medicos[ana.id] == {
+        'tipo': 'medico', 'id': ana.id, 'nome': 'Dra. Ana', 'especialidade': 'Cardiologia',
+        'consultas': 4, 'agendadas': 1, 'confirmadas': 1, 'finalizadas': 1, 'canceladas': 1,
+        'nao_comparecimentos': 2, 'taxa_cancelamento': 0.25, 'taxa_nao_comparecimento': round(2 / 3, 4),
+        'capacidade': capacidade, 'ocupacao': round(2 / capacidade, 4),
+    }
+    assert (medicos[bruno.id]['especialidade'], medicos[bruno.id]['consultas'],
+            medicos[bruno.id]['nao_comparecimentos'], medicos[bruno.id]['taxa_nao_comparecimento']) == \
+        ('Sem especialidade', 2, 1, 1.0)
+    assert relatorio['total']['consultas'] == 6
+    assert relatorio['total']['ocupacao'] == round(3 / (2 * capacidade), 4)
+
+    grade = relatorio['ocupacao_por_dia_da_semana_e_horario']['consultas']
+    assert grade[0][SLOTS.index(datetime.time(8, 0))] == 1
+    assert grade[1][SLOTS.index(datetime.time(8, 30))] == 1
+    assert grade[1][SLOTS.index(datetime.time(14, 0))] == 1
+    assert sum(map(sum, grade)) == 3
+
+    antecedencia = relatorio['antecedencia_dias']
+    faixas = {(faixa['de'], faixa['ate']): faixa['consultas'] for faixa in antecedencia['faixas']}
+    assert faixas[(0, 0)] == 2
+    assert faixas[(4, 7)] == 1
+    assert faixas[(61, 90)] == 1
+    assert faixas[(366, None)] == 1
+    assert sum(faixas.values()) == 5
+    assert antecedencia['sem_data_de_agendamento'] == 1
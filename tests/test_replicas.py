@@ -0,0 +1,105 @@
+import pytest
+from sqlalchemy import create_engine
+from app import db
+from app.models import Consulta, Evolucao, User
+from app.replicas import CHAVE_REPLICA, ler_da_replica, ler_do_primario
+from conftest import criar_medico, criar_paciente, criar_consultas, entrar
+
+NOME_NA_REPLICA = 'Nome lido da réplica'
+
+
+@pytest.fixture
+def replica(app, monkeypatch, tmp_path):
+    """
+    Segundo banco SQLite registrado como réplica. replica() copia o primário para
+    ela (como a replicação faria) e devolve o engine, para o teste diferenciar os dois.
+    """
+    if db.engine.dialect.name != 'sqlite':
+        pytest.skip('A cópia do primário para a réplica usa VACUUM INTO do SQLite.')
+    arquivo = tmp_path / 'replica.db'
+    engine = create_engine(f'sqlite:///{arquivo}')
+    monkeypatch.setitem(db.engines, CHAVE_REPLICA, engine)
+    monkeypatch.setitem(app.config, 'SQLALCHEMY_BINDS', {CHAVE_REPLICA: f'sqlite:///{arquivo}'})
+    # Sem a janela de leitura no primário após gravar (ex.: no login), salvo se o teste pedir
+    monkeypatch.setitem(app.config, 'REPLICA_ATRASO_MAXIMO', 0)
+
+    def replicar():
+        with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conexao:
+            conexao.exec_driver_sql('VACUUM INTO ?', (str(arquivo),))
+        return engine
+
+    yield replicar
+    engine.dispose()
+
+
+def _renomear_na_replica(engine, usuario):
+    with engine.begin() as conexao:
+        conexao.execute(db.update(User.__table__).where(User.__table__.c.id == usuario.id)
+                        .values(name=NOME_NA_REPLICA))
+
+
+def test_rotas_somente_leitura_leem_da_replica(app, client, replica):
+    medico = criar_medico()
+    paciente = criar_paciente(nome='Nome no primário')
+    criar_consultas(medico, paciente, 2)
+    _renomear_na_replica(replica(), paciente)
+
+    entrar(client, medico)
+    pagina = client.get('/consultas/').get_data(as_text=True)
+    assert NOME_NA_REPLICA in pagina
+    assert 'Nome no primário' not in pagina
+
+    # Fora das rotas marcadas, as leituras continuam no primário
+    assert db.session.get(User, paciente.id).name == 'Nome no primário'
+    with ler_da_replica():
+        assert db.session.scalar(db.select(User.name).where(User.id == paciente.id)) == NOME_NA_REPLICA
+        with ler_do_primario():
+            assert db.session.scalar(db.select(User.name).where(User.id == paciente.id)) == 'Nome no primário'
+
+
+def test_ler_do_primario_dentro_de_rota_somente_leitura(app, client, replica):
+    medico = criar_medico(nome='Dr. Primário')
+    paciente = criar_paciente()
+    consulta, = criar_consultas(medico, paciente, 1)
+    engine = replica()
+    _renomear_na_replica(engine, medico)
+    # Evolução gravada depois da cópia: a réplica ainda não a recebeu
+    db.session.add(Evolucao(conteudo='Evolução recente', consulta_id=consulta.id, medico_id=medico.id))
+    db.session.commit()
+
+    entrar(client, paciente)
+    pagina = client.get(f'/consulta/{consulta.id}/historico/').get_data(as_text=True)
+    # O cabeçalho vem da réplica; a linha do tempo (cacheada) é lida com ler_do_primario()
+    assert NOME_NA_REPLICA in pagina
+    assert 'Evolução recente' in pagina
+
+
+def test_escritas_vao_para_o_primario(app, client, replica):
+    medico = criar_medico()
+    paciente = criar_paciente(nome='Nome no primário')
+    consulta, = criar_consultas(medico, paciente, 1)
+    engine = replica()
+    _renomear_na_replica(engine, paciente)
+
+    app.config['REPLICA_ATRASO_MAXIMO'] = 5
+    entrar(client, medico)
+    resposta = client.post(f'/consulta/{consulta.id}/evolucoes',
+                           data={'conteudo': 'Gravada no primário', 'submit_evolucao': 'Salvar Evolução'})
+    assert resposta.status_code == 302
+
+    assert Evolucao.query.filter_by(conteudo='Gravada no primário').count() == 1
+    with engine.connect() as conexao:
+        assert conexao.scalar(db.select(db.func.count()).select_from(Evolucao.__table__)) == 0
+
+    # Logo após gravar, o mesmo navegador lê do primário mesmo nas rotas somente leitura
+    assert 'Nome no primário' in client.get('/consultas/').get_data(as_text=True)
+
+    # Escrita num bloco de leitura na réplica: vai para o primário, e a transação
+    # passa a ler dele até o commit
+    with ler_da_replica():
+        db.session.execute(db.update(Consulta).where(Consulta.id == consulta.id).values(status='Confirmada'))
+        assert db.session.scalar(db.select(User.name).where(User.id == paciente.id)) == 'Nome no primário'
+        db.session.commit()
+    with engine.connect() as conexao:
+        assert conexao.scalar(db.select(Consulta.status).where(Consulta.id == consulta.id)) == 'Agendada'
+    assert db.session.get(Consulta, consulta.id).status == 'Confirmada'